@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Direct SQL script to create the PostgreSQL sequence behind system_users.display_id
+
+next_display_id() draws from it, so run this once per database before
+deploying code that creates users.
+"""
+import os
+from dotenv import load_dotenv
+import psycopg2
+
+SEQUENCE = 'system_users_display_id_seq'
+
+# Load environment variables
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not found in .env file")
+    exit(1)
+
+try:
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    print(f"Checking for the {SEQUENCE} sequence...")
+
+    cursor.execute("SELECT to_regclass(%s)", (SEQUENCE,))
+    sequence_exists = cursor.fetchone()[0] is not None
+
+    if not sequence_exists:
+        print(f"Creating {SEQUENCE}...")
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} OWNED BY system_users.display_id;")
+        # Start after the highest display_id handed out so far
+        cursor.execute(
+            f"SELECT setval('{SEQUENCE}', (SELECT COALESCE(MAX(display_id), 0) + 1 FROM system_users), false);"
+        )
+        conn.commit()
+        print(f"✓ {SEQUENCE} created")
+    else:
+        print(f"✓ {SEQUENCE} already exists")
+
+    cursor.close()
+    conn.close()
+    print("\n✓ display_id sequence verified/created successfully!")
+
+except psycopg2.Error as e:
+    print(f"Database error: {e}")
+except Exception as e:
+    print(f"Error: {e}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Direct SQL script to create the email_outbox table
+
+Notification emails are queued there and sent by the outbox sender, so run
+this once per database before turning on enable_email_notifications.
+"""
+import os
+from dotenv import load_dotenv
+import psycopg2
+
+INDEX = 'ix_email_outbox_status_next_attempt'
+
+# Load environment variables
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not found in .env file")
+    exit(1)
+
+try:
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    print("Checking for the email_outbox table...")
+
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.tables
+            WHERE table_name = 'email_outbox'
+        )
+    """)
+    table_exists = cursor.fetchone()[0]
+
+    if not table_exists:
+        print("Creating email_outbox table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id SERIAL PRIMARY KEY,
+                recipient VARCHAR(120) NOT NULL,
+                subject VARCHAR(255) NOT NULL,
+                body TEXT NOT NULL,
+                notification_id INTEGER NULL REFERENCES notification(id) ON DELETE SET NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+                locked_until TIMESTAMP WITHOUT TIME ZONE NULL,
+                lock_token VARCHAR(32) NULL,
+                last_error VARCHAR(255) NULL,
+                created_at TIMESTAMP WITHOUT TIME ZONE NULL DEFAULT now(),
+                sent_at TIMESTAMP WITHOUT TIME ZONE NULL
+            );
+        """)
+        conn.commit()
+        print("✓ email_outbox table created")
+    else:
+        print("✓ email_outbox table already exists")
+
+    cursor.execute("SELECT to_regclass(%s)", (INDEX,))
+    index_exists = cursor.fetchone()[0] is not None
+
+    if not index_exists:
+        print(f"Adding {INDEX} index...")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON email_outbox (status, next_attempt_at);")
+        conn.commit()
+        print(f"✓ {INDEX} index added")
+    else:
+        print(f"✓ {INDEX} index already exists")
+
+    cursor.close()
+    conn.close()
+    print("\n✓ email_outbox verified/created successfully!")
+
+except psycopg2.Error as e:
+    print(f"Database error: {e}")
+except Exception as e:
+    print(f"Error: {e}")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Direct SQL script to add the (term_id, class_id, subject_id) index to exam_schedule
+
+Bulk exam schedule generation skips combinations that are already scheduled,
+and this index serves that NOT EXISTS probe instead of a full table scan.
+"""
+import os
+from dotenv import load_dotenv
+import psycopg2
+
+INDEX = 'ix_exam_schedule_term_class_subject'
+
+# Load environment variables
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not found in .env file")
+    exit(1)
+
+try:
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    print(f"Checking for the {INDEX} index...")
+
+    cursor.execute("SELECT to_regclass(%s)", (INDEX,))
+    index_exists = cursor.fetchone()[0] is not None
+
+    if not index_exists:
+        print(f"Adding {INDEX}...")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON exam_schedule (term_id, class_id, subject_id);")
+        conn.commit()
+        print(f"✓ {INDEX} added")
+    else:
+        print(f"✓ {INDEX} already exists")
+
+    cursor.close()
+    conn.close()
+    print("\n✓ exam_schedule index verified/added successfully!")
+
+except psycopg2.Error as e:
+    print(f"Database error: {e}")
+except Exception as e:
+    print(f"Error: {e}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Direct SQL script to widen system_users.password_hash to 255 characters
+
+pbkdf2 hashes are 102 characters but scrypt hashes are 162, so run this
+before setting PASSWORD_HASH_METHOD to scrypt; logins rehash stored
+passwords to the configured method.
+"""
+import os
+from dotenv import load_dotenv
+import psycopg2
+
+LENGTH = 255
+
+# Load environment variables
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not found in .env file")
+    exit(1)
+
+try:
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    print("Checking the length of system_users.password_hash...")
+
+    cursor.execute("""
+        SELECT character_maximum_length FROM information_schema.columns
+        WHERE table_name = 'system_users' AND column_name = 'password_hash'
+    """)
+    current_length = cursor.fetchone()[0]
+
+    if current_length is not None and current_length < LENGTH:
+        print(f"Widening password_hash from {current_length} to {LENGTH} characters...")
+        cursor.execute(f"ALTER TABLE system_users ALTER COLUMN password_hash TYPE VARCHAR({LENGTH});")
+        conn.commit()
+        print(f"✓ password_hash widened to {LENGTH} characters")
+    else:
+        print(f"✓ password_hash already holds {current_length or 'unlimited'} characters")
+
+    cursor.close()
+    conn.close()
+    print("\n✓ password_hash column verified/widened successfully!")
+
+except psycopg2.Error as e:
+    print(f"Database error: {e}")
+except Exception as e:
+    print(f"Error: {e}")
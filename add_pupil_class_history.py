@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Direct SQL script to create the pupil_class_history table
+
+The Promote Pupils page records each pupil's class and stream there before
+moving them, so run this once per database before using it.
+"""
+import os
+from dotenv import load_dotenv
+import psycopg2
+
+# Load environment variables
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not found in .env file")
+    exit(1)
+
+try:
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    print("Checking for the pupil_class_history table...")
+
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.tables
+            WHERE table_name = 'pupil_class_history'
+        )
+    """)
+    table_exists = cursor.fetchone()[0]
+
+    if not table_exists:
+        print("Creating pupil_class_history table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pupil_class_history (
+                id SERIAL PRIMARY KEY,
+                pupil_id INTEGER NOT NULL REFERENCES pupils(id),
+                class_id INTEGER NULL REFERENCES school_class(id),
+                stream_id INTEGER NULL REFERENCES stream(id),
+                academic_year_id INTEGER NULL REFERENCES academic_year(id),
+                outcome VARCHAR(20) NOT NULL,
+                recorded_by INTEGER NULL REFERENCES system_users(id),
+                recorded_at TIMESTAMP WITHOUT TIME ZONE NULL
+            );
+        """)
+        conn.commit()
+        print("✓ pupil_class_history table created")
+    else:
+        print("✓ pupil_class_history table already exists")
+
+    cursor.execute("SELECT to_regclass('ix_pupil_class_history_pupil_id')")
+    index_exists = cursor.fetchone()[0] is not None
+
+    if not index_exists:
+        print("Adding ix_pupil_class_history_pupil_id index...")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_pupil_class_history_pupil_id ON pupil_class_history (pupil_id);")
+        conn.commit()
+        print("✓ ix_pupil_class_history_pupil_id index added")
+    else:
+        print("✓ ix_pupil_class_history_pupil_id index already exists")
+
+    cursor.close()
+    conn.close()
+    print("\n✓ pupil_class_history verified/created successfully!")
+
+except psycopg2.Error as e:
+    print(f"Database error: {e}")
+except Exception as e:
+    print(f"Error: {e}")
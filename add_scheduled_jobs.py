@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Direct SQL script to create the scheduled_job and job_run tables
+
+The job scheduler keeps its schedules, leases and run history there, so run
+this once per database before deploying.
+"""
+import os
+from dotenv import load_dotenv
+import psycopg2
+
+TABLES = {
+    'scheduled_job': """
+        CREATE TABLE IF NOT EXISTS scheduled_job (
+            name VARCHAR(50) PRIMARY KEY,
+            schedule VARCHAR(100) NOT NULL,
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            next_run_at TIMESTAMP WITHOUT TIME ZONE NULL,
+            locked_by VARCHAR(100) NULL,
+            locked_until TIMESTAMP WITHOUT TIME ZONE NULL,
+            last_run_at TIMESTAMP WITHOUT TIME ZONE NULL,
+            last_status VARCHAR(20) NULL
+        );
+    """,
+    'job_run': """
+        CREATE TABLE IF NOT EXISTS job_run (
+            id SERIAL PRIMARY KEY,
+            job_name VARCHAR(50) NOT NULL REFERENCES scheduled_job(name),
+            status VARCHAR(20) NOT NULL,
+            message TEXT NULL,
+            worker VARCHAR(100) NULL,
+            triggered_by INTEGER NULL REFERENCES system_users(id),
+            started_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            finished_at TIMESTAMP WITHOUT TIME ZONE NULL
+        );
+    """,
+}
+INDEX = 'ix_job_run_job_started'
+
+# Load environment variables
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+if not DATABASE_URL:
+    print("ERROR: DATABASE_URL not found in .env file")
+    exit(1)
+
+try:
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    # scheduled_job first, since job_run references it
+    for table, ddl in TABLES.items():
+        print(f"Checking for the {table} table...")
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.tables
+                WHERE table_name = %s
+            )
+        """, (table,))
+        table_exists = cursor.fetchone()[0]
+
+        if not table_exists:
+            print(f"Creating {table} table...")
+            cursor.execute(ddl)
+            conn.commit()
+            print(f"✓ {table} table created")
+        else:
+            print(f"✓ {table} table already exists")
+
+    cursor.execute("SELECT to_regclass(%s)", (INDEX,))
+    index_exists = cursor.fetchone()[0] is not None
+
+    if not index_exists:
+        print(f"Adding {INDEX} index...")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON job_run (job_name, started_at);")
+        conn.commit()
+        print(f"✓ {INDEX} index added")
+    else:
+        print(f"✓ {INDEX} index already exists")
+
+    cursor.close()
+    conn.close()
+    print("\n✓ Scheduler tables verified/created successfully!")
+
+except psycopg2.Error as e:
+    print(f"Database error: {e}")
+except Exception as e:
+    print(f"Error: {e}")
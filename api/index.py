@@ -1 +1,4 @@
-from app import app
\ No newline at end of file
+"""Vercel serverless entry point; @vercel/python serves the WSGI ``app``"""
+from app import create_app
+
+app = create_app('serverless')
@@ -1,37 +1,26 @@
-import os
-from flask import Flask, render_template, session, redirect, url_for, request, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from dotenv import load_dotenv
+import threading
+from flask import Flask, current_app, render_template, session, redirect, url_for, request, flash, jsonify
 from datetime import timedelta, datetime, timezone
-from sqlalchemy import select
+from sqlalchemy import insert, select
 
-from models.auth_models import SystemUser
-
-# Import blueprints
-from routes.auth_routes import auth_bp
-from routes.admin_routes import admin_bp
-# from routes.bursar_routes import bursar_bp  # TODO: Implement bursar routes
-# from routes.headteacher_routes import headteacher_bp  # TODO: Implement headteacher routes
-from routes.secretary_routes import secretary_bp
-from routes.parent_routes import parent_bp
-from routes.teacher_routes import teacher_bp
-
-load_dotenv()
+from models.auth_models import db, Role, SystemUser
+from services.query_stats import query_budget
 
 def get_term_progress_info():
     """Get current term progress information for display in dashboards"""
-    from models.admin_models import SystemSetting, Term, AcademicYear
+    from models.admin_models import Term, AcademicYear
+    from services.settings import get_int_setting
 
     try:
         # Get current term and academic year settings
-        current_term_setting = SystemSetting.query.filter_by(key='current_term_id').first()
-        current_academic_year_setting = SystemSetting.query.filter_by(key='current_academic_year_id').first()
+        current_term_id = get_int_setting('current_term_id')
+        current_academic_year_id = get_int_setting('current_academic_year_id')
 
-        if not current_term_setting or not current_academic_year_setting:
+        if not current_term_id or not current_academic_year_id:
             return None
 
-        current_term = db.session.get(Term, int(current_term_setting.value))
-        current_academic_year = db.session.get(AcademicYear, int(current_academic_year_setting.value))
+        current_term = db.session.get(Term, current_term_id)
+        current_academic_year = db.session.get(AcademicYear, current_academic_year_id)
 
         if not current_term or not current_academic_year:
             return None
@@ -74,20 +63,10 @@ def get_term_progress_info():
             'term_end_date': term_end,
             'today': today
         }
-    except Exception as e:
-        print(f"Error getting term progress info: {e}")
+    except Exception:
+        current_app.logger.exception('Error getting term progress info')
         return None
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True, 'pool_recycle': 300}
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-
-# Custom Jinja2 filter for East African time formatting
-@app.template_filter('eat_time')
 def format_eat_time(dt):
     """Format datetime to East African Time (UTC+3) with AM/PM"""
     if dt is None:
@@ -96,31 +75,24 @@ def format_eat_time(dt):
     eat_time = dt + timedelta(hours=3)
     return eat_time.strftime('%Y-%m-%d %I:%M %p')
 
-db = SQLAlchemy()
-from flask_migrate import Migrate
-
-from models.auth_models import db, Role, SystemUser
-from models.admin_models import SchoolClass, Subject, Stream, ClassStream, TeacherAssignment, Notification
-from models.secretary_models import Pupil
-
-db.init_app(app)
-migrate = Migrate(app, db)
-
-# with app.app_context():
-#     db.create_all()
+def inject_version():
+    return {'version': '1.1.2'}
 
 # Auth routes
-@app.route('/auth/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
+        from services.login import authenticate
+        from services.write_behind import record_last_login
         email = request.form.get('email')
         password = request.form.get('password')
-        user = SystemUser.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        user, error = authenticate(email, password)
+        if user:
             session['user_id'] = user.id
             session['role'] = user.role.name
-            user.last_login = datetime.now(timezone.utc)
-            db.session.commit()
+            record_last_login(user, datetime.now(timezone.utc))
+            # A password rehashed by authenticate(), or last_login when the write-behind buffer is off
+            if db.session.is_modified(user):
+                db.session.commit()
             if user.role.name == 'Admin':
                 return redirect(url_for('admin.dashboard'))
             elif user.role.name == 'Teacher':
@@ -137,38 +109,17 @@ def login():
                 flash('Role not recognized')
                 return redirect(url_for('login'))
         else:
-            flash('Invalid email or password')
+            flash(error)
             return redirect(url_for('login'))
     return render_template('index.html')
 
-@app.route('/auth/logout')
 def logout():
     session.pop('user_id', None)
     return redirect(url_for('login'))
 
-from routes.auth_routes import auth_bp
-from routes.admin_routes import admin_bp
-from routes.secretary_routes import secretary_bp
-from routes.parent_routes import parent_bp
-from routes.teacher_routes import teacher_bp
-
-@app.context_processor
-def inject_version():
-    return {'version': '1.1.2'}
-
-app.register_blueprint(auth_bp)
-app.register_blueprint(admin_bp)
-# app.register_blueprint(bursar_bp)  # TODO: Implement bursar routes
-# app.register_blueprint(headteacher_bp)  # TODO: Implement headteacher routes
-app.register_blueprint(secretary_bp)
-app.register_blueprint(parent_bp)
-app.register_blueprint(teacher_bp)
-
-@app.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/teacher')
 def teacher():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -212,7 +163,6 @@ def teacher():
 
     return render_template('teacher/dashboard.html', notifications=notifications, term_progress=term_progress, unread_count=unread_count, school_name=school_name, contact_phone=contact_phone, contact_email=contact_email)
 
-@app.route('/secretary')
 def secretary():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -252,7 +202,6 @@ def secretary():
 
     return render_template('secretary/dashboard.html', notifications=notifications, term_progress=term_progress, unread_count=unread_count)
 
-@app.route('/bursar')
 def bursar():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -261,7 +210,7 @@ def bursar():
         return redirect(url_for('login'))
     
     # Check maintenance mode
-    from models.admin_models import SystemSetting, NotificationRead
+    from models.admin_models import SystemSetting, Notification, NotificationRead
     maintenance_setting = SystemSetting.query.filter_by(key='enable_maintenance_mode').first()
     if maintenance_setting and maintenance_setting.value == 'true':
         return render_template('maintenance.html')
@@ -295,7 +244,6 @@ def bursar():
 
     return render_template('bursar/dashboard.html', notifications=notifications, term_progress=term_progress, unread_count=unread_count, school_name=school_name, contact_phone=contact_phone, contact_email=contact_email)
 
-@app.route('/headteacher')
 def headteacher():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -339,7 +287,6 @@ def headteacher():
 
     return render_template('headteacher/dashboard.html', notifications=notifications, term_progress=term_progress, unread_count=unread_count, school_name=school_name, contact_phone=contact_phone, contact_email=contact_email)
 
-@app.route('/parent')
 def parent():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -364,7 +311,7 @@ def parent():
 
     return render_template('parent/dashboard.html', notifications=notifications, term_progress=term_progress, unread_count=unread_count)
 
-@app.route('/mark_notifications_read', methods=['POST'])
+@query_budget(8)
 def mark_notifications_read():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not logged in'})
@@ -375,39 +322,173 @@ def mark_notifications_read():
 
     try:
         from models.admin_models import Notification, NotificationRead
+        from services.notification_events import publish_read, visible_to
 
         # Get all notification IDs that are visible to this user
-        visible_notifications = Notification.query.filter(
-            (Notification.visibility == 'all') |
-            (Notification.visibility == 'all_except_parents_admins') |
-            (Notification.visibility == user.role.name.lower() + '_only')
-        ).all()
-
-        # Mark all visible notifications as read for this user
-        for notification in visible_notifications:
-            # Check if already marked as read
-            existing_read = NotificationRead.query.filter_by(
-                notification_id=notification.id,
-                user_id=user.id
-            ).first()
-
-            if not existing_read:
-                read_record = NotificationRead(
-                    notification_id=notification.id,
-                    user_id=user.id
-                )
-                db.session.add(read_record)
+        role = user.role.name
+        visibilities = [v for v in ('all', 'all_except_parents_admins', role.lower() + '_only') if visible_to(v, role)]
+        visible_ids = db.session.scalars(
+            select(Notification.id).where(Notification.visibility.in_(visibilities))).all()
+        read_ids = set(db.session.scalars(
+            select(NotificationRead.notification_id).where(NotificationRead.user_id == user.id)))
+
+        # Mark the unread ones as read in one INSERT
+        unread_ids = [notification_id for notification_id in visible_ids if notification_id not in read_ids]
+        if unread_ids:
+            db.session.execute(insert(NotificationRead), [
+                {'notification_id': notification_id, 'user_id': user.id} for notification_id in unread_ids
+            ])
 
         db.session.commit()
+        publish_read(user.id, visible_ids)
         return jsonify({'success': True})
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
-@app.route('/developer')
+def _current_admin():
+    if 'user_id' not in session:
+        return None
+    user = db.session.get(SystemUser, session['user_id'])
+    return user if user and user.role.name == 'Admin' else None
+
 def developer():
-    return render_template('developer.html')
+    # Recent request profiles are only shown to admins
+    profiles = None
+    if _current_admin():
+        from services.profiler import list_profiles
+        profiles = list_profiles()
+    return render_template('developer.html', profiles=profiles, profile_token=session.pop('profile_token', None))
+
+def developer_profile_token():
+    admin = _current_admin()
+    if not admin:
+        return redirect(url_for('login'))
+    from services.profiler import PROFILE_COOKIE, TOKEN_MAX_AGE, make_token
+    response = redirect(url_for('developer'))
+    if request.form.get('action') == 'stop':
+        response.delete_cookie(PROFILE_COOKIE)
+        return response
+    token = make_token(admin.id)
+    if request.form.get('action') == 'browser':
+        response.set_cookie(PROFILE_COOKIE, token, max_age=TOKEN_MAX_AGE, httponly=True, samesite='Lax',
+                            secure=request.is_secure)
+    else:
+        session['profile_token'] = token
+    return response
+
+def developer_profile(profile_id):
+    if not _current_admin():
+        return redirect(url_for('login'))
+    from services.profiler import load_profile
+    report = load_profile(profile_id)
+    if not report:
+        flash('Profile not found')
+        return redirect(url_for('developer'))
+    return render_template('developer_profile.html', report=report)
+
+def _register_core_routes(app):
+    app.add_template_filter(format_eat_time, 'eat_time')
+    app.context_processor(inject_version)
+    app.add_url_rule('/auth/login', view_func=login, methods=['GET', 'POST'])
+    app.add_url_rule('/auth/logout', view_func=logout)
+    app.add_url_rule('/', view_func=home)
+    app.add_url_rule('/teacher', view_func=teacher)
+    app.add_url_rule('/secretary', view_func=secretary)
+    app.add_url_rule('/bursar', view_func=bursar)
+    app.add_url_rule('/headteacher', view_func=headteacher)
+    app.add_url_rule('/parent', view_func=parent)
+    app.add_url_rule('/mark_notifications_read', view_func=mark_notifications_read, methods=['POST'])
+    app.add_url_rule('/developer', view_func=developer)
+    app.add_url_rule('/developer/profile-token', view_func=developer_profile_token, methods=['POST'])
+    app.add_url_rule('/developer/profiles/<profile_id>', view_func=developer_profile)
+
+def create_app(config_name=None):
+    """Build the app for a config profile (see config.py)"""
+    from config import get_config
+
+    app = Flask(__name__)
+    app.config.from_object(get_config(config_name))
+
+    from services.database import init_database
+    init_database(app, db)
+    if app.config['ENABLE_MIGRATIONS']:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from services.query_stats import init_query_stats
+    init_query_stats(app)
+
+    from services.metrics import init_metrics
+    init_metrics(app)
+
+    from services.app_logging import init_logging
+    init_logging(app)
+
+    from services.profiler import init_profiler
+    init_profiler(app)
+
+    from services.compression import init_compression
+    init_compression(app)
+
+    from services.static_assets import init_static_assets
+    init_static_assets(app)
+
+    from services.templates import init_templates
+    init_templates(app)
+
+    from services.login import init_login
+    init_login(app)
+
+    from services.write_behind import init_write_behind
+    init_write_behind(app, db)
+
+    from services.api_auth import init_api_auth
+    init_api_auth(app)
+
+    from services.notification_events import init_notification_events
+    init_notification_events(app, db)
+
+    from services.outbox import init_outbox
+    init_outbox(app, db)
+
+    from services.scheduler import init_scheduler
+    init_scheduler(app, db)
+
+    _register_core_routes(app)
+
+    from routes.auth_routes import auth_bp
+    from routes.admin_routes import admin_bp
+    # from routes.bursar_routes import bursar_bp  # TODO: Implement bursar routes
+    # from routes.headteacher_routes import headteacher_bp  # TODO: Implement headteacher routes
+    from routes.secretary_routes import secretary_bp
+    from routes.parent_routes import parent_bp
+    from routes.teacher_routes import teacher_bp
+    from routes.api_routes import api_bp
+    from routes.notification_routes import notifications_bp
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
+    # app.register_blueprint(bursar_bp)  # TODO: Implement bursar routes
+    # app.register_blueprint(headteacher_bp)  # TODO: Implement headteacher routes
+    app.register_blueprint(secretary_bp)
+    app.register_blueprint(parent_bp)
+    app.register_blueprint(teacher_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(notifications_bp)
+    return app
+
+_app_lock = threading.Lock()
+
+def __getattr__(name):
+    # `from app import app` keeps working for scripts and `flask run`; the
+    # default app is only built the first time something asks for it
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if 'app' not in globals():
+            globals()['app'] = create_app()
+    return globals()['app']
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
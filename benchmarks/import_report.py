@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cold-start breakdown: where the time goes between "python starts" and
+"first response".
+
+Runs a fresh interpreter with ``-X importtime`` that imports the app, calls
+create_app() for the chosen profile and serves one request. It then prints:
+
+* wall time for imports, create_app() and the first request
+* self import time summed per top-level package
+* the slowest individual modules by cumulative import time
+
+Usage:
+    python benchmarks/import_report.py                       # serverless profile
+    python benchmarks/import_report.py --profile development --top 30
+    python benchmarks/import_report.py --json > import.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1])
+created = time.perf_counter()
+app.test_client().get(sys.argv[2])
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request_ms": (served - created) * 1000}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Break down app cold-start time')
+    parser.add_argument('--profile', default='serverless', help='Config profile passed to create_app()')
+    parser.add_argument('--path', default='/', help='Path requested once after create_app()')
+    parser.add_argument('--top', type=int, default=20, help='How many packages and modules to list')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    return parser.parse_args()
+
+
+def parse_importtime(text):
+    """[(module, self_us, cumulative_us)] from -X importtime output"""
+    modules = []
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main():
+    args = parse_args()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, args.profile, args.path],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    timings_line = completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ''
+    if completed.returncode != 0 or not timings_line.startswith('{'):
+        sys.stderr.write(completed.stderr[-4000:])
+        return 1
+    timings = json.loads(timings_line)
+    modules = parse_importtime(completed.stderr)
+
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    report = {
+        'profile': args.profile,
+        'timings_ms': {key: round(value, 1) for key, value in timings.items()},
+        'modules_imported': len(modules),
+        'packages_ms': {name: round(us / 1000, 1) for name, us in
+                        sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]},
+        'slowest_modules_ms': [
+            {'module': name, 'cumulative_ms': round(cumulative / 1000, 1), 'self_ms': round(self_us / 1000, 1)}
+            for name, self_us, cumulative in sorted(modules, key=lambda item: item[2], reverse=True)[:args.top]
+        ],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    timings = report['timings_ms']
+    print(f"Profile '{args.profile}': {report['modules_imported']} modules imported")
+    print(f"  imports        {timings['import_ms']:>8.1f} ms")
+    print(f"  create_app()   {timings['create_app_ms']:>8.1f} ms")
+    print(f"  first request  {timings['first_request_ms']:>8.1f} ms  ({args.path})")
+    print(f"  total          {sum(timings.values()):>8.1f} ms")
+    print('\nSelf import time by top-level package:')
+    for name, ms in report['packages_ms'].items():
+        print(f'  {name:<32}{ms:>8.1f} ms')
+    print('\nSlowest modules (cumulative):')
+    for row in report['slowest_modules_ms']:
+        print(f"  {row['module']:<48}{row['cumulative_ms']:>8.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
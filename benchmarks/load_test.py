@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Exam-week load test against a running instance.
+
+Virtual users log in over HTTP and loop through role-specific flows with
+randomised think times. Teachers, by default most of the mix, open
+enter_marks, load the marks grid and save it repeatedly. Everything runs
+locally: accounts are discovered from the same database the server uses
+(generate_school_data.py gives every account the password "password"), and
+/metrics is sampled once a second for DB pool saturation.
+
+The report lists throughput, p50/p95/p99 latency and error rate per action.
+It is also written as JSON so runs can be compared between builds; pass
+--compare with an earlier report to print the differences, and
+--max-error-rate/--max-p95 to make the run fail (exit status 1).
+
+Usage:
+    flask run --port 5000 &
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --users 40 --duration 120
+    python benchmarks/load_test.py --mix Teacher=1 --think 0.5 --compare benchmarks/results/load-previous.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+DEFAULT_MIX = 'Teacher=0.8,Admin=0.05,Secretary=0.1,Parent=0.05'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulate exam-week traffic against a running instance')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Base URL of the running app')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'),
+                        help='Database the server uses, for discovering accounts (default: $DATABASE_URL)')
+    parser.add_argument('--password', default='password', help='Password shared by the test accounts')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run after ramp-up starts')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which users are started')
+    parser.add_argument('--think', type=float, default=2.0, help='Mean think time between actions, in seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Role weights, e.g. Teacher=0.8,Secretary=0.2')
+    parser.add_argument('--exam-type', default='Mid-term')
+    parser.add_argument('--saves-per-visit', type=int, default=3, help='Saves a teacher makes per marks grid load')
+    parser.add_argument('--metrics-token', default=os.getenv('METRICS_TOKEN'), help='Bearer token for /metrics')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results', 'load-latest.json'))
+    parser.add_argument('--compare', help='Earlier report to compare with')
+    parser.add_argument('--max-error-rate', type=float, help='Fail if the overall error rate is above this (0-1)')
+    parser.add_argument('--max-p95', type=float, help='Fail if the overall p95 is above this many milliseconds')
+    return parser.parse_args()
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        role, _, weight = part.partition('=')
+        if role.strip():
+            mix[role.strip()] = float(weight or 1)
+    return mix
+
+
+def discover(args, roles):
+    """Accounts per role plus the current year/term, read from the server's database"""
+    if not args.database_url:
+        sys.exit('Set --database-url (or DATABASE_URL) to the database the server uses')
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', 'load-test')
+
+    from app import app
+    from models.auth_models import Role, SystemUser, db
+    from models.admin_models import TeacherAssignment
+    from services.settings import get_int_setting
+
+    accounts = {}
+    with app.app_context():
+        for role in Role.query.filter(Role.name.in_(roles)).all():
+            query = SystemUser.query.filter_by(role_id=role.id)
+            if role.name == 'Teacher':
+                # Teachers without assignments have no marks to enter
+                assigned = db.session.query(TeacherAssignment.teacher_id).distinct()
+                query = query.filter(SystemUser.id.in_(assigned))
+            accounts[role.name] = [user.email for user in query.order_by(SystemUser.id).all()]
+        period = {
+            'academic_year_id': get_int_setting('current_academic_year_id'),
+            'term_id': get_int_setting('current_term_id'),
+        }
+    return accounts, period
+
+
+class Recorder:
+    """Thread-safe store of (action, milliseconds, ok) samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, action, ms, ok):
+        with self.lock:
+            self.samples[action].append(ms)
+            if not ok:
+                self.errors[action] += 1
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, args, role, email, period, recorder, stop_at, rng):
+        super().__init__(daemon=True)
+        self.args = args
+        self.role = role
+        self.email = email
+        self.period = period
+        self.recorder = recorder
+        self.stop_at = stop_at
+        self.rng = rng
+        self.http = requests.Session()
+
+    def request(self, action, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.args.url + path, timeout=self.args.timeout,
+                                         allow_redirects=False, **kwargs)
+            # A redirect back to the login page means the session was lost
+            ok = response.status_code < 400 and '/auth/login' not in response.headers.get('Location', '')
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(action, (time.perf_counter() - started) * 1000, ok)
+        return response if ok else None
+
+    def think(self):
+        time.sleep(min(self.rng.expovariate(1 / self.args.think), self.args.think * 5) if self.args.think else 0)
+
+    def running(self):
+        return time.monotonic() < self.stop_at
+
+    def login(self):
+        response = self.request('login', 'POST', '/auth/login',
+                                data={'email': self.email, 'password': self.args.password})
+        return response is not None and response.status_code == 302
+
+    def run(self):
+        if not self.login():
+            return
+        flow = getattr(self, f'flow_{self.role.lower()}')
+        while self.running():
+            flow()
+
+    def flow_teacher(self):
+        query = {**self.period, 'exam_type': self.args.exam_type}
+        self.request('teacher_dashboard', 'GET', '/teacher')
+        self.think()
+        self.request('enter_marks', 'GET', '/teacher/enter-marks', params=query, headers=AJAX)
+        self.think()
+        response = self.request('load_marks_data', 'GET', '/teacher/load-marks-data', params=query, headers=AJAX)
+        if response is None:
+            return
+        grid = response.json()
+        subjects = [subject for subject in grid.get('subjects', []) if subject.get('can_edit')]
+        if not subjects or not grid.get('pupils'):
+            self.think()
+            return
+        existing = grid.get('existing_marks', {})
+        for _ in range(self.args.saves_per_visit):
+            if not self.running():
+                return
+            self.think()
+            subject = self.rng.choice(subjects)
+            marks = [{
+                'pupil_id': pupil['id'],
+                'marks_obtained': (existing.get(f"{pupil['id']}_{subject['id']}") or {}).get('marks_obtained')
+                or self.rng.randint(30, 95),
+                'remarks': '',
+            } for pupil in grid['pupils']]
+            self.request('save_marks', 'POST', '/teacher/save-marks', json={
+                **self.period, 'exam_type': self.args.exam_type,
+                'marks_data': [{'subject_id': subject['id'], 'pupil_marks': marks}],
+            })
+
+    def flow_admin(self):
+        self.request('admin_dashboard', 'GET', '/admin/')
+        self.think()
+        self.request('manage_users', 'GET', '/admin/manage_users', headers=AJAX)
+        self.think()
+
+    def flow_secretary(self):
+        self.request('secretary_dashboard', 'GET', '/secretary')
+        self.think()
+        self.request('manage_pupils', 'GET', '/secretary/manage-pupils', headers=AJAX)
+        self.think()
+
+    def flow_parent(self):
+        self.request('parent_dashboard', 'GET', '/parent')
+        self.think()
+        self.request('search_pupils', 'POST', '/parent/search_pupils',
+                     json={'search_term': self.rng.choice('aeiou')})
+        self.think()
+
+
+class PoolSampler(threading.Thread):
+    """Polls /metrics for the DB pool gauges while the test runs"""
+
+    def __init__(self, args, stop_event):
+        super().__init__(daemon=True)
+        self.args = args
+        self.stop_event = stop_event
+        self.checked_out = []
+        self.checkouts = []
+        self.available = True
+
+    def run(self):
+        headers = {'Authorization': f'Bearer {self.args.metrics_token}'} if self.args.metrics_token else {}
+        while not self.stop_event.wait(1):
+            try:
+                response = requests.get(self.args.url + '/metrics', headers=headers, timeout=5)
+            except requests.RequestException:
+                continue
+            if response.status_code != 200:
+                self.available = False
+                return
+            values = dict(re.findall(r'^(db_pool_checked_out|db_pool_checkouts_total) (\S+)$', response.text, re.M))
+            if values:
+                self.checked_out.append(float(values['db_pool_checked_out']))
+                self.checkouts.append((time.monotonic(), float(values['db_pool_checkouts_total'])))
+
+    def summary(self):
+        if not self.checked_out:
+            return None
+        elapsed = self.checkouts[-1][0] - self.checkouts[0][0]
+        return {
+            'checked_out_max': max(self.checked_out),
+            'checked_out_mean': round(statistics.mean(self.checked_out), 2),
+            'checkouts_per_s': round((self.checkouts[-1][1] - self.checkouts[0][1]) / elapsed, 1) if elapsed else None,
+        }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def summarise(samples, errors, elapsed):
+    count = len(samples)
+    return {
+        'requests': count,
+        'throughput_rps': round(count / elapsed, 2),
+        'error_rate': round(errors / count, 4) if count else 0,
+        'p50_ms': round(statistics.median(samples), 1) if count else None,
+        'p95_ms': round(percentile(samples, 0.95), 1) if count else None,
+        'p99_ms': round(percentile(samples, 0.99), 1) if count else None,
+    }
+
+
+def print_report(report, previous=None):
+    print(f"\n{'action':<22}{'reqs':>7}{'rps':>8}{'err %':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(report['actions'].items()) + [('TOTAL', report['overall'])]
+    for name, row in rows:
+        line = (f"{name:<22}{row['requests']:>7}{row['throughput_rps']:>8}{row['error_rate'] * 100:>8.2f}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+        before = (previous or {}).get('actions', {}).get(name) if name != 'TOTAL' else (previous or {}).get('overall')
+        if before and before.get('p95_ms') and row['p95_ms'] is not None:
+            change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            line += f"   p95 {change:+.0f}% vs {before['p95_ms']}"
+        print(line)
+    pool = report['pool']
+    if pool:
+        print(f"\nDB pool: peak {pool['checked_out_max']:.0f} checked out, mean {pool['checked_out_mean']}, "
+              f"{pool['checkouts_per_s']} checkouts/s")
+    else:
+        print('\nDB pool: /metrics not readable (pass --metrics-token or set METRICS_TOKEN on the server)')
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    accounts, period = discover(args, list(mix))
+    mix = {role: weight for role, weight in mix.items() if accounts.get(role)}
+    if not mix:
+        sys.exit('No accounts found for any role in --mix')
+    for role in set(parse_mix(args.mix)) - set(mix):
+        print(f'Skipping {role}: no accounts')
+
+    recorder = Recorder()
+    started = time.monotonic()
+    stop_at = started + args.duration
+    stop_event = threading.Event()
+    sampler = PoolSampler(args, stop_event)
+    sampler.start()
+
+    pools = {role: itertools.cycle(emails) for role, emails in accounts.items() if role in mix}
+    roles, weights = zip(*mix.items())
+    users = []
+    for index in range(args.users):
+        role = rng.choices(roles, weights)[0]
+        user = VirtualUser(args, role, next(pools[role]), period, recorder, stop_at, random.Random(rng.random()))
+        users.append(user)
+        user.start()
+        if args.ramp_up and index < args.users - 1:
+            time.sleep(args.ramp_up / args.users)
+    print(f'{len(users)} users started ({", ".join(f"{role}={sum(u.role == role for u in users)}" for role in mix)}), '
+          f'running until {args.duration:.0f}s')
+
+    for user in users:
+        user.join(max(stop_at - time.monotonic(), 0) + args.timeout)
+    stop_event.set()
+    elapsed = time.monotonic() - started
+
+    all_samples = [ms for samples in recorder.samples.values() for ms in samples]
+    if not all_samples:
+        sys.exit('No requests completed')
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'url': args.url,
+        'users': args.users,
+        'duration_s': round(elapsed, 1),
+        'think_s': args.think,
+        'mix': mix,
+        'actions': {action: summarise(samples, recorder.errors[action], elapsed)
+                    for action, samples in sorted(recorder.samples.items())},
+        'overall': summarise(all_samples, sum(recorder.errors.values()), elapsed),
+        'pool': sampler.summary(),
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as handle:
+            previous = json.load(handle)
+    print_report(report, previous)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f'\nReport written to {args.output}')
+
+    failed = False
+    if args.max_error_rate is not None and report['overall']['error_rate'] > args.max_error_rate:
+        print(f"Error rate {report['overall']['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+        failed = True
+    if args.max_p95 is not None and report['overall']['p95_ms'] > args.max_p95:
+        print(f"p95 {report['overall']['p95_ms']}ms is above {args.max_p95}ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmarks against a synthetic SQLite school.
+
+Boots the app on benchmarks/bench.db (generated with generate_school_data.py
+on first use), drives the hot endpoints through the Flask test client and
+records p50/p95 latency, SQL query count and peak traced memory for each.
+Results are written to benchmarks/results/latest.json and compared with
+benchmarks/baseline.json, or with the previous run when there is no
+baseline; the script exits with status 1 on a regression.
+
+Usage:
+    python benchmarks/run_benchmarks.py                  # run and compare
+    python benchmarks/run_benchmarks.py --save-baseline  # accept these numbers
+    python benchmarks/run_benchmarks.py --regenerate --pupils 5000
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the hot endpoints')
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--regenerate', action='store_true', help='Rebuild the synthetic database')
+    parser.add_argument('--pupils', type=int, default=2000)
+    parser.add_argument('--teachers', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', help='Comma-separated scenario names to run')
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'baseline.json'))
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results', 'latest.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='Write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown of p95 and memory')
+    parser.add_argument('--noise-ms', type=float, default=5.0, help='Ignore p95 changes smaller than this')
+    return parser.parse_args()
+
+
+def prepare_database(args):
+    if args.regenerate and os.path.exists(args.db):
+        os.remove(args.db)
+    fresh = not os.path.exists(args.db)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + args.db
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+    from app import app
+    from models.auth_models import db
+    app.config['SQL_INSTRUMENTATION'] = True
+
+    if fresh:
+        from generate_school_data import Generator
+        generation_args = argparse.Namespace(
+            seed=args.seed, pupils=args.pupils, teachers=args.teachers, streams='East,West,North',
+            years=2, last_year=2025, exam_types='Mid-term,End-term', notifications=200, read_ratio=0.6
+        )
+        with app.app_context():
+            db.create_all()
+            Generator(db, generation_args).run()
+    return app
+
+
+def ensure_role_users(app):
+    """Return {role name: user id}, creating a user for roles the generator leaves empty"""
+    from models.auth_models import Role, SystemUser, db, next_display_id
+    from models.admin_models import TeacherAssignment
+    users = {}
+    with app.app_context():
+        for role in Role.query.all():
+            if role.name == 'Teacher':
+                user_id = db.session.query(TeacherAssignment.teacher_id).order_by(TeacherAssignment.teacher_id).limit(1).scalar()
+            else:
+                user = SystemUser.query.filter_by(role_id=role.id).order_by(SystemUser.id).first()
+                if not user:
+                    user = SystemUser(display_id=next_display_id(), username=f'bench-{role.name.lower()}',
+                                      email=f'bench-{role.name.lower()}@example.com', role_id=role.id)
+                    user.set_password('password')
+                    db.session.add(user)
+                    db.session.commit()
+                user_id = user.id
+            users[role.name] = user_id
+    return users
+
+
+def current_period(app):
+    from services.settings import get_int_setting
+    with app.app_context():
+        return get_int_setting('current_academic_year_id'), get_int_setting('current_term_id')
+
+
+def build_scenarios(app, users):
+    """(name, role, method, path, request kwargs) for each benchmarked endpoint"""
+    from models.secretary_models import Pupil
+    from routes.teacher_routes import get_teacher_pupils
+    year_id, term_id = current_period(app)
+    marks_query = f'academic_year_id={year_id}&term_id={term_id}&exam_type=Mid-term'
+
+    with app.app_context():
+        teacher_pupils = get_teacher_pupils(users['Teacher'])
+        pupil_id = teacher_pupils[0].id if teacher_pupils else Pupil.query.first().id
+        search_term = Pupil.query.first().last_name[:4]
+
+    # save_marks re-saves the marks load_marks_data returns, so repeated runs do the same work
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = users['Teacher']
+    loaded = client.get(f'/teacher/load-marks-data?{marks_query}', headers=AJAX).get_json() or {}
+    editable = [subject for subject in loaded.get('subjects', []) if subject.get('can_edit')][:1]
+    existing = loaded.get('existing_marks', {})
+    marks_data = [{
+        'subject_id': subject['id'],
+        'pupil_marks': [{
+            'pupil_id': pupil['id'],
+            'marks_obtained': (existing.get(f"{pupil['id']}_{subject['id']}") or {}).get('marks_obtained') or 60,
+            'remarks': 'Benchmark',
+        } for pupil in loaded.get('pupils', [])],
+    } for subject in editable]
+
+    return [
+        ('admin_dashboard', 'Admin', 'GET', '/admin/', {}),
+        ('teacher_dashboard', 'Teacher', 'GET', '/teacher', {}),
+        ('secretary_dashboard', 'Secretary', 'GET', '/secretary', {}),
+        ('headteacher_dashboard', 'Headteacher', 'GET', '/headteacher', {}),
+        ('bursar_dashboard', 'Bursar', 'GET', '/bursar', {}),
+        ('parent_dashboard', 'Parent', 'GET', '/parent', {}),
+        ('enter_marks', 'Teacher', 'GET', f'/teacher/enter-marks?{marks_query}', {'headers': AJAX}),
+        ('load_marks_data', 'Teacher', 'GET', f'/teacher/load-marks-data?{marks_query}', {'headers': AJAX}),
+        ('save_marks', 'Teacher', 'POST', '/teacher/save-marks', {'json': {
+            'academic_year_id': year_id, 'term_id': term_id, 'exam_type': 'Mid-term', 'marks_data': marks_data}}),
+        ('search_pupils', 'Parent', 'POST', '/parent/search_pupils', {'json': {'search_term': search_term}}),
+        ('manage_pupils', 'Secretary', 'GET', '/secretary/manage-pupils', {'headers': AJAX}),
+        ('mark_notifications_read', 'Teacher', 'POST', '/mark_notifications_read', {}),
+        ('api_academic_history', 'Teacher', 'GET', f'/teacher/api/academic-history?pupil_id={pupil_id}', {}),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_scenario(app, users, scenario, iterations, warmup):
+    name, role, method, path, kwargs = scenario
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = users[role]
+        session['role'] = role
+
+    def call():
+        return client.open(path, method=method, **kwargs)
+
+    for _ in range(warmup):
+        call()
+
+    timings, queries, status = [], [], None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = call()
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(int(response.headers.get('X-Query-Count', 0)))
+        status = response.status_code
+
+    # Memory is traced in a separate pass because tracemalloc slows everything down
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': status,
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, noise_ms):
+    """Messages for every metric that got worse than the baseline allows"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance) and current['p95_ms'] - previous['p95_ms'] > noise_ms:
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+        if current['peak_kb'] > previous['peak_kb'] * (1 + tolerance) and current['peak_kb'] - previous['peak_kb'] > 256:
+            regressions.append(f"{name}: peak memory {previous['peak_kb']}KB -> {current['peak_kb']}KB")
+        if current['status'] != previous['status']:
+            regressions.append(f"{name}: status {previous['status']} -> {current['status']}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    app = prepare_database(args)
+    users = ensure_role_users(app)
+    scenarios = build_scenarios(app, users)
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario[0] in wanted]
+
+    results = {}
+    print(f"{'scenario':<26}{'status':>7}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}")
+    for scenario in scenarios:
+        result = run_scenario(app, users, scenario, args.iterations, args.warmup)
+        results[scenario[0]] = result
+        print(f"{scenario[0]:<26}{result['status']:>7}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['queries']:>9}{result['peak_kb']:>10}")
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'scenarios': results,
+    }
+    previous_path = args.baseline if os.path.exists(args.baseline) else args.output
+    previous = None
+    if os.path.exists(previous_path):
+        with open(previous_path) as handle:
+            previous = json.load(handle)['scenarios']
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if previous is None:
+        print('Nothing to compare with yet; run with --save-baseline to record a baseline')
+        return 0
+    regressions = compare(results, previous, args.tolerance, args.noise_ms)
+    if regressions:
+        print(f'\nRegressions against {previous_path}:')
+        for message in regressions:
+            print(f'  {message}')
+        return 1
+    print(f'\nNo regressions against {previous_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Prepare static/ for deployment.
+
+Writes static/manifest.json with a content hash for every file, which the
+app uses to build fingerprinted URLs such as /static/logo.3f2a9c1b7d4e.png.
+It also writes a .gz sibling, plus a .br sibling when the brotli package
+is installed, for every compressible file that shrinks by at least 10%.
+Run it before each deploy; the outputs are not committed. On Vercel,
+vercel_build.sh runs it as the build command.
+
+Usage:
+    python build_static.py
+    python build_static.py --clean     # remove the generated files
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.static_assets import MANIFEST_NAME, PRECOMPRESSED, file_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.json', '.svg', '.html', '.txt', '.csv', '.map', '.xml', '.ico')
+GENERATED_SUFFIXES = tuple(suffix for _, suffix in PRECOMPRESSED)
+
+
+def source_files():
+    for directory, _, names in os.walk(STATIC_DIR):
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+            if relative == MANIFEST_NAME or name.endswith(GENERATED_SUFFIXES):
+                continue
+            yield relative, path
+
+
+def write_if_smaller(path, data, original_size):
+    if len(data) <= original_size * 0.9:
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        return True
+    if os.path.exists(path):
+        os.remove(path)
+    return False
+
+
+def clean():
+    removed = 0
+    for directory, _, names in os.walk(STATIC_DIR):
+        for name in names:
+            if name.endswith(GENERATED_SUFFIXES) or (directory == STATIC_DIR and name == MANIFEST_NAME):
+                os.remove(os.path.join(directory, name))
+                removed += 1
+    print(f'Removed {removed} generated files')
+
+
+def build():
+    hashes = {}
+    compressed = 0
+    for relative, path in source_files():
+        hashes[relative] = file_hash(path)
+        if not relative.lower().endswith(COMPRESSIBLE):
+            continue
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        if write_if_smaller(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0), len(data)):
+            compressed += 1
+        if brotli is not None:
+            write_if_smaller(path + '.br', brotli.compress(data, quality=11), len(data))
+
+    with open(os.path.join(STATIC_DIR, MANIFEST_NAME), 'w') as handle:
+        json.dump({'files': hashes}, handle, indent=2, sort_keys=True)
+    print(f'Fingerprinted {len(hashes)} files, precompressed {compressed}'
+          + ('' if brotli is not None else ' (gzip only; install brotli for .br)'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress static files')
+    parser.add_argument('--clean', action='store_true', help='Remove generated files instead')
+    args = parser.parse_args()
+    if args.clean:
+        clean()
+    else:
+        build()
+
+
+if __name__ == '__main__':
+    main()
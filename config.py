@@ -0,0 +1,150 @@
+"""Configuration profiles for create_app().
+
+The profile is picked by name, or from the ``APP_CONFIG`` environment
+variable. On Vercel (``VERCEL`` is set) it defaults to ``serverless``;
+everywhere else it defaults to ``development``.
+"""
+import os
+from datetime import timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine options are derived from these (see services/database.py)
+    DB_CONNECTION_STRATEGY = os.getenv('DB_CONNECTION_STRATEGY', 'pooled')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 300))
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+    # Optional read replica for GET requests; unset means one database
+    REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+    DB_READ_YOUR_WRITES_SECONDS = int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', 10))
+    # Pragmas applied to every SQLite connection (see services/database.py)
+    SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'true') == 'true'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,        # KiB, i.e. 64 MB
+        'mmap_size': 268435456,      # 256 MB
+        'busy_timeout': 15000,       # ms; save_marks can hold the write lock for seconds
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_OPTIMIZE_INTERVAL = int(os.getenv('SQLITE_OPTIMIZE_INTERVAL', 6 * 3600))
+    PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
+    # Login throttling and password hashing (see services/login.py)
+    # Matches the stored pbkdf2 hashes; run add_password_hash_length.py before choosing scrypt
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    LOGIN_THROTTLE_WINDOW = int(os.getenv('LOGIN_THROTTLE_WINDOW', 900))
+    LOGIN_IP_ATTEMPTS_FACTOR = int(os.getenv('LOGIN_IP_ATTEMPTS_FACTOR', 10))
+    LOGIN_VERIFY_WORKERS = int(os.getenv('LOGIN_VERIFY_WORKERS', min(4, os.cpu_count() or 1)))
+    LOGIN_VERIFY_QUEUE = int(os.getenv('LOGIN_VERIFY_QUEUE', 16))
+    LOGIN_VERIFY_WAIT = float(os.getenv('LOGIN_VERIFY_WAIT', 5))
+    # Batched last_login updates (see services/write_behind.py)
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'true') == 'true'
+    WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', 5))
+    WRITE_BEHIND_MAX_ENTRIES = int(os.getenv('WRITE_BEHIND_MAX_ENTRIES', 200))
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', 3))  # then the entry is dropped
+    # /api/v1 bearer tokens (see services/api_auth.py); signed with SECRET_KEY if unset
+    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 15)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 14)))
+    # Live notification stream (see services/notification_events.py)
+    SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_MAX_SECONDS = int(os.getenv('SSE_MAX_SECONDS', 300))
+    SSE_POLL_SECONDS = int(os.getenv('SSE_POLL_SECONDS', 5))
+    SSE_BACKLOG = int(os.getenv('SSE_BACKLOG', 500))
+    # Outgoing mail; the SMTP system settings override server, port and username
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    # Unset means STARTTLS on port 587 and SSL on port 465
+    MAIL_USE_TLS = {'true': True, 'false': False}.get(os.getenv('MAIL_USE_TLS'))
+    MAIL_USE_SSL = {'true': True, 'false': False}.get(os.getenv('MAIL_USE_SSL'))
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+    MAIL_MAX_EMAILS = int(os.getenv('MAIL_MAX_EMAILS', 100))  # per SMTP connection
+    # Background sending of queued mail (see services/outbox.py)
+    OUTBOX_SENDER_ENABLED = os.getenv('OUTBOX_SENDER_ENABLED', 'true') == 'true'
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_RATE_PER_MINUTE = int(os.getenv('OUTBOX_RATE_PER_MINUTE', 120))
+    OUTBOX_POLL_SECONDS = int(os.getenv('OUTBOX_POLL_SECONDS', 30))
+    OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 300))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+    OUTBOX_RETRY_SECONDS = int(os.getenv('OUTBOX_RETRY_SECONDS', 60))
+    # Periodic maintenance jobs (see services/scheduler.py and services/jobs.py)
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true') == 'true'
+    SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', 30))
+    # Enables /cron/run-jobs for an external cron service
+    CRON_SECRET = os.getenv('CRON_SECRET')
+    BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(BASE_DIR, 'backups'))
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 8))
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    TEMPLATES_AUTO_RELOAD = True
+    # Compiled template bytecode shared by workers (see services/templates.py)
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR')
+    # Flask-Migrate pulls in alembic and mako; only needed for `flask db ...`
+    ENABLE_MIGRATIONS = True
+
+
+class DevelopmentConfig(Config):
+    pass
+
+
+class ProductionConfig(Config):
+    # Templates only change on deploy; don't stat them on every render
+    TEMPLATES_AUTO_RELOAD = False
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(BASE_DIR, 'template_cache'))
+
+
+class ServerlessConfig(ProductionConfig):
+    # Every cold start pays for imports, and migrations never run from a function
+    ENABLE_MIGRATIONS = False
+    DB_CONNECTION_STRATEGY = os.getenv('DB_CONNECTION_STRATEGY', 'serverless')
+    # Functions are cut off after ~10s; fail the query before the platform does
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 8000))
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 5))
+    # Functions are cut off after ~10s; the browser reconnects with Last-Event-ID
+    SSE_MAX_SECONDS = int(os.getenv('SSE_MAX_SECONDS', 8))
+    # A frozen function never runs background threads; due jobs run from /cron/run-jobs
+    WRITE_BEHIND_ENABLED = False
+    OUTBOX_SENDER_ENABLED = False
+    SCHEDULER_ENABLED = False
+    # Vercel's edge proxy sets X-Forwarded-For
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WRITE_BEHIND_ENABLED = False
+    OUTBOX_SENDER_ENABLED = False
+    SCHEDULER_ENABLED = False
+    # Never DATABASE_URL: the test suite drops every table
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL') or 'sqlite://'
+    ENABLE_MIGRATIONS = False
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'serverless': ServerlessConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    name = name or os.getenv('APP_CONFIG') or ('serverless' if os.getenv('VERCEL') else 'development')
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown config profile '{name}'; expected one of {', '.join(PROFILES)}")
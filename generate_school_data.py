@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Generate a large, deterministic synthetic school for benchmarking.
+
+The same --seed always produces the same data. Rows are written with bulk
+Core INSERTs in chunks and explicit primary keys, so a million assessment
+results take seconds rather than minutes.
+
+The schema holds one school per database; generate several schools by
+running the script against several DATABASE_URLs.
+
+Examples:
+    python generate_school_data.py --reset
+    python generate_school_data.py --pupils 8000 --teachers 120 --years 4 --seed 7
+    python generate_school_data.py --database-url sqlite:///bench.db --reset
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CLASS_NAMES = ['P.1', 'P.2', 'P.3', 'P.4', 'P.5', 'P.6', 'P.7']
+SUBJECT_NAMES = ['Mathematics', 'English', 'Science', 'Social Studies',
+                 'Religious Education', 'Kiswahili', 'Creative Arts', 'Physical Education']
+FIRST_NAMES = ['David', 'Daniel', 'James', 'John', 'Joseph', 'Moses', 'Paul', 'Peter', 'Samuel', 'Isaac',
+               'Mary', 'Grace', 'Esther', 'Ruth', 'Sarah', 'Faith', 'Joy', 'Patience', 'Agnes', 'Brenda']
+LAST_NAMES = ['Mukasa', 'Okello', 'Namutebi', 'Ssempala', 'Nakato', 'Kato', 'Babirye', 'Opio',
+              'Achieng', 'Tumusiime', 'Kiggundu', 'Nansubuga', 'Byaruhanga', 'Atim', 'Wasswa']
+REMARKS = ['Excellent work', 'Good effort', 'Can do better', 'Keep it up', 'Needs more practice', 'Improving steadily']
+VISIBILITIES = ['all', 'all_except_parents_admins', 'teacher_only', 'secretary_only']
+CHUNK_SIZE = 20000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', help='Defaults to DATABASE_URL from the environment')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pupils', type=int, default=5000)
+    parser.add_argument('--teachers', type=int, default=100)
+    parser.add_argument('--streams', default='East,West,North')
+    parser.add_argument('--years', type=int, default=3, help='Number of academic years to generate')
+    parser.add_argument('--last-year', type=int, default=date.today().year, help='Newest academic year (default: this year)')
+    parser.add_argument('--exam-types', default='Mid-term,End-term')
+    parser.add_argument('--notifications', type=int, default=200)
+    parser.add_argument('--read-ratio', type=float, default=0.6, help='Share of notifications each user has read')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first')
+    return parser.parse_args()
+
+
+class Generator:
+    def __init__(self, db, args):
+        self.db = db
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.counts = {}
+
+    def next_id(self, model):
+        return (self.db.session.query(self.db.func.max(model.id)).scalar() or 0) + 1
+
+    def bulk_insert(self, model, rows):
+        """Insert an iterable of dict rows in chunks and advance PostgreSQL id sequences"""
+        table = model.__table__
+        rows = iter(rows)
+        inserted = 0
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            self.db.session.execute(table.insert(), chunk)
+            self.db.session.commit()
+            inserted += len(chunk)
+        if inserted and self.db.engine.dialect.name == 'postgresql':
+            self.db.session.execute(self.db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT MAX(id) FROM {table.name}))"
+            ))
+            self.db.session.commit()
+        self.counts[table.name] = self.counts.get(table.name, 0) + inserted
+
+    def get_or_create(self, model, names, **extra):
+        """Return {name: id} for reference rows, inserting the missing ones"""
+        existing = {row.name: row.id for row in model.query.all()}
+        next_id = self.next_id(model)
+        rows = []
+        for name in names:
+            if name not in existing:
+                rows.append({'id': next_id, 'name': name, **extra})
+                existing[name] = next_id
+                next_id += 1
+        self.bulk_insert(model, rows)
+        return {name: existing[name] for name in names}
+
+    def run(self):
+        from models.auth_models import Role, SystemUser
+        from models.admin_models import (SchoolClass, Subject, Stream, ClassStream, TeacherAssignment,
+                                         AcademicYear, Term, ExamType, Notification, NotificationRead, SystemSetting)
+        from models.secretary_models import Pupil
+        from models.teacher_models import AssessmentRecord, AssessmentResult, SubjectRemark
+        from services.exam_schedules import generate_exam_schedules
+        from routes.teacher_routes import calculate_grade, calculate_points
+        from werkzeug.security import generate_password_hash
+
+        db = self.db
+        rng = self.rng
+        args = self.args
+        now = datetime(2026, 1, 1)
+
+        # Reference data
+        roles = self.get_or_create(Role, ['Admin', 'Teacher', 'Secretary', 'Parent', 'Headteacher', 'Bursar'])
+        classes = self.get_or_create(SchoolClass, CLASS_NAMES)
+        streams = self.get_or_create(Stream, [name.strip() for name in args.streams.split(',') if name.strip()])
+        subjects = self.get_or_create(Subject, SUBJECT_NAMES)
+        exam_types = [name.strip() for name in args.exam_types.split(',') if name.strip()]
+        self.get_or_create(ExamType, exam_types, is_active=True)
+
+        # Academic years with three terms each
+        first_year = args.last_year - args.years + 1
+        year_ids = []
+        terms = []  # (term_id, start_date)
+        year_id = self.next_id(AcademicYear)
+        term_id = self.next_id(Term)
+        year_rows, term_rows = [], []
+        known_years = {row.name for row in AcademicYear.query.all()}
+        for year in range(first_year, first_year + args.years):
+            if str(year) in known_years:
+                continue
+            year_rows.append({'id': year_id, 'name': str(year), 'start_date': date(year, 2, 1), 'end_date': date(year, 12, 1)})
+            for number, (start, end) in enumerate([((2, 1), (4, 30)), ((5, 20), (8, 15)), ((9, 5), (11, 30))], 1):
+                start_date, end_date = date(year, *start), date(year, *end)
+                term_rows.append({'id': term_id, 'name': f'Term {number}', 'academic_year_id': year_id,
+                                  'start_date': start_date, 'end_date': end_date, 'days': (end_date - start_date).days})
+                terms.append((term_id, start_date))
+                term_id += 1
+            year_ids.append(year_id)
+            year_id += 1
+        self.bulk_insert(AcademicYear, year_rows)
+        self.bulk_insert(Term, term_rows)
+
+        # Staff: one admin plus the teachers; hashing once keeps this fast
+        password_hash = generate_password_hash('password')
+        user_id = self.next_id(SystemUser)
+        display_id = (db.session.query(db.func.max(SystemUser.display_id)).scalar() or 0) + 1
+        suffix = f'{args.seed}-{user_id}'
+        user_rows = [{'id': user_id, 'display_id': display_id, 'username': f'admin-{suffix}', 'email': f'admin-{suffix}@example.com',
+                      'password_hash': password_hash, 'role_id': roles['Admin'], 'created_at': now}]
+        admin_id = user_id
+        teacher_ids = []
+        for index in range(args.teachers):
+            user_id += 1
+            display_id += 1
+            name = f'{rng.choice(FIRST_NAMES)[0].lower()}{rng.choice(LAST_NAMES).lower()}{index}-{suffix}'
+            user_rows.append({'id': user_id, 'display_id': display_id, 'username': name, 'email': f'{name}@example.com',
+                              'password_hash': password_hash, 'role_id': roles['Teacher'], 'created_at': now})
+            teacher_ids.append(user_id)
+        self.bulk_insert(SystemUser, user_rows)
+        if db.engine.dialect.name == 'postgresql':
+            # Keep the display_id sequence used by next_display_id() ahead of the explicit ids
+            from models.auth_models import DISPLAY_ID_SEQUENCE
+            if db.session.execute(db.text(f"SELECT to_regclass('{DISPLAY_ID_SEQUENCE}')")).scalar() is not None:
+                db.session.execute(db.text(f"SELECT setval('{DISPLAY_ID_SEQUENCE}', {display_id})"))
+                db.session.commit()
+
+        # Every class/stream pair, with each subject given to a teacher round-robin
+        existing_pairs = {(row.class_id, row.stream_id): row.id for row in ClassStream.query.all()}
+        class_stream_id = self.next_id(ClassStream)
+        pair_rows = []
+        for class_id in classes.values():
+            for stream_id in streams.values():
+                if (class_id, stream_id) not in existing_pairs:
+                    pair_rows.append({'id': class_stream_id, 'class_id': class_id, 'stream_id': stream_id})
+                    existing_pairs[(class_id, stream_id)] = class_stream_id
+                    class_stream_id += 1
+        self.bulk_insert(ClassStream, pair_rows)
+        pairs = [(class_id, stream_id, existing_pairs[(class_id, stream_id)])
+                 for class_id in classes.values() for stream_id in streams.values()]
+
+        assignment_rows = []
+        teacher_for = {}
+        assignment_id = self.next_id(TeacherAssignment)
+        for index, (class_id, stream_id, pair_id) in enumerate(pairs):
+            for offset, subject_id in enumerate(subjects.values()):
+                teacher_id = teacher_ids[(index * len(subjects) + offset) % len(teacher_ids)] if teacher_ids else admin_id
+                teacher_for[(pair_id, subject_id)] = teacher_id
+                if teacher_ids:
+                    assignment_rows.append({'id': assignment_id, 'teacher_id': teacher_id,
+                                            'class_stream_id': pair_id, 'subject_id': subject_id})
+                    assignment_id += 1
+        self.bulk_insert(TeacherAssignment, assignment_rows)
+
+        # Pupils spread evenly over the class/stream pairs
+        pupil_id = self.next_id(Pupil)
+        pupil_rows = []
+        pupils_by_pair = {pair_id: [] for _, _, pair_id in pairs}
+        level_of = {class_id: level for level, class_id in enumerate(classes.values(), 1)}
+        for index in range(args.pupils):
+            class_id, stream_id, pair_id = pairs[index % len(pairs)]
+            level = level_of[class_id]
+            pupil_rows.append({
+                'id': pupil_id,
+                'admission_number': f'SYN/{args.seed}/{pupil_id:07d}',
+                'first_name': rng.choice(FIRST_NAMES),
+                'last_name': rng.choice(LAST_NAMES),
+                'date_of_birth': date(args.last_year - 5 - level, rng.randint(1, 12), rng.randint(1, 28)),
+                'gender': rng.choice(['Male', 'Female']),
+                'parent_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'parent_phone': f'+2567{rng.randint(10000000, 99999999)}',
+                'current_class_id': class_id,
+                'current_stream_id': stream_id,
+                'enrollment_date': date(first_year, 2, 1),
+                'status': 'Active',
+                'created_at': now,
+                'updated_at': now,
+            })
+            pupils_by_pair[pair_id].append(pupil_id)
+            pupil_id += 1
+        self.bulk_insert(Pupil, pupil_rows)
+
+        # Exam schedules: every exam type x term x class x subject
+        for term_id, start_date in terms:
+            for offset, exam_type in enumerate(exam_types):
+                created = generate_exam_schedules([exam_type], [term_id], start_date + timedelta(days=30 + 40 * offset))
+                self.counts['exam_schedule'] = self.counts.get('exam_schedule', 0) + created
+
+        # One assessment per class/stream x subject x term x exam type, marked for every pupil in it
+        record_id = self.next_id(AssessmentRecord)
+        records = []  # (record_id, pair_id)
+        record_rows = []
+        for term_id, start_date in terms:
+            for offset, exam_type in enumerate(exam_types):
+                assessment_date = start_date + timedelta(days=30 + 40 * offset)
+                for class_id, stream_id, pair_id in pairs:
+                    for subject_name, subject_id in subjects.items():
+                        record_rows.append({
+                            'id': record_id, 'teacher_id': teacher_for[(pair_id, subject_id)], 'subject_id': subject_id,
+                            'class_id': class_id, 'stream_id': stream_id, 'term_id': term_id,
+                            'assessment_type': exam_type, 'title': f'{exam_type} - {subject_name}',
+                            'total_marks': 100, 'assessment_date': assessment_date,
+                            'created_at': now, 'updated_at': now,
+                        })
+                        records.append((record_id, pair_id))
+                        record_id += 1
+        self.bulk_insert(AssessmentRecord, record_rows)
+
+        def results():
+            # Generated lazily so a million rows never sit in memory at once
+            result_id = self.next_id(AssessmentResult)
+            for record, pair_id in records:
+                marks = sorted(((rng.randint(15, 100), pupil) for pupil in pupils_by_pair[pair_id]), reverse=True)
+                for rank, (mark, pupil) in enumerate(marks, 1):
+                    yield {
+                        'id': result_id, 'assessment_record_id': record, 'pupil_id': pupil,
+                        'marks_obtained': float(mark), 'grade': calculate_grade(mark),
+                        'remarks': f'Points: {calculate_points(mark)} | {rng.choice(REMARKS)}',
+                        'stream_rank': rank, 'class_rank': rank, 'submitted_at': now,
+                    }
+                    result_id += 1
+        self.bulk_insert(AssessmentResult, results())
+
+        # Subject remarks for the latest term
+        if terms:
+            latest_term = terms[-1][0]
+            remark_id = self.next_id(SubjectRemark)
+            remark_rows = []
+            for class_id, stream_id, pair_id in pairs:
+                for subject_id in subjects.values():
+                    for pupil in pupils_by_pair[pair_id]:
+                        remark_rows.append({
+                            'id': remark_id, 'teacher_id': teacher_for[(pair_id, subject_id)], 'pupil_id': pupil,
+                            'subject_id': subject_id, 'term_id': latest_term, 'remark': rng.choice(REMARKS),
+                            'remark_type': rng.choice(['academic', 'behavior', 'effort', 'general']),
+                            'is_positive': rng.random() < 0.8, 'created_at': now, 'updated_at': now,
+                        })
+                        remark_id += 1
+            self.bulk_insert(SubjectRemark, remark_rows)
+
+        # Notifications and read receipts
+        notification_id = self.next_id(Notification)
+        notification_rows = []
+        for index in range(args.notifications):
+            notification_rows.append({
+                'id': notification_id + index, 'title': f'Notice {index + 1}',
+                'message': f'Synthetic notice {index + 1} for load testing.', 'created_by': admin_id,
+                'created_at': now - timedelta(hours=index), 'visibility': rng.choice(VISIBILITIES),
+            })
+        self.bulk_insert(Notification, notification_rows)
+        read_id = self.next_id(NotificationRead)
+        read_rows = []
+        for reader in [admin_id] + teacher_ids:
+            for row in notification_rows:
+                if rng.random() < args.read_ratio:
+                    read_rows.append({'id': read_id, 'notification_id': row['id'], 'user_id': reader, 'read_at': now})
+                    read_id += 1
+        self.bulk_insert(NotificationRead, read_rows)
+
+        # Point the current year/term at the newest generated ones
+        if terms:
+            for key, value in (('current_academic_year_id', year_ids[-1]), ('current_term_id', terms[-1][0])):
+                setting = SystemSetting.query.filter_by(key=key).first()
+                if setting:
+                    setting.value = str(value)
+                else:
+                    db.session.add(SystemSetting(key=key, value=str(value), category='academic', data_type='integer'))
+            db.session.commit()
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    from app import app
+    from models.auth_models import db
+
+    started = time.perf_counter()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        generator = Generator(db, args)
+        generator.run()
+
+    print(f"Generated school data with seed {args.seed} in {time.perf_counter() - started:.1f}s")
+    for table, count in generator.counts.items():
+        if count:
+            print(f"  {table}: {count}")
+
+
+if __name__ == '__main__':
+    main()
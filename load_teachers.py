@@ -1,7 +1,7 @@
 import os
 from dotenv import load_dotenv
 from app import app, db
-from models.auth_models import SystemUser, Role
+from models.auth_models import SystemUser, Role, next_display_id
 
 # Load environment variables
 load_dotenv()
@@ -64,14 +64,14 @@ def create_teachers():
 
             # Check if user already exists (double check)
             if not SystemUser.query.filter_by(username=username).first():
-                # Get the next display_id (following insert_users.py logic)
-                max_display_id = db.session.query(db.func.max(SystemUser.display_id)).scalar() or 0
-                user = SystemUser(display_id=max_display_id + 1, username=username, email=email, role_id=teacher_role.id)
+                # display_id is allocated by the INSERT itself (following insert_users.py logic)
+                user = SystemUser(display_id=next_display_id(), username=username, email=email, role_id=teacher_role.id)
                 user.set_password('password')  # Following insert_users.py logic
                 db.session.add(user)
+                db.session.flush()
                 teachers_created += 1
 
-                print(f"Created teacher: {first_name} {surname} ({username}) - Display ID: {max_display_id + 1}")
+                print(f"Created teacher: {first_name} {surname} ({username}) - Display ID: {user.display_id}")
 
         db.session.commit()
         print(f"\n✅ Successfully created {teachers_created} teachers!")
@@ -59,6 +59,7 @@ class ExamSchedule(db.Model):
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
     class_id = db.Column(db.Integer, db.ForeignKey('school_class.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    __table_args__ = (db.Index('ix_exam_schedule_term_class_subject', 'term_id', 'class_id', 'subject_id'),)
     term = db.relationship('Term', backref=db.backref('exam_schedules', lazy=True))
     subject = db.relationship('Subject', backref=db.backref('exam_schedules', lazy=True))
     school_class = db.relationship('SchoolClass', backref=db.backref('exam_schedules', lazy=True))
@@ -80,6 +81,53 @@ class NotificationRead(db.Model):
     notification = db.relationship('Notification', backref=db.backref('reads', lazy=True))
     user = db.relationship('SystemUser', backref=db.backref('read_notifications', lazy=True))
 
+class EmailOutbox(db.Model):
+    """Model for one queued email; services/outbox.py sends them in the background"""
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notification.id', ondelete='SET NULL'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    locked_until = db.Column(db.DateTime, nullable=True)
+    lock_token = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    sent_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),)
+
+class ScheduledJob(db.Model):
+    """Model for one periodic job; the row doubles as the lease that lets one worker run it"""
+    __tablename__ = 'scheduled_job'
+
+    name = db.Column(db.String(50), primary_key=True)
+    schedule = db.Column(db.String(100), nullable=False)  # cron expression, school time zone
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    next_run_at = db.Column(db.DateTime, nullable=True)  # UTC
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(20), nullable=True)
+
+class JobRun(db.Model):
+    """Model for the history of scheduled job runs"""
+    __tablename__ = 'job_run'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(50), db.ForeignKey('scheduled_job.name'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # running, succeeded, failed, abandoned
+    message = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    triggered_by = db.Column(db.Integer, db.ForeignKey('system_users.id'), nullable=True)  # set for manual runs
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (db.Index('ix_job_run_job_started', 'job_name', 'started_at'),)
+    trigger_user = db.relationship('SystemUser')
+
 class ExamType(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
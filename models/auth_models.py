@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Sequence, func, select
 from datetime import datetime
 
-db = SQLAlchemy()
+from services.database import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Role(db.Model):
     __tablename__ = 'roles'
@@ -18,7 +21,7 @@ class SystemUser(db.Model):
     display_id = db.Column(db.Integer, unique=True, nullable=False)
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # widened by add_password_hash_length.py
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=False)
     last_login = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -29,9 +32,23 @@ class SystemUser(db.Model):
         return f'<SystemUser {self.username}>'
 
     def set_password(self, password):
-        from werkzeug.security import generate_password_hash
-        self.password_hash = generate_password_hash(password)
+        from services.login import hash_password
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         from werkzeug.security import check_password_hash
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        return check_password_hash(self.password_hash, password)
+
+# Created by add_display_id_sequence.py, outside any request
+DISPLAY_ID_SEQUENCE = 'system_users_display_id_seq'
+display_id_sequence = Sequence(DISPLAY_ID_SEQUENCE)
+
+def next_display_id():
+    """SQL expression allocating the next display_id inside the INSERT itself.
+
+    PostgreSQL draws from a sequence so concurrent inserts never collide;
+    SQLite serialises writers, so an inline MAX()+1 subquery is safe there.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return display_id_sequence.next_value()
+    return select(func.coalesce(func.max(SystemUser.display_id), 0) + 1).scalar_subquery()
@@ -44,4 +44,26 @@ class Pupil(db.Model):
         if self.date_of_birth:
             today = datetime.today()
             return today.year - self.date_of_birth.year - ((today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
-        return None
\ No newline at end of file
+        return None
+
+class PupilClassHistory(db.Model):
+    """Model for the class and stream a pupil held before each end-of-year promotion"""
+    __tablename__ = 'pupil_class_history'
+
+    id = db.Column(db.Integer, primary_key=True)
+    pupil_id = db.Column(db.Integer, db.ForeignKey('pupils.id'), nullable=False, index=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('school_class.id'), nullable=True)
+    stream_id = db.Column(db.Integer, db.ForeignKey('stream.id'), nullable=True)
+    academic_year_id = db.Column(db.Integer, db.ForeignKey('academic_year.id'), nullable=True)
+    outcome = db.Column(db.String(20), nullable=False)  # Promoted, Graduated
+    recorded_by = db.Column(db.Integer, db.ForeignKey('system_users.id'), nullable=True)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    pupil = db.relationship('Pupil', backref=db.backref('class_history', cascade='all, delete-orphan'))
+    school_class = db.relationship('SchoolClass')
+    stream = db.relationship('Stream')
+    academic_year = db.relationship('AcademicYear')
+
+    def __repr__(self):
+        return f'<PupilClassHistory pupil={self.pupil_id} class={self.class_id} {self.outcome}>'
@@ -1,10 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from models.auth_models import SystemUser, Role, db
-from models.admin_models import SchoolClass, Subject, Stream, ClassStream, TeacherAssignment, AcademicYear, Term, ExamSchedule, Notification, NotificationRead, SystemSetting
-from werkzeug.security import generate_password_hash
+from models.auth_models import SystemUser, Role, db, next_display_id
+from models.admin_models import SchoolClass, Subject, Stream, ClassStream, TeacherAssignment, AcademicYear, Term, ExamSchedule, Notification, NotificationRead, SystemSetting, ScheduledJob, JobRun
+from services.exam_schedules import invalidate_teacher_schedules
+from services.fragments import render_fragment
+from services.login import hash_password
+from services.notification_events import publish_notification, publish_notification_deleted
+from services.outbox import queue_notification_emails, wake_outbox
+from services.query_stats import query_budget
+from services.settings import invalidate_settings, warm_settings
 from datetime import datetime, timedelta
 from sqlalchemy import text
-import pytz
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -78,7 +83,6 @@ def create_staff():
     min_length_setting = SystemSetting.query.filter_by(key='min_password_length').first()
     min_length = int(min_length_setting.value) if min_length_setting else 8
     
-    roles = Role.query.filter(Role.name != 'Admin').all()
     if request.method == 'POST':
         username = request.form['username']
         email = request.form['email']
@@ -93,10 +97,8 @@ def create_staff():
         if not role:
             flash('Role not found!')
             return redirect(url_for('admin.create_staff'))
-        hashed = generate_password_hash(password)
-        # Get the next display_id
-        max_display_id = db.session.query(db.func.max(SystemUser.display_id)).scalar() or 0
-        new_user = SystemUser(display_id=max_display_id + 1, username=username, email=email, password_hash=hashed, role_id=role.id)
+        hashed = hash_password(password)
+        new_user = SystemUser(display_id=next_display_id(), username=username, email=email, password_hash=hashed, role_id=role.id)
         db.session.add(new_user)
         db.session.commit()
         flash('Staff created successfully!')
@@ -105,7 +107,10 @@ def create_staff():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_staff.html', roles=roles, min_password_length=min_length)
+        return render_fragment('admin/create_staff.html', lambda: {
+            'roles': Role.query.filter(Role.name != 'Admin').all(),
+            'min_password_length': min_length,
+        }, 'Admin', depends=(Role, SystemSetting))
 
     else:
 
@@ -114,6 +119,7 @@ def create_staff():
         return redirect(url_for('admin.dashboard'))
 
 @admin_bp.route('/manage_users', methods=['GET', 'POST'])
+@query_budget(10)
 def manage_users():
     if 'user_id' not in session:
         return redirect(url_for('authbp.login'))
@@ -145,7 +151,13 @@ def manage_users():
             db.session.commit()
             flash('User updated successfully!')
         return redirect(url_for('admin.manage_users'))
-    users = SystemUser.query.order_by(SystemUser.id.asc()).all()
+    # Sequential numbering is computed at read time, so deletes leave gaps in display_id
+    rows = db.session.query(SystemUser, db.func.row_number().over(order_by=SystemUser.id).label('row_number'))\
+        .options(db.joinedload(SystemUser.role)).order_by(SystemUser.id.asc()).all()
+    users = []
+    for u, row_number in rows:
+        u.row_number = row_number
+        users.append(u)
     roles = Role.query.all()
     # Convert times to Kampala (UTC+3)
     kampala_offset = timedelta(hours=3)
@@ -200,12 +212,6 @@ def delete_user(user_id):
         db.session.delete(u)
         db.session.commit()
         
-        # Renumber display_ids to maintain sequential numbering
-        users = SystemUser.query.order_by(SystemUser.id.asc()).all()
-        for display_id, usr in enumerate(users, 1):
-            usr.display_id = display_id
-        db.session.commit()
-        
         flash('User deleted successfully!')
     return redirect(url_for('admin.manage_users'))
 
@@ -230,7 +236,7 @@ def create_class():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_class.html')
+        return render_fragment('admin/create_class.html', dict, 'Admin', depends=())
 
     else:
 
@@ -305,7 +311,7 @@ def create_subject():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_subject.html')
+        return render_fragment('admin/create_subject.html', dict, 'Admin', depends=())
 
     else:
 
@@ -380,7 +386,7 @@ def create_stream():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_stream.html')
+        return render_fragment('admin/create_stream.html', dict, 'Admin', depends=())
 
     else:
 
@@ -441,10 +447,6 @@ def assign_teachers():
     user = SystemUser.query.get(session['user_id'])
     if not user or user.role.name != 'Admin':
         return redirect(url_for('authbp.login'))
-    teachers = SystemUser.query.filter_by(role_id=Role.query.filter_by(name='Teacher').first().id).all()
-    classes = SchoolClass.query.all()
-    streams = Stream.query.all()
-    subjects = Subject.query.all()
     if request.method == 'POST':
         teacher_id = int(request.form['teacher_id'])
         class_id = int(request.form['class_id'])
@@ -463,13 +465,19 @@ def assign_teachers():
         assignment = TeacherAssignment(teacher_id=teacher_id, class_stream_id=class_stream.id, subject_id=subject_id)
         db.session.add(assignment)
         db.session.commit()
+        invalidate_teacher_schedules(teacher_id)
         flash('Teacher assigned successfully!')
         return redirect(url_for('admin.assign_teachers'))
     # Check if this is an AJAX request (from loadContent)
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/assign_teachers.html', teachers=teachers, classes=classes, streams=streams, subjects=subjects)
+        return render_fragment('admin/assign_teachers.html', lambda: {
+            'teachers': SystemUser.query.filter_by(role_id=Role.query.filter_by(name='Teacher').first().id).all(),
+            'classes': SchoolClass.query.all(),
+            'streams': Stream.query.all(),
+            'subjects': Subject.query.all(),
+        }, 'Admin', depends=(SystemUser, Role, SchoolClass, Stream, Subject))
 
     else:
 
@@ -510,6 +518,7 @@ def manage_assignments():
                 a.class_stream_id = class_stream.id
                 a.subject_id = subject_id
                 db.session.commit()
+                invalidate_teacher_schedules(a.teacher_id)
                 flash('Assignment updated successfully!')
         return redirect(url_for('admin.manage_assignments'))
     assignments = TeacherAssignment.query.join(SystemUser, TeacherAssignment.teacher_id == SystemUser.id)\
@@ -546,6 +555,7 @@ def delete_assignment(assignment_id):
     if assignment:
         db.session.delete(assignment)
         db.session.commit()
+        invalidate_teacher_schedules(assignment.teacher_id)
         flash('Assignment deleted successfully!')
     return redirect(url_for('admin.manage_assignments'))
 
@@ -572,7 +582,7 @@ def create_academic_year():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_academic_year.html')
+        return render_fragment('admin/create_academic_year.html', dict, 'Admin', depends=())
 
     else:
 
@@ -637,7 +647,6 @@ def create_term():
     user = SystemUser.query.get(session['user_id'])
     if not user or user.role.name != 'Admin':
         return redirect(url_for('authbp.login'))
-    academic_years = AcademicYear.query.all()
     if request.method == 'POST':
         name = request.form['name']
         academic_year_id = request.form['academic_year_id']
@@ -656,7 +665,9 @@ def create_term():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_term.html', academic_years=academic_years)
+        return render_fragment('admin/create_term.html', lambda: {
+            'academic_years': AcademicYear.query.all(),
+        }, 'Admin', depends=(AcademicYear,))
 
     else:
 
@@ -726,9 +737,6 @@ def create_exam_schedule():
     user = SystemUser.query.get(session['user_id'])
     if not user or user.role.name != 'Admin':
         return redirect(url_for('authbp.login'))
-    terms = Term.query.all()
-    subjects = Subject.query.all()
-    classes = SchoolClass.query.all()
     if request.method == 'POST':
         name = request.form['name']
         term_id = request.form['term_id']
@@ -736,18 +744,12 @@ def create_exam_schedule():
         all_classes_subjects = 'all_classes_subjects' in request.form
         is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
         if all_classes_subjects:
-            total_possible = len(classes) * len(subjects)
-            # Get all existing schedules for this name and term to avoid individual queries
-            existing_schedules = ExamSchedule.query.filter_by(name=name, term_id=term_id).all()
-            existing_set = {(s.subject_id, s.class_id) for s in existing_schedules}
-            schedules_to_add = []
-            for cls in classes:
-                for subj in subjects:
-                    if (subj.id, cls.id) not in existing_set:
-                        schedules_to_add.append(ExamSchedule(name=name, term_id=term_id, exam_date=exam_date, subject_id=subj.id, class_id=cls.id))
-            db.session.add_all(schedules_to_add)
-            db.session.commit()
-            created_count = len(schedules_to_add)
+            from services.exam_schedules import generate_exam_schedules, count_schedule_grid
+            # Bulk mode accepts several terms and comma-separated exam names
+            names = [n for value in request.form.getlist('name') for n in value.split(',')]
+            term_ids = request.form.getlist('term_id')
+            total_possible = count_schedule_grid(names, term_ids)
+            created_count = generate_exam_schedules(names, term_ids, datetime.strptime(exam_date, '%Y-%m-%d').date())
             message = f'Exam schedules created for {created_count} class-subject combinations successfully!'
             if created_count == 0:
                 message = 'All exam schedules already exist!'
@@ -775,6 +777,7 @@ def create_exam_schedule():
             new_schedule = ExamSchedule(name=name, term_id=term_id, exam_date=exam_date, subject_id=subject_id, class_id=class_id)
             db.session.add(new_schedule)
             db.session.commit()
+            invalidate_teacher_schedules()
             message = 'Exam schedule created successfully!'
             if is_ajax:
                 return jsonify({'success': True, 'message': message})
@@ -784,7 +787,11 @@ def create_exam_schedule():
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-        return render_template('admin/create_exam_schedule.html', terms=terms, subjects=subjects, classes=classes)
+        return render_fragment('admin/create_exam_schedule.html', lambda: {
+            'terms': Term.query.all(),
+            'subjects': Subject.query.all(),
+            'classes': SchoolClass.query.all(),
+        }, 'Admin', depends=(Term, Subject, SchoolClass))
 
     else:
 
@@ -839,6 +846,7 @@ def manage_exam_schedules():
                 s.subject_id = subject_id
                 s.class_id = class_id
                 db.session.commit()
+                invalidate_teacher_schedules()
                 flash('Exam schedule updated successfully!')
         return redirect(url_for('admin.manage_exam_schedules'))
     schedules = ExamSchedule.query.options(db.joinedload(ExamSchedule.term).joinedload(Term.academic_year), db.joinedload(ExamSchedule.subject), db.joinedload(ExamSchedule.school_class)).order_by(ExamSchedule.id.asc()).all()
@@ -868,6 +876,7 @@ def delete_exam_schedule(schedule_id):
     if schedule:
         db.session.delete(schedule)
         db.session.commit()
+        invalidate_teacher_schedules()
         flash('Exam schedule deleted successfully!')
     return redirect(url_for('admin.manage_exam_schedules'))
 
@@ -890,20 +899,25 @@ def create_notification():
         else:
             new_notification = Notification(title=title, message=message, created_by=user.id, visibility=visibility)
             db.session.add(new_notification)
+            db.session.flush()
+            queued = queue_notification_emails(new_notification)
             db.session.commit()
+            publish_notification('created', new_notification)
+            if queued:
+                wake_outbox()
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'success': True, 'message': 'Notification created successfully!'})
             flash('Notification created successfully!')
             return redirect(url_for('admin.dashboard'))
-    roles = Role.query.filter(Role.name.notin_(['Admin', 'Parent'])).all()
-
     # Check if this is an AJAX request (from loadContent)
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         # Check if this is an AJAX request (from loadContent)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
 
-            return render_template('admin/create_notification.html', roles=roles)
+            return render_fragment('admin/create_notification.html', lambda: {
+                'roles': Role.query.filter(Role.name.notin_(['Admin', 'Parent'])).all(),
+            }, 'Admin', depends=(Role,))
 
         else:
 
@@ -935,12 +949,14 @@ def manage_notifications():
                 n.message = message
                 n.visibility = visibility
                 db.session.commit()
+                publish_notification('updated', n)
                 flash('Notification updated successfully!')
         return redirect(url_for('admin.dashboard'))
     notifications = Notification.query.join(SystemUser).order_by(Notification.created_at.desc()).limit(50).all()
     roles = Role.query.filter(Role.name.notin_(['Admin', 'Parent'])).all()
 
     # Convert created_at to East Africa Time (Kampala) with AM/PM format
+    import pytz
     eat_tz = pytz.timezone('Africa/Nairobi')
     for notification in notifications:
         notification.formatted_created_at = notification.created_at.replace(tzinfo=pytz.utc).astimezone(eat_tz).strftime('%Y-%m-%d %I:%M %p')
@@ -965,12 +981,124 @@ def delete_notification(notification_id):
         NotificationRead.query.filter_by(notification_id=notification_id).delete()
         db.session.delete(notification)
         db.session.commit()
+        publish_notification_deleted(notification_id)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': True, 'message': 'Notification deleted successfully!'})
         else:
             flash('Notification deleted successfully!')
     return redirect(url_for('admin.manage_notifications'))
 
+@admin_bp.route('/promote_pupils', methods=['GET', 'POST'])
+def promote_pupils():
+    if 'user_id' not in session:
+        return redirect(url_for('authbp.login'))
+    user = SystemUser.query.get(session['user_id'])
+    if not user or user.role.name != 'Admin':
+        return redirect(url_for('authbp.login'))
+    from services.promotion import build_successor_map, promote_pupils as run_promotion
+    classes = SchoolClass.query.order_by(SchoolClass.name).all()
+    if request.method == 'POST':
+        # Each class posts its successor: a class id, 'graduate', or 'stay' to leave it out
+        successors = {}
+        for cls in classes:
+            choice = request.form.get(f'next_class_{cls.id}', 'stay')
+            if choice == 'graduate':
+                successors[cls.id] = None
+            elif choice.isdigit():
+                successors[cls.id] = int(choice)
+        dry_run = request.form.get('dry_run') == 'true'
+        try:
+            summary = run_promotion(successors, recorded_by=user.id, dry_run=dry_run)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        if dry_run:
+            message = f"Preview: {summary['promoted']} pupil(s) would be promoted and {summary['graduated']} graduated."
+        else:
+            message = f"{summary['promoted']} pupil(s) promoted and {summary['graduated']} graduated successfully!"
+        return jsonify({'success': True, 'message': message, 'summary': summary})
+    summary = run_promotion(build_successor_map(classes), dry_run=True)
+    # Check if this is an AJAX request (from loadContent)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render_template('admin/promote_pupils.html', classes=classes, summary=summary)
+    else:
+        # Direct access - redirect to dashboard
+        return redirect(url_for('admin.dashboard'))
+
+@admin_bp.route('/rollover_academic_year', methods=['GET', 'POST'])
+def rollover_academic_year():
+    if 'user_id' not in session:
+        return redirect(url_for('authbp.login'))
+    user = SystemUser.query.get(session['user_id'])
+    if not user or user.role.name != 'Admin':
+        return redirect(url_for('authbp.login'))
+    if request.method == 'POST':
+        from services.rollover import rollover_academic_year as run_rollover
+        try:
+            result = run_rollover(
+                int(request.form['source_year_id']),
+                int(request.form['target_year_id']),
+                set_current='set_current' in request.form,
+                updated_by=user.id
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        message = f"Rollover complete: {result['terms_created']} term(s) and {result['exam_schedules_created']} exam schedule(s) created."
+        return jsonify({'success': True, 'message': message, 'result': result})
+    academic_years = AcademicYear.query.order_by(AcademicYear.start_date.desc()).all()
+    # Check if this is an AJAX request (from loadContent)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render_template('admin/rollover_academic_year.html', academic_years=academic_years)
+    else:
+        # Direct access - redirect to dashboard
+        return redirect(url_for('admin.dashboard'))
+
+@admin_bp.route('/scheduled_jobs', methods=['GET', 'POST'])
+def scheduled_jobs():
+    if 'user_id' not in session:
+        return redirect(url_for('authbp.login'))
+    user = SystemUser.query.get(session['user_id'])
+    if not user or user.role.name != 'Admin':
+        return redirect(url_for('authbp.login'))
+    from services.scheduler import JOBS, get_scheduler, next_run
+    scheduler = get_scheduler()
+    scheduler.sync()
+    if request.method == 'POST':
+        name = request.form.get('job_name')
+        action = request.form.get('action')
+        job_row = db.session.get(ScheduledJob, name)
+        if not job_row or name not in JOBS:
+            return jsonify({'success': False, 'message': 'Unknown job'})
+        if action == 'run':
+            if scheduler.is_running(name):
+                return jsonify({'success': False, 'message': f'{name} is already running'})
+            status = scheduler.run_soon(name, triggered_by=user.id)
+            message = f'{name} started; see the run history' if status == 'started' else f'{name} {status}'
+            return jsonify({'success': status in ('started', 'succeeded'), 'message': message})
+        if action in ('enable', 'disable'):
+            job_row.enabled = action == 'enable'
+            if job_row.enabled:
+                job_row.next_run_at = next_run(job_row.schedule)
+        elif action == 'schedule':
+            schedule = (request.form.get('schedule') or '').strip()
+            try:
+                job_row.next_run_at = next_run(schedule)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': f'Invalid schedule: {e}'})
+            job_row.schedule = schedule
+        else:
+            return jsonify({'success': False, 'message': 'Unknown action'})
+        db.session.commit()
+        return jsonify({'success': True, 'message': f'{name} updated'})
+    jobs = ScheduledJob.query.filter(ScheduledJob.name.in_(JOBS)).order_by(ScheduledJob.name).all()
+    runs = JobRun.query.order_by(JobRun.started_at.desc()).limit(50).all()
+    # Check if this is an AJAX request (from loadContent)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return render_template('admin/scheduled_jobs.html', jobs=jobs, runs=runs, descriptions={
+            name: job.description for name, job in JOBS.items()})
+    else:
+        # Direct access - redirect to dashboard
+        return redirect(url_for('admin.dashboard'))
+
 def populate_default_settings():
     """Populate default system settings if they don't exist"""
     default_settings = [
@@ -1019,6 +1147,7 @@ def populate_default_settings():
             )
             db.session.add(setting)
     db.session.commit()
+    invalidate_settings()
 
 @admin_bp.route('/system_settings', methods=['GET', 'POST'])
 def system_settings():
@@ -1041,6 +1170,7 @@ def system_settings():
                     setting.value = value
                     setting.updated_by = user.id
                     db.session.commit()
+        invalidate_settings()
         flash('System settings updated successfully!')
         return redirect(url_for('admin.system_settings'))
 
@@ -1088,6 +1218,7 @@ def update_system_setting():
         setting.value = value
         setting.updated_by = user.id
         db.session.commit()
+        invalidate_settings()
         return jsonify({'success': True, 'message': 'Setting updated successfully'})
     return jsonify({'success': False, 'message': 'Setting not found'})
 
@@ -1137,6 +1268,7 @@ def set_current_term_year():
                 db.session.add(term_setting)
 
             db.session.commit()
+            warm_settings()
             flash('Current academic year and term updated successfully!', 'success')
             return redirect(url_for('admin.set_current_term_year'))
 
@@ -1174,4 +1306,15 @@ def set_current_term_year():
         # Direct access - redirect to dashboard
 
 
-        return redirect(url_for('admin.dashboard'))
\ No newline at end of file
+        return redirect(url_for('admin.dashboard'))
+@admin_bp.route('/query_stats')
+def query_stats():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    user = SystemUser.query.get(session['user_id'])
+    if not user or user.role.name != 'Admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    from services.query_stats import endpoint_summary, reset_summary
+    if request.args.get('reset'):
+        reset_summary()
+    return jsonify({'endpoints': endpoint_summary()})
@@ -0,0 +1,138 @@
+from flask import Blueprint, current_app, request, jsonify, g
+from flask_jwt_extended import create_refresh_token, get_jwt_identity, jwt_required
+from models.auth_models import SystemUser, db
+from routes.parent_routes import search_active_pupils
+from routes.teacher_routes import build_marks_data, get_teacher_pupils, save_teacher_marks
+from services.api_auth import issue_access_token, token_required
+from services.database import replica_reads
+from services.login import authenticate
+from services.query_stats import query_budget
+from services.write_behind import record_last_login
+from datetime import datetime, timezone
+import logging
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+logger = logging.getLogger(__name__)
+
+def _token_response(user, access_token, claims, **extra):
+    return jsonify({
+        'access_token': access_token,
+        'token_type': 'Bearer',
+        'expires_in': int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()),
+        'user': {'id': user.id, 'username': user.username, 'role': claims['role']},
+        'roster_version': claims['rv'],
+        **extra
+    })
+
+# Authentication
+@api_bp.route('/auth/token', methods=['POST'])
+def token():
+    data = request.get_json(silent=True) or {}
+    user, error = authenticate(data.get('email'), data.get('password'))
+    if not user:
+        # 429 when throttled and 503 when busy, so clients can tell them from a wrong password
+        response = jsonify({'error': error})
+        if error.retry_after:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response, error.status
+    record_last_login(user, datetime.now(timezone.utc))
+    # A password rehashed by authenticate(), or last_login when the write-behind buffer is off
+    if db.session.is_modified(user):
+        db.session.commit()
+    access_token, claims = issue_access_token(user)
+    return _token_response(user, access_token, claims, refresh_token=create_refresh_token(identity=str(user.id)))
+
+@api_bp.route('/auth/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    # The one API call that reads the user, so role and roster changes apply here
+    user = db.session.get(SystemUser, int(get_jwt_identity()))
+    if not user:
+        return jsonify({'error': 'User no longer exists'}), 401
+    access_token, claims = issue_access_token(user)
+    previous = (request.get_json(silent=True) or {}).get('roster_version')
+    return _token_response(user, access_token, claims, roster_changed=previous is not None and previous != claims['rv'])
+
+@api_bp.route('/me')
+@token_required()
+def me():
+    claims = g.api_claims
+    return jsonify({
+        'id': g.api_user_id,
+        'role': claims['role'],
+        'subjects': claims['subjects'],
+        'class_streams': claims['class_streams'],
+        'roster_version': claims['rv']
+    })
+
+# Teacher
+@api_bp.route('/teacher/pupils')
+@token_required('Teacher')
+@query_budget(5)
+def teacher_pupils():
+    pupils = get_teacher_pupils(g.api_user_id, g.api_claims['class_streams'])
+    return jsonify({
+        'pupils': [{
+            'id': p.id,
+            'first_name': p.first_name,
+            'last_name': p.last_name,
+            'admission_number': p.admission_number,
+            'current_class': p.current_class.name if p.current_class else 'Not Assigned',
+            'current_stream': p.current_stream.name if p.current_stream else None
+        } for p in pupils],
+        'total_pupils': len(pupils)
+    })
+
+@api_bp.route('/teacher/marks', methods=['GET'])
+@token_required('Teacher')
+@query_budget(10)
+def load_marks():
+    # The term fixes the academic year, so unlike the web form no academic_year_id is needed
+    term_id = request.args.get('term_id')
+    exam_type = request.args.get('exam_type')
+    if not all([term_id, exam_type]):
+        return jsonify({'success': False, 'message': 'Missing required parameters'}), 400
+
+    try:
+        claims = g.api_claims
+        return jsonify(build_marks_data(g.api_user_id, term_id, exam_type,
+                                        claims['class_streams'], claims['subjects']))
+    except Exception as e:
+        logger.exception('Error in API load_marks')
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+@api_bp.route('/teacher/marks', methods=['POST'])
+@token_required('Teacher')
+@query_budget(10)
+def save_marks():
+    data = request.get_json(silent=True) or {}
+    term_id = data.get('term_id')
+    exam_type = data.get('exam_type')
+    if not all([term_id, exam_type]):
+        return jsonify({'success': False, 'message': 'Missing required fields'}), 400
+
+    try:
+        # The token's roster stands in for the teacher's assignments
+        saved_count = save_teacher_marks(g.api_user_id, term_id, exam_type, data.get('marks_data', []),
+                                         set(g.api_claims['subjects']))
+        return jsonify({'success': True, 'message': f'Saved {saved_count} marks successfully'})
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error in API save_marks')
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# Parent
+@api_bp.route('/parent/pupils/search', methods=['POST'])
+@token_required('Parent')
+@replica_reads
+def search_pupils():
+    search_term = ((request.get_json(silent=True) or {}).get('search_term') or '').strip()
+    if not search_term:
+        return jsonify({'error': 'Search term is required'}), 400
+
+    try:
+        results = search_active_pupils(search_term)
+        return jsonify({'success': True, 'count': len(results), 'pupils': results})
+    except Exception:
+        logger.exception('Error searching pupils')
+        return jsonify({'error': 'Search failed'}), 500
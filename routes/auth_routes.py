@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.auth_models import SystemUser
+from services.login import authenticate
+from services.write_behind import record_last_login
 from datetime import datetime
 
 auth_bp = Blueprint('authbp', __name__, url_prefix='/auth')
@@ -15,13 +16,15 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
-        user = SystemUser.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        user, error = authenticate(email, password)
+        if user:
             session['user_id'] = user.id
             session['role'] = user.role.name
-            user.last_login = datetime.utcnow()
+            record_last_login(user, datetime.utcnow())
             from app import db
-            db.session.commit()
+            # A password rehashed by authenticate(), or last_login when the write-behind buffer is off
+            if db.session.is_modified(user):
+                db.session.commit()
             if user.role.name == 'Admin':
                 return redirect(url_for('admin.dashboard'))
             elif user.role.name == 'Teacher':
@@ -38,7 +41,7 @@ def login():
                 flash('Role not recognized')
                 return redirect(url_for('authbp.login'))
         else:
-            flash('Invalid email or password')
+            flash(error)
             return redirect(url_for('authbp.login'))
     return render_template('index.html')
 
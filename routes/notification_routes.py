@@ -0,0 +1,33 @@
+from flask import Blueprint, Response, current_app, request, session, jsonify
+from models.auth_models import SystemUser, db
+from services.notification_events import Subscription, event_stream
+
+notifications_bp = Blueprint('notifications', __name__, url_prefix='/notifications')
+
+@notifications_bp.route('/stream')
+def stream():
+    """Server-sent events with new notifications and the unread count"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    user = db.session.get(SystemUser, session['user_id'])
+    if not user:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    broker = current_app.extensions['notification_events']
+    config = current_app.config
+    last_event_id = request.headers.get('Last-Event-ID')
+    after = broker.resume_point(last_event_id) if last_event_id else None
+    resync = last_event_id is not None and after is None
+    if after is None:
+        after = broker.current()
+    subscription = Subscription.load(db.session, user)
+    # The stream may stay open for minutes; don't hold a pooled connection
+    db.session.close()
+
+    response = Response(
+        event_stream(broker, subscription, after, resync, config['SSE_HEARTBEAT_SECONDS'], config['SSE_MAX_SECONDS']),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
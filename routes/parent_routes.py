@@ -2,19 +2,19 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from models.auth_models import SystemUser, db
 from models.secretary_models import Pupil
 from models.admin_models import SchoolClass, Stream, Notification, NotificationRead
+from services.database import replica_reads
 from datetime import datetime
 from sqlalchemy import or_, and_
+import logging
 
 parent_bp = Blueprint('parent', __name__, url_prefix='/parent')
+logger = logging.getLogger(__name__)
 
 @parent_bp.route('/')
 def dashboard():
     """Parent dashboard with search functionality and term progress"""
-    print(f"Dashboard - Session contents: {session}")  # Debug
-    print(f"Dashboard - User ID: {session.get('user_id')}, Role: {session.get('role')}")  # Debug
 
     if 'user_id' not in session:
-        print("Dashboard - No user_id in session")  # Debug
         flash('Please log in as a parent to access this page.', 'error')
         return redirect(url_for('auth.login'))
 
@@ -38,14 +38,44 @@ def dashboard():
 
     return render_template('parent/dashboard.html', term_progress=term_progress, school_name=school_name, contact_phone=contact_phone, contact_email=contact_email)
 
+def search_active_pupils(search_term):
+    """Active pupils whose name, admission number, address or nationality matches"""
+    # Search pupils by multiple criteria
+    pupils = Pupil.query.filter(
+        or_(
+            Pupil.first_name.ilike(f'%{search_term}%'),
+            Pupil.last_name.ilike(f'%{search_term}%'),
+            Pupil.admission_number.ilike(f'%{search_term}%'),
+            Pupil.address.ilike(f'%{search_term}%'),
+            Pupil.nationality.ilike(f'%{search_term}%')
+        )
+    ).filter(Pupil.status == 'Active').all()
+
+    # Format results
+    results = []
+    for pupil in pupils:
+        results.append({
+            'id': pupil.id,
+            'admission_number': pupil.admission_number,
+            'first_name': pupil.first_name,
+            'last_name': pupil.last_name,
+            'full_name': pupil.get_full_name(),
+            'current_class': pupil.current_class.name if pupil.current_class else 'Not Assigned',
+            'current_stream': pupil.current_stream.name if pupil.current_stream else 'Not Assigned',
+            'address': pupil.address or 'Not provided',
+            'nationality': pupil.nationality or 'Not provided',
+            'parent_name': pupil.parent_name or 'Not provided',
+            'parent_phone': pupil.parent_phone or 'Not provided'
+        })
+
+    return results
+
 @parent_bp.route('/search_pupils', methods=['POST'])
+@replica_reads
 def search_pupils():
     """API endpoint for searching pupils"""
-    print(f"Session contents: {session}")  # Debug
-    print(f"User ID: {session.get('user_id')}, Role: {session.get('role')}")  # Debug
 
     if 'user_id' not in session:
-        print("No user_id in session")  # Debug
         return jsonify({'error': 'Unauthorized'}), 403
 
     # For now, allow any logged-in user to search (remove role check)
@@ -59,33 +89,7 @@ def search_pupils():
         return jsonify({'error': 'Search term is required'}), 400
 
     try:
-        # Search pupils by multiple criteria
-        pupils = Pupil.query.filter(
-            or_(
-                Pupil.first_name.ilike(f'%{search_term}%'),
-                Pupil.last_name.ilike(f'%{search_term}%'),
-                Pupil.admission_number.ilike(f'%{search_term}%'),
-                Pupil.address.ilike(f'%{search_term}%'),
-                Pupil.nationality.ilike(f'%{search_term}%')
-            )
-        ).filter(Pupil.status == 'Active').all()
-
-        # Format results
-        results = []
-        for pupil in pupils:
-            results.append({
-                'id': pupil.id,
-                'admission_number': pupil.admission_number,
-                'first_name': pupil.first_name,
-                'last_name': pupil.last_name,
-                'full_name': pupil.get_full_name(),
-                'current_class': pupil.current_class.name if pupil.current_class else 'Not Assigned',
-                'current_stream': pupil.current_stream.name if pupil.current_stream else 'Not Assigned',
-                'address': pupil.address or 'Not provided',
-                'nationality': pupil.nationality or 'Not provided',
-                'parent_name': pupil.parent_name or 'Not provided',
-                'parent_phone': pupil.parent_phone or 'Not provided'
-            })
+        results = search_active_pupils(search_term)
 
         return jsonify({
             'success': True,
@@ -93,24 +97,25 @@ def search_pupils():
             'pupils': results
         })
 
-    except Exception as e:
-        print(f"Error searching pupils: {e}")
+    except Exception:
+        logger.exception('Error searching pupils')
         return jsonify({'error': 'Search failed'}), 500
 
 def get_term_progress_info():
     """Get current term progress information for display in dashboards"""
-    from models.admin_models import SystemSetting, Term, AcademicYear
+    from models.admin_models import Term, AcademicYear
+    from services.settings import get_int_setting
 
     try:
         # Get current term and academic year settings
-        current_term_setting = SystemSetting.query.filter_by(key='current_term_id').first()
-        current_academic_year_setting = SystemSetting.query.filter_by(key='current_academic_year_id').first()
+        current_term_id = get_int_setting('current_term_id')
+        current_academic_year_id = get_int_setting('current_academic_year_id')
 
-        if not current_term_setting or not current_academic_year_setting:
+        if not current_term_id or not current_academic_year_id:
             return None
 
-        current_term = db.session.get(Term, int(current_term_setting.value))
-        current_academic_year = db.session.get(AcademicYear, int(current_academic_year_setting.value))
+        current_term = db.session.get(Term, current_term_id)
+        current_academic_year = db.session.get(AcademicYear, current_academic_year_id)
 
         if not current_term or not current_academic_year:
             return None
@@ -153,6 +158,6 @@ def get_term_progress_info():
             'term_end_date': term_end.isoformat(),
             'today': today.isoformat()
         }
-    except Exception as e:
-        print(f"Error getting term progress info: {e}")
+    except Exception:
+        logger.exception('Error getting term progress info')
         return None
@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from models.auth_models import SystemUser, db
+from models.auth_models import Role, SystemUser, db
 from models.admin_models import SchoolClass, Subject, Stream, TeacherAssignment, Term, AcademicYear, ExamSchedule, ClassStream, SystemSetting, Notification, NotificationRead
 from models.secretary_models import Pupil
 from models.teacher_models import (
@@ -7,10 +7,16 @@ from models.teacher_models import (
     Curriculum, LessonPlan, Homework, HomeworkSubmission,
     LearningNeed, DisciplinaryNote, TeacherNote
 )
+from services.exam_schedules import get_teacher_exam_schedules
+from services.fragments import render_fragment
+from services.query_stats import query_budget
+from services.settings import get_int_setting
 from datetime import datetime
-from sqlalchemy import and_, or_, select
+from sqlalchemy import and_, insert, or_, select
+import logging
 
 teacher_bp = Blueprint('teacher', __name__, url_prefix='/teacher')
+logger = logging.getLogger(__name__)
 
 def get_teacher_assignments(teacher_id):
     """Get all class/stream/subject assignments for a teacher"""
@@ -19,24 +25,33 @@ def get_teacher_assignments(teacher_id):
         db.selectinload(TeacherAssignment.class_stream).selectinload(ClassStream.stream),
         db.selectinload(TeacherAssignment.subject)
     ).all()
-    print(f"DEBUG get_teacher_assignments: teacher_id={teacher_id}, found {len(assignments)} assignments")
+    logger.debug('get_teacher_assignments: teacher %s has %d assignments', teacher_id, len(assignments))
     return assignments
 
-def get_teacher_pupils(teacher_id):
-    """Get all pupils assigned to a teacher - Ultra Optimized version"""
+def get_teacher_pupils(teacher_id, class_stream_ids=None):
+    """Get all pupils assigned to a teacher - Ultra Optimized version
+
+    Pass ``class_stream_ids`` when they are already known (the API's token
+    claims) to skip the join through the teacher's assignments.
+    """
     # Single optimized query with proper joins and selectinload for best performance
-    pupils = Pupil.query.join(
+    query = Pupil.query.join(
         ClassStream,
         and_(
             Pupil.current_class_id == ClassStream.class_id,
             Pupil.current_stream_id == ClassStream.stream_id
         )
-    ).join(
-        TeacherAssignment,
-        TeacherAssignment.class_stream_id == ClassStream.id
-    ).filter(
-        TeacherAssignment.teacher_id == teacher_id
-    ).options(
+    )
+    if class_stream_ids is not None:
+        query = query.filter(ClassStream.id.in_(class_stream_ids))
+    else:
+        query = query.join(
+            TeacherAssignment,
+            TeacherAssignment.class_stream_id == ClassStream.id
+        ).filter(
+            TeacherAssignment.teacher_id == teacher_id
+        )
+    pupils = query.options(
         # Use selectinload for optimal loading of related objects
         db.selectinload(Pupil.current_class),
         db.selectinload(Pupil.current_stream)
@@ -90,18 +105,32 @@ def get_teacher_template_context(user):
         'contact_email': contact_email
     }
 
+# Tables read by get_teacher_template_context and get_teacher_assignments
+TEACHER_PAGE_TABLES = (
+    Notification, NotificationRead, SystemUser, Role, SystemSetting, Term, AcademicYear,
+    TeacherAssignment, ClassStream, SchoolClass, Stream, Subject,
+)
+
+def render_assignments_page(user, template):
+    """Render a page that only lists the teacher's assignments, from the fragment cache when possible"""
+    def build_context():
+        context = get_teacher_template_context(user)
+        context.update({'assignments': get_teacher_assignments(user.id)})
+        return context
+    return render_fragment(template, build_context, 'Teacher', TEACHER_PAGE_TABLES, user_id=user.id)
+
 def get_term_progress_info():
     """Get current term progress information for display in dashboards"""
     try:
         # Get current term and academic year settings
-        current_term_setting = SystemSetting.query.filter_by(key='current_term_id').first()
-        current_academic_year_setting = SystemSetting.query.filter_by(key='current_academic_year_id').first()
+        current_term_id = get_int_setting('current_term_id')
+        current_academic_year_id = get_int_setting('current_academic_year_id')
 
-        if not current_term_setting or not current_academic_year_setting:
+        if not current_term_id or not current_academic_year_id:
             return None
 
-        current_term = db.session.get(Term, int(current_term_setting.value))
-        current_academic_year = db.session.get(AcademicYear, int(current_academic_year_setting.value))
+        current_term = db.session.get(Term, current_term_id)
+        current_academic_year = db.session.get(AcademicYear, current_academic_year_id)
 
         if not current_term or not current_academic_year:
             return None
@@ -144,8 +173,8 @@ def get_term_progress_info():
             'term_end_date': term_end,
             'today': today
         }
-    except Exception as e:
-        print(f"Error getting term progress info: {e}")
+    except Exception:
+        logger.exception('Error getting term progress info')
         return None
 
 @teacher_bp.route('/')
@@ -265,8 +294,8 @@ def api_assessment_records():
 
 # Enter Marks Routes
 @teacher_bp.route('/enter-marks', methods=['GET', 'POST'])
+@query_budget(30)
 def enter_marks():
-    print(f"DEBUG: enter_marks called - REQUEST METHOD: {request.method}")
     if 'user_id' not in session:
         return redirect(url_for('authbp.login'))
     user = SystemUser.query.get(session['user_id'])
@@ -299,13 +328,11 @@ def enter_marks():
     subjects = []
     existing_results = {}
 
-    print(f"DEBUG: enter_marks - selected_year_id: {selected_year_id}, selected_term_id: {selected_term_id}, selected_exam_type: {selected_exam_type}")
+    logger.debug('enter_marks: year=%s term=%s exam=%s', selected_year_id, selected_term_id, selected_exam_type)
 
     if selected_year_id and selected_term_id:
-        print("DEBUG: Loading pupils and subjects for teacher")
         # Get pupils assigned to this teacher
         teacher_pupils = get_teacher_pupils(user.id)
-        print(f"DEBUG: Found {len(teacher_pupils)} teacher pupils")
 
         # Convert pupils to JSON-serializable format
         pupils = []
@@ -318,12 +345,10 @@ def enter_marks():
                 'class_name': pupil.current_class.name if pupil.current_class else '',
                 'stream_name': pupil.current_stream.name if pupil.current_stream else ''
             })
-        print(f"DEBUG: Converted to {len(pupils)} pupil dictionaries")
 
         # Get subjects taught by this teacher
         assignments = get_teacher_assignments(user.id)
         teacher_subjects = list(set(assignment.subject for assignment in assignments))
-        print(f"DEBUG: Found {len(teacher_subjects)} teacher subjects")
         
         # Convert subjects to JSON-serializable format
         subjects = []
@@ -333,14 +358,13 @@ def enter_marks():
                 'name': subject.name,
                 'can_edit': True  # All subjects in this list can be edited by the teacher
             })
-        print(f"DEBUG: Converted to {len(subjects)} subject dictionaries")
 
         # Get existing assessment results for this year/term/exam_type
         assessments = AssessmentRecord.query.filter_by(
             teacher_id=user.id,
             term_id=selected_term_id
-        ).filter(AssessmentRecord.assessment_type == selected_exam_type).all()
-        print(f"DEBUG: Found {len(assessments)} existing assessments")
+        ).filter(AssessmentRecord.assessment_type == selected_exam_type).options(
+            db.selectinload(AssessmentRecord.results)).all()
 
         # Collect all results
         existing_results = {}
@@ -354,14 +378,12 @@ def enter_marks():
                     'stream_rank': result.stream_rank,
                     'class_rank': result.class_rank
                 }
-        print(f"DEBUG: Found {len(existing_results)} existing results")
     else:
-        print("DEBUG: Not loading pupils - missing year or term")
         pupils = []
         subjects = []
         existing_results = {}
 
-    print(f"DEBUG: Final - pupils: {len(pupils)}, subjects: {len(subjects)}, auto_load_data: {len(pupils) > 0}")
+    logger.debug('enter_marks: %d pupils, %d subjects, %d existing results', len(pupils), len(subjects), len(existing_results))
 
     context = get_teacher_template_context(user)
     context.update({
@@ -379,177 +401,284 @@ def enter_marks():
 
     return render_template('teacher/enter_marks.html', **context)
 
+def build_marks_data(teacher_id, term_id, exam_type, class_stream_ids=None, subject_ids=None):
+    """Pupils, subjects, existing marks and positions for the marks entry grid
+
+    ``class_stream_ids`` and ``subject_ids`` stand in for the teacher's
+    assignments when given, as the API passes its token claims.
+    """
+    # Get pupils assigned to this teacher (only from their assigned classes/streams)
+    teacher_pupils = get_teacher_pupils(teacher_id, class_stream_ids)
+
+    # Get subjects taught by this teacher
+    if subject_ids is None:
+        subject_ids = db.session.scalars(
+            select(TeacherAssignment.subject_id).where(TeacherAssignment.teacher_id == teacher_id)).all()
+    teacher_subject_ids = set(subject_ids)
+
+    # Get all subjects for display (but mark which ones teacher can edit)
+    all_subjects = Subject.query.order_by(Subject.name).all()
+
+    # Convert to JSON-serializable format
+    pupils_data = []
+    for pupil in teacher_pupils:
+        pupils_data.append({
+            'id': pupil.id,
+            'admission_number': pupil.admission_number,
+            'first_name': pupil.first_name,
+            'last_name': pupil.last_name,
+            'class_name': pupil.current_class.name if pupil.current_class else '',
+            'stream_name': pupil.current_stream.name if pupil.current_stream else ''
+        })
+
+    subjects_data = []
+    for subject in all_subjects:
+        subjects_data.append({
+            'id': subject.id,
+            'name': subject.name,
+            'can_edit': subject.id in teacher_subject_ids  # Mark if teacher can edit this subject
+        })
+
+    # Get existing assessment results for this year/term/exam_type
+    existing_marks = {}
+
+    # Get all assessments for this teacher, term, and exam type
+    assessments = AssessmentRecord.query.filter_by(
+        teacher_id=teacher_id,
+        term_id=term_id,
+        assessment_type=exam_type
+    ).options(db.selectinload(AssessmentRecord.results)).all()
+
+
+    # Collect all existing results
+    for assessment in assessments:
+        for result in assessment.results:
+            key = f"{result.pupil_id}_{assessment.subject_id}"
+            existing_marks[key] = {
+                'marks_obtained': result.marks_obtained,
+                'grade': result.grade,
+                'remarks': result.remarks,
+                'stream_rank': result.stream_rank,
+                'class_rank': result.class_rank
+            }
+
+    logger.debug('load_marks_data: %d pupils, %d editable subjects, %d existing marks',
+                 len(teacher_pupils), len(teacher_subject_ids), len(existing_marks))
+
+    # Compute total points and positions for each pupil
+    def extract_points_from_remarks(remarks):
+        if not remarks or remarks == '--':
+            return '--'
+        import re
+        points_match = re.search(r'Points:\s*(\d+)', remarks)
+        return points_match.group(1) if points_match else '--'
+
+    def get_ordinal(n):
+        if 10 <= n % 100 <= 20:
+            suffix = 'th'
+        else:
+            suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+        return f"{n}{suffix}"
+
+    pupil_totals = {}
+    for pupil in pupils_data:
+        total_points = 0
+        subject_count = 0
+        for subject in subjects_data:
+            key = f"{pupil['id']}_{subject['id']}"
+            if key in existing_marks:
+                points = extract_points_from_remarks(existing_marks[key]['remarks'])
+                if points != '--':
+                    total_points += int(points)
+                    subject_count += 1
+        pupil_totals[pupil['id']] = {
+            'total_points': total_points,
+            'subject_count': subject_count,
+            'class_name': pupil['class_name'],
+            'stream_name': pupil['stream_name']
+        }
+
+    # Compute stream positions
+    stream_groups = {}
+    for pid, data in pupil_totals.items():
+        key = f"{data['class_name']}_{data['stream_name']}"
+        if key not in stream_groups:
+            stream_groups[key] = []
+        stream_groups[key].append((pid, data['total_points']))
+
+    for group in stream_groups.values():
+        group.sort(key=lambda x: x[1], reverse=True)
+        total_in_stream = len(group)
+        for rank, (pid, _) in enumerate(group, 1):
+            pupil_totals[pid]['stream_position'] = get_ordinal(rank)
+            pupil_totals[pid]['stream_total'] = total_in_stream
+
+    # Compute class positions
+    class_groups = {}
+    for pid, data in pupil_totals.items():
+        key = data['class_name']
+        if key not in class_groups:
+            class_groups[key] = []
+        class_groups[key].append((pid, data['total_points']))
+
+    for group in class_groups.values():
+        group.sort(key=lambda x: x[1], reverse=True)
+        total_in_class = len(group)
+        for rank, (pid, _) in enumerate(group, 1):
+            pupil_totals[pid]['class_position'] = get_ordinal(rank)
+            pupil_totals[pid]['class_total'] = total_in_class
+
+    # Add positions to pupils_data
+    for pupil in pupils_data:
+        pid = pupil['id']
+        pupil['stream_position'] = pupil_totals.get(pid, {}).get('stream_position', '--')
+        pupil['stream_total'] = pupil_totals.get(pid, {}).get('stream_total', '--')
+        pupil['class_position'] = pupil_totals.get(pid, {}).get('class_position', '--')
+        pupil['class_total'] = pupil_totals.get(pid, {}).get('class_total', '--')
+
+    return {
+        'success': True,
+        'pupils': pupils_data,
+        'subjects': subjects_data,
+        'existing_marks': existing_marks,
+        'stream_totals': {key: len(group) for key, group in stream_groups.items()},
+        'class_totals': {key: len(group) for key, group in class_groups.items()}
+    }
+
 @teacher_bp.route('/load-marks-data', methods=['GET'])
+@query_budget(15)
 def load_marks_data():
-    print(f"DEBUG: load_marks_data called - REQUEST METHOD: {request.method}")
-    print(f"DEBUG: Session contents: {dict(session)}")
     if 'user_id' not in session:
-        print("DEBUG: No user_id in session")
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
     user = SystemUser.query.get(session['user_id'])
     if not user or user.role.name != 'Teacher':
-        print(f"DEBUG: User not found or not teacher: user={user}, role={user.role.name if user else 'None'}")
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
 
-    print(f"DEBUG: Logged in user: ID={user.id}, Username={user.username}, Role={user.role.name}")
-
     academic_year_id = request.args.get('academic_year_id')
     term_id = request.args.get('term_id')
     exam_type = request.args.get('exam_type')
 
-    print(f"DEBUG: Parameters - year: {academic_year_id}, term: {term_id}, exam: {exam_type}")
+    logger.debug('load_marks_data: year=%s term=%s exam=%s', academic_year_id, term_id, exam_type)
 
     if not all([academic_year_id, term_id, exam_type]):
         return jsonify({'success': False, 'message': 'Missing required parameters'}), 400
 
     try:
-        # Get pupils assigned to this teacher (only from their assigned classes/streams)
-        teacher_pupils = get_teacher_pupils(user.id)
-        print(f"DEBUG: User ID {user.id} ({user.username}) - Found {len(teacher_pupils)} pupils assigned to teacher")
-        for pupil in teacher_pupils:
-            print(f"DEBUG: Pupil: {pupil.admission_number} {pupil.first_name} {pupil.last_name} - Class: {pupil.current_class.name if pupil.current_class else 'None'} {pupil.current_stream.name if pupil.current_stream else 'None'}")
-
-        # Get subjects taught by this teacher
-        assignments = get_teacher_assignments(user.id)
-        teacher_subjects = list(set(assignment.subject for assignment in assignments))
-        teacher_subject_ids = [s.id for s in teacher_subjects]
-        print(f"DEBUG: Teacher can edit {len(teacher_subjects)} subjects: {[s.name for s in teacher_subjects]}")
-
-        # Get all subjects for display (but mark which ones teacher can edit)
-        all_subjects = Subject.query.order_by(Subject.name).all()
-        print(f"DEBUG: Found {len(all_subjects)} total subjects")
+        return jsonify(build_marks_data(user.id, term_id, exam_type))
 
-        # Convert to JSON-serializable format
-        pupils_data = []
-        for pupil in teacher_pupils:
-            pupils_data.append({
-                'id': pupil.id,
-                'admission_number': pupil.admission_number,
-                'first_name': pupil.first_name,
-                'last_name': pupil.last_name,
-                'class_name': pupil.current_class.name if pupil.current_class else '',
-                'stream_name': pupil.current_stream.name if pupil.current_stream else ''
-            })
+    except Exception as e:
+        logger.exception('Error in load_marks_data')
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
-        subjects_data = []
-        for subject in all_subjects:
-            subjects_data.append({
-                'id': subject.id,
-                'name': subject.name,
-                'can_edit': subject.id in teacher_subject_ids  # Mark if teacher can edit this subject
-            })
+def save_teacher_marks(teacher_id, term_id, exam_type, marks_data, teacher_subject_ids):
+    """Save marks for the teacher's subjects, commit and refresh rankings; return how many were saved"""
+    # Load the teacher's assessments for this term and exam with their results up front,
+    # so saving does not query once per subject and pupil
+    assessments = {assessment.subject_id: assessment for assessment in AssessmentRecord.query.filter_by(
+        teacher_id=teacher_id,
+        term_id=term_id,
+        assessment_type=exam_type
+    ).options(db.selectinload(AssessmentRecord.results)).all()}
+
+    # Process marks for each subject
+    saved_count = 0
+    new_results = []
+    for subject_marks in marks_data:
+        subject_id = subject_marks['subject_id']
+
+        # Only save marks for subjects the teacher is assigned to
+        if subject_id not in teacher_subject_ids:
+            logger.warning('save_marks: teacher %s is not assigned subject %s', teacher_id, subject_id)
+            continue
+
+        pupil_marks = subject_marks['pupil_marks']
+
+        # Find or create assessment for this subject
+        assessment = assessments.get(subject_id)
+
+        if not assessment:
+            # Get class/stream from teacher's assignments
+            assignment = TeacherAssignment.query.filter_by(
+                teacher_id=teacher_id,
+                subject_id=subject_id
+            ).first()
+            if not assignment:
+                logger.warning('save_marks: no assignment for teacher %s, subject %s', teacher_id, subject_id)
+                continue
 
-        # Get existing assessment results for this year/term/exam_type
-        existing_marks = {}
+            assessment = AssessmentRecord(
+                teacher_id=teacher_id,
+                subject_id=subject_id,
+                class_id=assignment.class_stream.class_id,
+                stream_id=assignment.class_stream.stream_id,
+                term_id=term_id,
+                assessment_type=exam_type,
+                title=f"{exam_type} - {db.session.get(Subject, subject_id).name}",
+                total_marks=100,  # default
+                assessment_date=datetime.now().date(),
+                results=[]
+            )
+            db.session.add(assessment)
+            db.session.flush()  # to get the id
+            assessments[subject_id] = assessment
 
-        # Get all assessments for this teacher, term, and exam type
-        assessments = AssessmentRecord.query.filter_by(
-            teacher_id=user.id,
-            term_id=term_id,
-            assessment_type=exam_type
-        ).all()
+        existing_results = {result.pupil_id: result for result in assessment.results}
 
-        print(f"DEBUG: Found {len(assessments)} existing assessments")
+        # Save marks for pupils
+        for pupil_data in pupil_marks:
+            pupil_id = pupil_data['pupil_id']
+            marks_obtained = float(pupil_data['marks_obtained']) if pupil_data['marks_obtained'] else None
+            remarks = pupil_data.get('remarks', '')
 
-        # Collect all existing results
-        for assessment in assessments:
-            for result in assessment.results:
-                key = f"{result.pupil_id}_{assessment.subject_id}"
-                existing_marks[key] = {
-                    'marks_obtained': result.marks_obtained,
-                    'grade': result.grade,
-                    'remarks': result.remarks,
-                    'stream_rank': result.stream_rank,
-                    'class_rank': result.class_rank
-                }
-
-        print(f"DEBUG: Found {len(existing_marks)} existing marks")
-
-        # Compute total points and positions for each pupil
-        def extract_points_from_remarks(remarks):
-            if not remarks or remarks == '--':
-                return '--'
-            import re
-            points_match = re.search(r'Points:\s*(\d+)', remarks)
-            return points_match.group(1) if points_match else '--'
-
-        def get_ordinal(n):
-            if 10 <= n % 100 <= 20:
-                suffix = 'th'
-            else:
-                suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
-            return f"{n}{suffix}"
-
-        pupil_totals = {}
-        for pupil in pupils_data:
-            total_points = 0
-            subject_count = 0
-            for subject in subjects_data:
-                key = f"{pupil['id']}_{subject['id']}"
-                if key in existing_marks:
-                    points = extract_points_from_remarks(existing_marks[key]['remarks'])
-                    if points != '--':
-                        total_points += int(points)
-                        subject_count += 1
-            pupil_totals[pupil['id']] = {
-                'total_points': total_points,
-                'subject_count': subject_count,
-                'class_name': pupil['class_name'],
-                'stream_name': pupil['stream_name']
-            }
+            if marks_obtained is not None:
+                # Calculate grade and points using UNEB system
+                percentage = marks_obtained  # marks_obtained is already a percentage
+                grade = calculate_grade(percentage)
+                points = calculate_points(percentage)
 
-        # Compute stream positions
-        stream_groups = {}
-        for pid, data in pupil_totals.items():
-            key = f"{data['class_name']}_{data['stream_name']}"
-            if key not in stream_groups:
-                stream_groups[key] = []
-            stream_groups[key].append((pid, data['total_points']))
-
-        for group in stream_groups.values():
-            group.sort(key=lambda x: x[1], reverse=True)
-            total_in_stream = len(group)
-            for rank, (pid, _) in enumerate(group, 1):
-                pupil_totals[pid]['stream_position'] = get_ordinal(rank)
-                pupil_totals[pid]['stream_total'] = total_in_stream
-
-        # Compute class positions
-        class_groups = {}
-        for pid, data in pupil_totals.items():
-            key = data['class_name']
-            if key not in class_groups:
-                class_groups[key] = []
-            class_groups[key].append((pid, data['total_points']))
-
-        for group in class_groups.values():
-            group.sort(key=lambda x: x[1], reverse=True)
-            total_in_class = len(group)
-            for rank, (pid, _) in enumerate(group, 1):
-                pupil_totals[pid]['class_position'] = get_ordinal(rank)
-                pupil_totals[pid]['class_total'] = total_in_class
-
-        # Add positions to pupils_data
-        for pupil in pupils_data:
-            pid = pupil['id']
-            pupil['stream_position'] = pupil_totals.get(pid, {}).get('stream_position', '--')
-            pupil['stream_total'] = pupil_totals.get(pid, {}).get('stream_total', '--')
-            pupil['class_position'] = pupil_totals.get(pid, {}).get('class_position', '--')
-            pupil['class_total'] = pupil_totals.get(pid, {}).get('class_total', '--')
+                # Check if result exists
+                existing_result = existing_results.get(pupil_id)
 
-        return jsonify({
-            'success': True,
-            'pupils': pupils_data,
-            'subjects': subjects_data,
-            'existing_marks': existing_marks,
-            'stream_totals': {key: len(group) for key, group in stream_groups.items()},
-            'class_totals': {key: len(group) for key, group in class_groups.items()}
-        })
+                if existing_result:
+                    existing_result.marks_obtained = marks_obtained
+                    existing_result.grade = grade
+                    existing_result.remarks = f"Points: {points} | {remarks}"
+                else:
+                    # Kept out of the session and inserted in one statement below
+                    new_result = AssessmentResult(
+                        assessment_record_id=assessment.id,
+                        pupil_id=pupil_id,
+                        marks_obtained=marks_obtained,
+                        grade=grade,
+                        remarks=f"Points: {points} | {remarks}"
+                    )
+                    new_results.append(new_result)
+                    existing_results[pupil_id] = new_result
+
+                saved_count += 1
+
+    # Calculate rankings for all assessments from the results in memory
+    for assessment in assessments.values():
+        rank_results(assessment.results + [result for result in new_results
+                                           if result.assessment_record_id == assessment.id])
+
+    if new_results:
+        db.session.execute(insert(AssessmentResult), [{
+            'assessment_record_id': result.assessment_record_id,
+            'pupil_id': result.pupil_id,
+            'marks_obtained': result.marks_obtained,
+            'grade': result.grade,
+            'remarks': result.remarks,
+            'stream_rank': result.stream_rank,
+            'class_rank': result.class_rank
+        } for result in new_results])
+    db.session.commit()
+    logger.debug('save_marks: saved %d marks', saved_count)
 
-    except Exception as e:
-        print(f"DEBUG: Error in load_marks_data: {str(e)}")
-        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+    return saved_count
 
 @teacher_bp.route('/save-marks', methods=['POST'])
+@query_budget(15)
 def save_marks():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not logged in'}), 401
@@ -563,123 +692,21 @@ def save_marks():
     exam_type = data.get('exam_type')
     marks_data = data.get('marks_data', [])
 
-    print(f"DEBUG save_marks: user_id={user.id}, year={year_id}, term={term_id}, exam={exam_type}")
-    print(f"DEBUG save_marks: marks_data length={len(marks_data)}")
+    logger.debug('save_marks: year=%s term=%s exam=%s, %d subjects', year_id, term_id, exam_type, len(marks_data))
 
     if not all([year_id, term_id, exam_type]):
         return jsonify({'success': False, 'message': 'Missing required fields'}), 400
 
     try:
         # Get teacher's assigned subjects for validation
-        assignments = get_teacher_assignments(user.id)
-        teacher_subject_ids = [assignment.subject_id for assignment in assignments]
-        print(f"DEBUG save_marks: Teacher can save marks for subjects: {teacher_subject_ids}")
-
-        # Process marks for each subject
-        saved_count = 0
-        for subject_marks in marks_data:
-            subject_id = subject_marks['subject_id']
-
-            # Only save marks for subjects the teacher is assigned to
-            if subject_id not in teacher_subject_ids:
-                print(f"DEBUG save_marks: Skipping subject {subject_id} - not assigned to teacher")
-                continue
-
-            pupil_marks = subject_marks['pupil_marks']
-
-            print(f"DEBUG save_marks: processing subject {subject_id}, pupil_marks count={len(pupil_marks)}")
-
-            # Find or create assessment for this subject
-            assessment = AssessmentRecord.query.filter_by(
-                teacher_id=user.id,
-                subject_id=subject_id,
-                term_id=term_id,
-                assessment_type=exam_type
-            ).first()
-
-            if not assessment:
-                # Get class/stream from teacher's assignments
-                assignment = TeacherAssignment.query.filter_by(
-                    teacher_id=user.id,
-                    subject_id=subject_id
-                ).first()
-                if not assignment:
-                    print(f"DEBUG save_marks: No assignment found for teacher {user.id}, subject {subject_id}")
-                    continue
-
-                assessment = AssessmentRecord(
-                    teacher_id=user.id,
-                    subject_id=subject_id,
-                    class_id=assignment.class_stream.class_id,
-                    stream_id=assignment.class_stream.stream_id,
-                    term_id=term_id,
-                    assessment_type=exam_type,
-                    title=f"{exam_type} - {Subject.query.get(subject_id).name}",
-                    total_marks=100,  # default
-                    assessment_date=datetime.now().date()
-                )
-                db.session.add(assessment)
-                db.session.flush()  # to get the id
-                print(f"DEBUG save_marks: Created new assessment {assessment.id}")
-
-            # Save marks for pupils
-            for pupil_data in pupil_marks:
-                pupil_id = pupil_data['pupil_id']
-                marks_obtained = float(pupil_data['marks_obtained']) if pupil_data['marks_obtained'] else None
-                remarks = pupil_data.get('remarks', '')
-
-                print(f"DEBUG save_marks: saving pupil {pupil_id}, marks {marks_obtained}")
-
-                if marks_obtained is not None:
-                    # Calculate grade and points using UNEB system
-                    percentage = marks_obtained  # marks_obtained is already a percentage
-                    grade = calculate_grade(percentage)
-                    points = calculate_points(percentage)
-
-                    # Check if result exists
-                    existing_result = AssessmentResult.query.filter_by(
-                        assessment_record_id=assessment.id,
-                        pupil_id=pupil_id
-                    ).first()
-
-                    if existing_result:
-                        existing_result.marks_obtained = marks_obtained
-                        existing_result.grade = grade
-                        existing_result.remarks = f"Points: {points} | {remarks}"
-                        print(f"DEBUG save_marks: Updated existing result")
-                    else:
-                        new_result = AssessmentResult(
-                            assessment_record_id=assessment.id,
-                            pupil_id=pupil_id,
-                            marks_obtained=marks_obtained,
-                            grade=grade,
-                            remarks=f"Points: {points} | {remarks}"
-                        )
-                        db.session.add(new_result)
-                        print(f"DEBUG save_marks: Created new result")
-
-                    saved_count += 1
-
-        db.session.commit()
-        print(f"DEBUG save_marks: Successfully saved {saved_count} marks")
-
-        # Calculate rankings for all assessments
-        assessments = AssessmentRecord.query.filter_by(
-            teacher_id=user.id,
-            term_id=term_id,
-            assessment_type=exam_type
-        ).all()
-
-        for assessment in assessments:
-            calculate_rankings(assessment.id)
-
+        teacher_subject_ids = set(db.session.scalars(
+            select(TeacherAssignment.subject_id).where(TeacherAssignment.teacher_id == user.id)))
+        saved_count = save_teacher_marks(user.id, term_id, exam_type, marks_data, teacher_subject_ids)
         return jsonify({'success': True, 'message': f'Saved {saved_count} marks successfully'})
 
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG save_marks: Error - {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error in save_marks')
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @teacher_bp.route('/calculate-grades', methods=['POST'])
@@ -815,14 +842,8 @@ def calculate_division(total_aggregate):
     else:
         return 'Ungraded (Fail)'
 
-def calculate_rankings(assessment_id):
-    """Calculate and update rankings for the assessment"""
-    # Get all results for this assessment
-    results = AssessmentResult.query.filter_by(assessment_record_id=assessment_id).all()
-
-    if not results:
-        return
-
+def rank_results(results):
+    """Set the rankings of an assessment's ``results``; the caller commits"""
     # Sort by marks obtained (descending)
     sorted_results = sorted(results, key=lambda x: x.marks_obtained, reverse=True)
 
@@ -831,8 +852,6 @@ def calculate_rankings(assessment_id):
         result.stream_rank = rank  # For now, treating as stream rank
         result.class_rank = rank   # For now, treating as class rank
 
-    db.session.commit()
-
 # Subject Remarks Routes
 @teacher_bp.route('/subject-remarks')
 def subject_remarks():
@@ -872,10 +891,7 @@ def curriculum_access():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/curriculum_access.html', **context)
+    return render_assignments_page(user, 'teacher/curriculum_access.html')
 
 # Lesson Plans Routes
 @teacher_bp.route('/lesson-plans')
@@ -886,10 +902,7 @@ def lesson_plans():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/lesson_plans.html', **context)
+    return render_assignments_page(user, 'teacher/lesson_plans.html')
 
 # Homework Tracking Routes
 @teacher_bp.route('/homework-tracking')
@@ -900,13 +913,11 @@ def homework_tracking():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/homework_tracking.html', **context)
+    return render_assignments_page(user, 'teacher/homework_tracking.html')
 
 # Exam Schedules Routes
 @teacher_bp.route('/exam-schedules')
+@query_budget(20)
 def exam_schedules():
     if 'user_id' not in session:
         return redirect(url_for('authbp.login'))
@@ -922,33 +933,8 @@ def exam_schedules():
 
     exam_schedules = []
     if current_term_id and assignments:
-        # Get all class-subject combinations that the teacher is assigned to
-        teacher_class_subjects = []
-        for assignment in assignments:
-            if assignment.class_stream and assignment.subject:
-                teacher_class_subjects.append({
-                    'class_id': assignment.class_stream.class_id,
-                    'subject_id': assignment.subject_id
-                })
-
-        if teacher_class_subjects:
-            # Build filter conditions for class-subject combinations
-            filter_conditions = []
-            for combo in teacher_class_subjects:
-                filter_conditions.append(
-                    and_(ExamSchedule.class_id == combo['class_id'], 
-                         ExamSchedule.subject_id == combo['subject_id'])
-                )
-            
-            # Fetch exam schedules only for subjects and classes the teacher is assigned to
-            exam_schedules = ExamSchedule.query.filter(
-                ExamSchedule.term_id == current_term_id,
-                or_(*filter_conditions)
-            ).options(
-                db.selectinload(ExamSchedule.subject),
-                db.selectinload(ExamSchedule.school_class),
-                db.selectinload(ExamSchedule.term)
-            ).order_by(ExamSchedule.exam_date).all()
+        # One EXISTS against the teacher's assignments, cached per term
+        exam_schedules = get_teacher_exam_schedules(user.id, current_term_id)
 
     context = get_teacher_template_context(user)
     context.update({'assignments': assignments, 'exam_schedules': exam_schedules})
@@ -1045,10 +1031,7 @@ def class_performance():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/class_performance.html', **context)
+    return render_assignments_page(user, 'teacher/class_performance.html')
 
 @teacher_bp.route('/subject-trends')
 def subject_trends():
@@ -1058,10 +1041,7 @@ def subject_trends():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/subject_trends.html', **context)
+    return render_assignments_page(user, 'teacher/subject_trends.html')
 
 @teacher_bp.route('/attendance-reports')
 def attendance_reports():
@@ -1071,10 +1051,7 @@ def attendance_reports():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/attendance_reports.html', **context)
+    return render_assignments_page(user, 'teacher/attendance_reports.html')
 
 @teacher_bp.route('/class-reports')
 def class_reports():
@@ -1084,10 +1061,7 @@ def class_reports():
     if not user or user.role.name != 'Teacher':
         return redirect(url_for('auth.login'))
 
-    assignments = get_teacher_assignments(user.id)
-    context = get_teacher_template_context(user)
-    context.update({'assignments': assignments})
-    return render_template('teacher/class_reports.html', **context)
+    return render_assignments_page(user, 'teacher/class_reports.html')
 
 # API Routes for AJAX functionality
 
@@ -0,0 +1,82 @@
+"""Bearer tokens for the /api/v1 endpoints.
+
+Mobile and integration clients exchange an email and password for a pair of
+tokens (see routes/api_routes.py):
+
+* an access token, valid for ``JWT_ACCESS_TOKEN_EXPIRES`` (15 minutes).
+  Its claims carry the user id, role and the teacher's roster: the subject
+  and class/stream ids they are assigned, plus a short hash of that roster
+  (``rv``, the roster version).
+* a refresh token, valid for ``JWT_REFRESH_TOKEN_EXPIRES`` (14 days). It
+  only identifies the user.
+
+API views authorize from the access token's claims, so an API request never
+loads the user or their assignments. Changes to a user's role or assignments
+reach the client at its next refresh, within one access-token lifetime. The
+refresh response reports whether the roster version changed, so a client
+can reload its class lists only when it has to.
+"""
+import hashlib
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import select
+
+from models.admin_models import TeacherAssignment
+from models.auth_models import db
+
+
+def roster_claims(user):
+    """Claims describing what ``user`` may access"""
+    rows = []
+    if user.role.name == 'Teacher':
+        rows = db.session.execute(
+            select(TeacherAssignment.class_stream_id, TeacherAssignment.subject_id)
+            .where(TeacherAssignment.teacher_id == user.id)
+            .order_by(TeacherAssignment.class_stream_id, TeacherAssignment.subject_id)
+        ).all()
+    return {
+        'role': user.role.name,
+        'class_streams': sorted({row.class_stream_id for row in rows}),
+        'subjects': sorted({row.subject_id for row in rows}),
+        'rv': hashlib.sha1(repr([tuple(row) for row in rows]).encode()).hexdigest()[:12],
+    }
+
+
+def issue_access_token(user):
+    claims = roster_claims(user)
+    return create_access_token(identity=str(user.id), additional_claims=claims), claims
+
+
+def token_required(*roles):
+    """Require a valid access token whose role is one of ``roles``.
+
+    The view reads ``g.api_user_id`` and ``g.api_claims``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            claims = get_jwt()
+            if roles and claims.get('role') not in roles:
+                return jsonify({'error': 'Forbidden'}), 403
+            g.api_user_id = int(get_jwt_identity())
+            g.api_claims = claims
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _error(message, status=401):
+    return jsonify({'error': message}), status
+
+
+def init_api_auth(app):
+    """Set up Flask-JWT-Extended for the /api/v1 token flow"""
+    jwt = JWTManager(app)
+    jwt.unauthorized_loader(lambda reason: _error(reason))
+    jwt.invalid_token_loader(lambda reason: _error(reason))
+    jwt.expired_token_loader(lambda header, payload: _error('Token has expired'))
+    jwt.needs_fresh_token_loader(lambda header, payload: _error('Fresh token required'))
+    jwt.revoked_token_loader(lambda header, payload: _error('Token has been revoked'))
@@ -0,0 +1,116 @@
+"""Structured, leveled logging for the app, routes and services.
+
+Records from the ``app``, ``routes``, ``services`` and ``models`` loggers are
+put on an in-memory queue by a ``QueueHandler`` and written to stderr as one
+JSON object per line by a background ``QueueListener``, so request threads
+never block on log I/O.
+
+The level follows the ``enable_logging`` and ``debug_mode`` settings and is
+re-checked at the start of each request (the settings are cached, so this
+costs nothing):
+
+* ``enable_logging`` off -> WARNING
+* ``enable_logging`` on  -> INFO
+* ``debug_mode`` on      -> DEBUG
+
+Pass ``extra={'sample_rate': 0.1}`` to keep only a fraction of a noisy
+record.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+from flask import has_request_context, request, session
+
+from services.settings import get_setting
+
+LOGGER_NAMES = ('app', 'routes', 'services', 'models')
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_level = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != 'sample_rate':
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Drop unsampled records and tag the rest with the current request"""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is not None and random.random() >= rate:
+            return False
+        if has_request_context():
+            record.endpoint = request.endpoint
+            record.method = request.method
+            record.user_id = session.get('user_id')
+        return True
+
+
+def _settings_level():
+    if get_setting('debug_mode') == 'true':
+        return logging.DEBUG
+    if get_setting('enable_logging', 'true') == 'true':
+        return logging.INFO
+    return logging.WARNING
+
+
+def apply_logging_settings():
+    """Set every app logger to the level implied by the current settings"""
+    global _level
+    try:
+        level = _settings_level()
+    except Exception:
+        # Settings table unavailable (e.g. fresh database); keep the current level
+        return
+    if level != _level:
+        _level = level
+        for name in LOGGER_NAMES:
+            logging.getLogger(name).setLevel(level)
+
+
+def init_logging(app):
+    """Route the app loggers through a queue and follow the logging settings"""
+    global _listener
+    if _listener is None:
+        log_queue = queue.SimpleQueue()
+        stream = logging.StreamHandler()
+        stream.setFormatter(JsonFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        handler = logging.handlers.QueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        for name in LOGGER_NAMES:
+            logger = logging.getLogger(name)
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    # Flask's default stderr handler would write app.logger records twice
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+
+    @app.before_request
+    def _apply_logging_settings():
+        apply_logging_settings()
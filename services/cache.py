@@ -0,0 +1,93 @@
+"""Small in-process caches with a TTL and hit/miss counters.
+
+Each worker process keeps its own copy, so every cache also expires entries
+after ``ttl`` seconds to pick up changes made by other workers.
+"""
+import threading
+import time
+
+_MISSING = object()
+
+
+class MemoryCache:
+    """Thread-safe dictionary cache keyed by strings or tuples"""
+
+    def __init__(self, name, ttl=60, max_entries=1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                # Drop the entry closest to expiry to make room
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[key] = (expires, value)
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, *parts):
+        """Drop every tuple key whose leading elements equal ``parts``"""
+        size = len(parts)
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k[:size] == parts]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+
+_caches = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name, ttl=60, max_entries=1024):
+    """Return the named cache, creating it on first use"""
+    with _registry_lock:
+        if name not in _caches:
+            _caches[name] = MemoryCache(name, ttl=ttl, max_entries=max_entries)
+        return _caches[name]
+
+
+def all_caches():
+    with _registry_lock:
+        return list(_caches.values())
@@ -0,0 +1,82 @@
+"""Compression of dynamic responses.
+
+HTML partials loaded by ``loadContent`` and JSON such as ``load_marks_data``
+are compressed when the client accepts it, the response is at least
+``COMPRESS_MIN_SIZE`` bytes and its mimetype is in ``COMPRESS_MIMETYPES``.
+Brotli is preferred when the ``brotli`` package is installed; otherwise
+gzip is used.
+
+Streamed and file responses (static files, event streams) are left alone.
+Static assets are precompressed at build time instead; see
+services/static_assets.py and build_static.py.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+)
+
+
+def _accepted(request, encoding):
+    return encoding in request.accept_encodings and request.accept_encodings[encoding] > 0
+
+
+def choose_encoding(request):
+    if brotli is not None and _accepted(request, 'br'):
+        return 'br'
+    if _accepted(request, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def init_compression(app):
+    """Compress eligible responses on ``app``"""
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+
+    @app.after_request
+    def _compress_response(response):
+        config = app.config
+        if not config['COMPRESS_ENABLED'] or request.method == 'HEAD':
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in config['COMPRESS_MIMETYPES']:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < config['COMPRESS_MIN_SIZE']:
+            return response
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, config))
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # A compressed body is a different representation
+            etag, weak = response.get_etag()
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        return response
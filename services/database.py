@@ -0,0 +1,291 @@
+"""Database connection strategy.
+
+``DB_CONNECTION_STRATEGY`` decides how the engine holds connections:
+
+* ``pooled``     long-running workers: a sized QueuePool with pre-ping
+* ``serverless`` one short-lived process per invocation: NullPool and no
+  pre-ping round-trip, since every connection is brand new anyway
+* ``pgbouncer``  behind an external transaction pooler: NullPool, no
+  pre-ping, no session-level settings and no server-side prepared statements
+
+On PostgreSQL, ``DB_STATEMENT_TIMEOUT_MS`` is sent as ``statement_timeout``
+when each connection starts. Behind pgbouncer, set it on the pooler or the
+role instead, because startup options are not passed through.
+
+Read replica
+------------
+When ``REPLICA_DATABASE_URL`` is set, ``RoutingSession`` sends SELECTs to
+the replica if all of these hold:
+
+* the request is a GET/HEAD, or the code runs under ``replica_reads``
+* nothing has been written yet in the request or transaction
+* the user did not write within the last ``DB_READ_YOUR_WRITES_SECONDS``,
+  so a teacher reloading marks right after ``save_marks`` reads the primary
+
+Everything else uses the primary: writes, flushes, locking reads, raw SQL
+and code under ``primary_reads``. Without a replica URL the session
+behaves exactly like the default one.
+
+SQLite
+------
+With ``SQLITE_TUNING`` on (the default), every SQLite connection gets the
+``SQLITE_PRAGMAS``. WAL lets the dashboards keep reading while marks are
+saved, instead of queueing behind each write. ``busy_timeout`` makes
+writers wait for the lock instead of failing with "database is locked".
+Every ``SQLITE_OPTIMIZE_INTERVAL`` seconds a background thread runs
+``PRAGMA optimize``; the first run does a bounded ``ANALYZE``. When the job
+scheduler is on, its nightly ``sqlite-optimize`` job does this instead. Run
+it by hand with ``flask sqlite-optimize``.
+
+Measured on a generated 2,000-pupil school (p50 / p95 ms, rollback journal
+with pysqlite defaults -> tuned):
+
+* benchmarks/run_benchmarks.py, 40 iterations, one thread:
+  save_marks 546/601 -> 375/622, api_academic_history 67/79 -> 45/56,
+  load_marks_data 72/143 -> 68/138, manage_pupils 206/298 -> 247/337.
+  Single-threaded changes are within this machine's run-to-run noise.
+* benchmarks/load_test.py, 12 users, 0.3s think time, 85% teachers:
+  overall p95 7659 -> 7014, save_marks p95 7970 -> 7409.
+
+The gain is mostly under concurrency. save_marks holds the write lock for
+seconds (495 statements), so a busy_timeout above pysqlite's 5s default
+matters more than any cache setting. In an earlier 10-user run with the
+rollback journal, 21% of saves failed with "database is locked".
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('pooled', 'serverless', 'pgbouncer')
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+# Innermost replica_reads/primary_reads block, if any
+_route_override = ContextVar('db_route_override', default=None)
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured strategy"""
+    strategy = config['DB_CONNECTION_STRATEGY']
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown DB_CONNECTION_STRATEGY '{strategy}'; expected one of {', '.join(STRATEGIES)}")
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    url = make_url(uri) if uri else None
+
+    options = {}
+    if strategy == 'pooled':
+        options['pool_pre_ping'] = True
+        # In-memory SQLite uses a per-thread pool that takes no sizing options
+        if url is None or not _is_memory_sqlite(url):
+            options.update(
+                pool_size=config['DB_POOL_SIZE'],
+                max_overflow=config['DB_MAX_OVERFLOW'],
+                pool_timeout=config['DB_POOL_TIMEOUT'],
+                pool_recycle=config['DB_POOL_RECYCLE'],
+            )
+    else:
+        options['poolclass'] = NullPool
+
+    connect_args = {}
+    if url is not None and url.get_backend_name() == 'postgresql':
+        connect_args['connect_timeout'] = config['DB_CONNECT_TIMEOUT']
+        if strategy == 'pgbouncer':
+            if url.get_driver_name() == 'psycopg':
+                # psycopg 3 prepares repeated statements; transaction pooling breaks them
+                connect_args['prepare_threshold'] = None
+        elif config['DB_STATEMENT_TIMEOUT_MS']:
+            connect_args['options'] = f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT_MS'])}"
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def pool_status(engine, strategy=None):
+    """Point-in-time view of the engine's pool for monitoring"""
+    pool = engine.pool
+    status = {'strategy': strategy, 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+    return status
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica bind when it is safe to"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self._flushing or self.info.get('wrote'):
+            return False
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        override = _route_override.get()
+        if override is not None:
+            return override == REPLICA_BIND
+        if not has_request_context():
+            return False
+        return request.method in READ_METHODS and not g.get('_db_wrote') and not g.get('_db_primary_window')
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    db_session.info['wrote'] = True
+    if has_request_context():
+        g._db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_transaction(db_session):
+    db_session.info.pop('wrote', None)
+
+
+@contextmanager
+def _route(target):
+    token = _route_override.set(target)
+    try:
+        yield
+    finally:
+        _route_override.reset(token)
+
+
+def replica_reads(func):
+    """Let a read-only view or helper read from the replica, whatever the method"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _route(REPLICA_BIND):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def primary_reads(func):
+    """Keep a view or helper on the primary, e.g. when it must see its own writes"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _route('primary'):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+def sqlite_optimize(engine):
+    """Refresh the query planner statistics of a SQLite database"""
+    with engine.connect() as conn:
+        # Bounded sampling keeps ANALYZE quick on large results tables
+        conn.exec_driver_sql('PRAGMA analysis_limit=1000')
+        analyzed = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).scalar()
+        if not analyzed:
+            conn.exec_driver_sql('ANALYZE')
+        conn.exec_driver_sql('PRAGMA optimize')
+        conn.commit()
+
+
+class _SqliteMaintenance:
+    """Runs sqlite_optimize in the background at most once per interval"""
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+        self.interval = app.config['SQLITE_OPTIMIZE_INTERVAL']
+        self.lock = threading.Lock()
+        self.last_run = None
+
+    def maybe_run(self):
+        now = time.monotonic()
+        due = self.last_run is None or now - self.last_run >= self.interval
+        if not due or not self.lock.acquire(blocking=False):
+            return
+        self.last_run = now
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            sqlite_optimize(self.engine)
+        except Exception:
+            logger.warning('SQLite optimize failed', exc_info=True)
+        finally:
+            self.lock.release()
+
+
+def _init_sqlite(app, engine):
+    event.listen(engine, 'connect', _apply_pragmas(app.config['SQLITE_PRAGMAS']))
+    # With the scheduler on, its sqlite-optimize job does this instead (see services/jobs.py)
+    if (app.config['SQLITE_OPTIMIZE_INTERVAL'] and not app.config['SCHEDULER_ENABLED']
+            and engine.url.database not in (None, '', ':memory:')):
+        maintenance = _SqliteMaintenance(app, engine)
+
+        @app.teardown_request
+        def _sqlite_maintenance(exc):
+            maintenance.maybe_run()
+
+    @app.cli.command('sqlite-optimize')
+    def sqlite_optimize_command():
+        """Run ANALYZE/PRAGMA optimize on the SQLite database"""
+        sqlite_optimize(engine)
+        print('SQLite statistics refreshed')
+
+
+def init_database(app, db):
+    """Configure the engines for the connection strategy and bind ``db`` to the app"""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    replica_url = app.config.get('REPLICA_DATABASE_URL')
+    if replica_url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = replica_url
+    db.init_app(app)
+
+    if app.config['SQLITE_TUNING']:
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            _init_sqlite(app, engine)
+
+    if not replica_url:
+        return
+
+    @app.before_request
+    def _check_primary_window():
+        g._db_primary_window = session.get('_db_primary_until', 0) > time.time()
+
+    @app.after_request
+    def _open_primary_window(response):
+        # Replicas lag; keep this user's reads on the primary for a while after a write
+        if g.get('_db_wrote'):
+            session['_db_primary_until'] = time.time() + app.config['DB_READ_YOUR_WRITES_SECONDS']
+        return response
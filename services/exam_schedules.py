@@ -0,0 +1,132 @@
+"""Exam schedule generation and per-teacher lookups.
+
+A whole grid of exam names x terms x classes x subjects is inserted with a
+single cross-join INSERT ... SELECT ... WHERE NOT EXISTS, so no ORM objects
+are loaded or built and existing schedules are skipped by the database.
+
+A teacher's schedules for a term are found with one EXISTS against their
+assignments and cached per (teacher, term). The admin views that change
+assignments or exam schedules call ``invalidate_teacher_schedules``, but
+that only clears this worker's cache. Other workers keep serving the old
+list until the entry expires after the TTL, like the other caches in
+services/cache.py.
+"""
+from sqlalchemy import and_, exists, func, insert, literal, select, true, union_all
+from sqlalchemy.orm import aliased
+
+from models.auth_models import db
+from models.admin_models import ClassStream, ExamSchedule, SchoolClass, Subject, TeacherAssignment, Term
+from services.cache import get_cache
+
+teacher_schedule_cache = get_cache('teacher_exam_schedules', ttl=120)
+
+
+def _names_subquery(names):
+    selects = [select(literal(name, db.String).label('name')) for name in names]
+    query = selects[0] if len(selects) == 1 else union_all(*selects)
+    return query.subquery('exam_names')
+
+
+def generate_exam_schedules(names, term_ids, exam_date, class_ids=None, subject_ids=None):
+    """Create a schedule for every name, term, class and subject combination.
+
+    ``class_ids``/``subject_ids`` default to all classes/subjects. Returns the
+    number of schedules inserted; combinations that already exist are skipped.
+    """
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    term_ids = list(dict.fromkeys(int(term_id) for term_id in term_ids))
+    if not names or not term_ids:
+        return 0
+
+    exam_names = _names_subquery(names)
+    existing = aliased(ExamSchedule)
+    grid = select(
+        exam_names.c.name,
+        Term.id,
+        literal(exam_date, db.Date),
+        Subject.id,
+        SchoolClass.id,
+    ).select_from(exam_names).join(Term, true()).join(SchoolClass, true()).join(Subject, true()).where(
+        Term.id.in_(term_ids),
+        ~exists().where(and_(
+            existing.term_id == Term.id,
+            existing.class_id == SchoolClass.id,
+            existing.subject_id == Subject.id,
+            existing.name == exam_names.c.name
+        ))
+    )
+    if class_ids is not None:
+        grid = grid.where(SchoolClass.id.in_(class_ids))
+    if subject_ids is not None:
+        grid = grid.where(Subject.id.in_(subject_ids))
+
+    try:
+        created = db.session.execute(
+            insert(ExamSchedule).from_select(['name', 'term_id', 'exam_date', 'subject_id', 'class_id'], grid)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if created:
+        invalidate_teacher_schedules()
+    return created
+
+
+def count_schedule_grid(names, term_ids, class_ids=None, subject_ids=None):
+    """Number of combinations ``generate_exam_schedules`` would cover"""
+    class_count = len(class_ids) if class_ids is not None else db.session.scalar(select(func.count(SchoolClass.id)))
+    subject_count = len(subject_ids) if subject_ids is not None else db.session.scalar(select(func.count(Subject.id)))
+    names = {name.strip() for name in names if name and name.strip()}
+    return len(names) * len({int(term_id) for term_id in term_ids}) * class_count * subject_count
+
+
+def get_teacher_exam_schedules(teacher_id, term_id):
+    """Schedules in ``term_id`` for the teacher's assigned class/subject pairs.
+
+    Rows are plain dicts (``subject``, ``school_class`` and ``term`` hold a
+    ``name``) so they can be cached and rendered like the ORM objects.
+    """
+    return teacher_schedule_cache.get_or_set(
+        (teacher_id, term_id),
+        lambda: _load_teacher_exam_schedules(teacher_id, term_id)
+    )
+
+
+def _load_teacher_exam_schedules(teacher_id, term_id):
+    assigned = exists().where(
+        TeacherAssignment.class_stream_id == ClassStream.id,
+        TeacherAssignment.teacher_id == teacher_id,
+        TeacherAssignment.subject_id == ExamSchedule.subject_id,
+        ClassStream.class_id == ExamSchedule.class_id
+    )
+    rows = db.session.execute(
+        select(
+            ExamSchedule.id,
+            ExamSchedule.name,
+            ExamSchedule.exam_date,
+            Subject.name.label('subject_name'),
+            SchoolClass.name.label('class_name'),
+            Term.name.label('term_name'),
+        ).join(Subject, Subject.id == ExamSchedule.subject_id)
+        .join(SchoolClass, SchoolClass.id == ExamSchedule.class_id)
+        .join(Term, Term.id == ExamSchedule.term_id)
+        .where(ExamSchedule.term_id == term_id, assigned)
+        .order_by(ExamSchedule.exam_date)
+    ).all()
+    return [{
+        'id': row.id,
+        'name': row.name,
+        'exam_date': row.exam_date,
+        'subject': {'name': row.subject_name},
+        'school_class': {'name': row.class_name},
+        'term': {'name': row.term_name},
+    } for row in rows]
+
+
+def invalidate_teacher_schedules(teacher_id=None):
+    """Forget cached schedules for one teacher, or for everyone"""
+    if teacher_id is None:
+        teacher_schedule_cache.clear()
+    else:
+        teacher_schedule_cache.invalidate_prefix(teacher_id)
@@ -0,0 +1,102 @@
+"""Cache of rendered loadContent partials.
+
+Sidebar pages such as the teacher curriculum/lesson-plan pages and the
+admin create forms render the same HTML until the data behind them
+changes. ``render_fragment`` keys the rendered HTML by:
+
+* the template
+* the viewer's role
+* the user, when the page is personal
+* today's date, since term progress is shown
+* a version stamp for each table the page reads
+
+Every committed insert, update or delete through ``db.session`` bumps the
+stamp of its table. That includes ORM flushes and bulk
+``insert(...).from_select`` / ``update(...)`` statements, so cached pages
+never outlive the data they show in this worker. Writes made outside the
+session, such as raw SQL scripts, must call ``invalidate_fragments``
+themselves. Other workers pick up changes when entries expire after the
+TTL, like the other caches in services/cache.py.
+
+Requests that have flashed messages pending skip the cache, because the
+templates consume them while rendering.
+"""
+import threading
+from collections import defaultdict
+from datetime import date
+
+from flask import render_template, session
+from sqlalchemy import event
+
+from services.cache import get_cache
+from services.database import RoutingSession
+
+fragment_cache = get_cache('fragments', ttl=120, max_entries=2048)
+
+_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+
+
+def _table_name(dependency):
+    return dependency if isinstance(dependency, str) else dependency.__table__.name
+
+
+def invalidate_fragments(*tables):
+    """Bump the version stamp of ``tables`` (models or table names); with none, drop everything"""
+    if not tables:
+        fragment_cache.clear()
+        return
+    with _versions_lock:
+        for table in tables:
+            _versions[_table_name(table)] += 1
+
+
+def _stamps(tables):
+    with _versions_lock:
+        return tuple((table, _versions[table]) for table in tables)
+
+
+def render_fragment(template, context_factory, role, depends, user_id=None):
+    """Render ``template`` with ``context_factory()``, or return the cached HTML
+
+    ``depends`` lists the models whose tables the page reads. Pass ``user_id``
+    for pages that show per-user data such as unread notification counts.
+    """
+    if session.get('_flashes'):
+        return render_template(template, **context_factory())
+    tables = tuple(sorted({_table_name(dependency) for dependency in depends}))
+    key = (template, role, user_id, date.today().isoformat(), _stamps(tables))
+    return fragment_cache.get_or_set(key, lambda: render_template(template, **context_factory()))
+
+
+def _pending(db_session):
+    return db_session.info.setdefault('fragment_tables', set())
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _track_flush(db_session, flush_context):
+    tables = _pending(db_session)
+    for instance in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+        table = getattr(instance, '__table__', None)
+        if table is not None:
+            tables.add(table.name)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _track_bulk_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _pending(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _bump_committed(db_session):
+    tables = db_session.info.pop('fragment_tables', None)
+    if tables:
+        invalidate_fragments(*tables)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_pending(db_session):
+    db_session.info.pop('fragment_tables', None)
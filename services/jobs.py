@@ -0,0 +1,97 @@
+"""Built-in scheduled jobs (see services/scheduler.py).
+
+Schedules are defaults; admins can change them on the Scheduled Jobs page.
+Each job returns a one-line summary for the run history.
+"""
+import glob
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from models.admin_models import EmailOutbox, JobRun
+from models.auth_models import db
+from models.teacher_models import Homework
+from services.database import sqlite_optimize
+from services.scheduler import job, school_timezone
+from services.settings import get_int_setting, get_setting
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+BACKUP_INTERVALS = {'daily': timedelta(days=1), 'weekly': timedelta(days=7), 'monthly': timedelta(days=30)}
+
+
+@job('overdue-homework', '15 0 * * *', 'Mark active homework past its due date as overdue')
+def mark_overdue_homework():
+    today = datetime.now(school_timezone()).date()
+    result = db.session.execute(
+        update(Homework).where(Homework.status == 'active', Homework.due_date < today).values(status='overdue'))
+    db.session.commit()
+    return f'{result.rowcount} homework assignments marked overdue'
+
+
+@job('prune-history', '30 3 * * 0', 'Delete sent emails and job runs older than data_retention_months')
+def prune_history():
+    months = get_int_setting('data_retention_months', 24)
+    cutoff = _utcnow() - relativedelta(months=months)
+    emails = db.session.execute(
+        delete(EmailOutbox).where(EmailOutbox.status.in_(['sent', 'failed']), EmailOutbox.created_at < cutoff))
+    runs = db.session.execute(delete(JobRun).where(JobRun.started_at < cutoff))
+    db.session.commit()
+    return f'Deleted {emails.rowcount} emails and {runs.rowcount} job runs older than {months} months'
+
+
+@job('database-backup', '0 1 * * *', 'Back up the SQLite database as often as backup_frequency says', lease=1800)
+def backup_database():
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return f'Skipped: {engine.dialect.name} databases are backed up by the database host'
+    frequency = get_setting('backup_frequency', 'weekly')
+    if frequency == 'disabled':
+        return 'Skipped: backups disabled'
+    if frequency not in BACKUP_INTERVALS:
+        raise ValueError(f"Unknown backup_frequency '{frequency}'")
+    last_backup = db.session.scalar(
+        select(JobRun.started_at).where(JobRun.job_name == 'database-backup', JobRun.status == 'succeeded',
+                                        JobRun.message.like('Backed up%'))
+        .order_by(JobRun.started_at.desc()).limit(1))
+    if last_backup and _utcnow() - last_backup < BACKUP_INTERVALS[frequency] - timedelta(hours=1):
+        return f'Skipped: last {frequency} backup was at {last_backup:%Y-%m-%d %H:%M} UTC'
+
+    backup_dir = current_app.config['BACKUP_DIR']
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f'backup-{_utcnow():%Y%m%d-%H%M%S}.db')
+    raw = engine.raw_connection()
+    target = sqlite3.connect(path)
+    try:
+        # The online backup API copies in steps, so writers are not blocked for the whole copy
+        raw.driver_connection.backup(target, pages=1024)
+    finally:
+        target.close()
+        raw.close()
+
+    keep = current_app.config['BACKUP_KEEP']
+    for old in sorted(glob.glob(os.path.join(backup_dir, 'backup-*.db')))[:-keep]:
+        os.remove(old)
+    return f'Backed up to {path}'
+
+
+@job('sqlite-optimize', '0 2 * * *', 'Refresh SQLite query planner statistics')
+def optimize_sqlite():
+    if db.engine.dialect.name != 'sqlite':
+        return f'Skipped: not needed on {db.engine.dialect.name}'
+    sqlite_optimize(db.engine)
+    return 'SQLite statistics refreshed'
+
+
+@job('send-outbox', '*/5 * * * *', 'Send queued emails where no background sender runs')
+def send_outbox():
+    if current_app.config['OUTBOX_SENDER_ENABLED']:
+        return 'Skipped: the background sender is running'
+    return f"Sent {current_app.extensions['outbox'].send_pending()} emails"
@@ -0,0 +1,193 @@
+"""Password login pipeline shared by both login views.
+
+``authenticate`` does three things:
+
+* It charges each attempt to two token buckets, one for the account and
+  one for the client IP. The ``max_login_attempts`` setting is the account
+  bucket's size, and it refills over ``LOGIN_THROTTLE_WINDOW`` seconds.
+  The IP bucket is ``LOGIN_IP_ATTEMPTS_FACTOR`` times larger, because a
+  whole school often logs in from one address. A correct password gives
+  the tokens back, so only failures count toward the lockout.
+* It runs the password hash on a small executor. At most
+  ``LOGIN_VERIFY_WORKERS`` hashes run at once, and ``LOGIN_VERIFY_QUEUE``
+  more may wait. Anything beyond that is turned away as busy instead of
+  tying up every CPU.
+* It re-hashes the password with ``PASSWORD_HASH_METHOD`` when the stored
+  hash was made with another method or cost. The view's commit saves it.
+  A new hash too long for ``system_users.password_hash`` is not used.
+  Databases created before the column was widened to 255 characters need
+  add_password_hash_length.py before switching to a longer method such as
+  scrypt.
+
+Failures come back as ``LoginError`` messages. They flash like any string,
+and carry the HTTP status and ``Retry-After`` for the API.
+
+Buckets are kept in memory per process, like the caches in
+services/cache.py. With several workers, each enforces its own limit.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app, request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models.auth_models import SystemUser
+from services.settings import get_int_setting
+
+logger = logging.getLogger(__name__)
+
+
+class LoginError(str):
+    """Message for a failed login, with the HTTP status an API client gets"""
+
+    def __new__(cls, message, status=401, retry_after=None):
+        error = super().__new__(cls, message)
+        error.status = status
+        error.retry_after = retry_after
+        return error
+
+
+INVALID_CREDENTIALS = LoginError('Invalid email or password')
+BUSY = LoginError('The server is busy, please try again in a moment', 503)
+
+
+class LoginBusy(Exception):
+    pass
+
+
+class LoginThrottle:
+    """Token buckets keyed by account or client address"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()  # key -> (tokens, last update)
+
+    def take(self, key, capacity, window):
+        """Spend one token; return 0, or the seconds until one is available"""
+        rate = capacity / window
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / rate
+
+    def give_back(self, key, capacity):
+        with self.lock:
+            if key in self.buckets:
+                tokens, updated = self.buckets[key]
+                self.buckets[key] = (min(capacity, tokens + 1), updated)
+
+
+class VerificationPool:
+    """Runs password hashing on a fixed number of threads with a bounded queue"""
+
+    def __init__(self, workers, queue, wait):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-verify')
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.wait = wait
+
+    def run(self, func, *args):
+        if not self.slots.acquire(timeout=self.wait):
+            raise LoginBusy()
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future.result()
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    # werkzeug stores the expanded method, e.g. 'pbkdf2' -> 'pbkdf2:sha256:600000'
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def hash_password(password):
+    return generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def _verify(pwhash, password, method):
+    """Return (matches, new hash or None)"""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if pwhash.split('$', 1)[0] == _hash_prefix(method):
+        return True, None
+    return True, generate_password_hash(password, method)
+
+
+def client_ip():
+    hops = current_app.config['TRUSTED_PROXY_HOPS']
+    route = request.access_route
+    if hops and len(route) >= hops:
+        return route[-hops]
+    return request.remote_addr
+
+
+def authenticate(email, password):
+    """Check a login; return (user, None) or (None, message to flash)"""
+    state = current_app.extensions['login']
+    config = current_app.config
+    window = config['LOGIN_THROTTLE_WINDOW']
+    capacity = max(get_int_setting('max_login_attempts', 5), 1)
+    buckets = (
+        (('ip', client_ip()), capacity * config['LOGIN_IP_ATTEMPTS_FACTOR']),
+        (('account', (email or '').strip().lower()), capacity),
+    )
+    taken = []
+    for key, size in buckets:
+        retry_after = state.throttle.take(key, size, window)
+        if retry_after:
+            logger.warning('Login throttled for %s', key[0])
+            for taken_key, taken_size in taken:
+                state.throttle.give_back(taken_key, taken_size)
+            minutes = math.ceil(retry_after / 60)
+            return None, LoginError(
+                f'Too many login attempts. Please try again in {minutes} minute{"s" if minutes != 1 else ""}.',
+                429, math.ceil(retry_after))
+        taken.append((key, size))
+
+    user = SystemUser.query.filter_by(email=email).first()
+    if not user:
+        return None, INVALID_CREDENTIALS
+    try:
+        matches, new_hash = state.pool.run(_verify, user.password_hash, password or '', config['PASSWORD_HASH_METHOD'])
+    except LoginBusy:
+        logger.warning('Password verification queue full')
+        matches, new_hash = None, None
+    if matches is False:
+        return None, INVALID_CREDENTIALS
+
+    for key, size in taken:
+        state.throttle.give_back(key, size)
+    if matches is None:
+        return None, BUSY
+    if new_hash and len(new_hash) <= SystemUser.password_hash.type.length:
+        user.password_hash = new_hash
+    elif new_hash:
+        logger.warning('Not rehashing user %s: a %s hash does not fit password_hash',
+                       user.id, config['PASSWORD_HASH_METHOD'])
+    return user, None
+
+
+class _LoginState:
+    def __init__(self, config):
+        self.throttle = LoginThrottle()
+        self.pool = VerificationPool(config['LOGIN_VERIFY_WORKERS'], config['LOGIN_VERIFY_QUEUE'],
+                                     config['LOGIN_VERIFY_WAIT'])
+
+
+def init_login(app):
+    """Set up login throttling and the verification pool for ``app``"""
+    app.extensions['login'] = _LoginState(app.config)
@@ -0,0 +1,442 @@
+"""Prometheus-format request, pool and cache metrics.
+
+Each worker process keeps its own counters and writes them to
+``<METRICS_DIR>/metrics-<pid>-<start>.json`` at most once per
+``FLUSH_INTERVAL``, again shortly after the last request of a burst, and at
+exit. ``<start>`` is the process start time, so a worker that gets a
+recycled pid does not overwrite an older file. The ``/metrics`` route merges
+every worker's file, so any worker can answer a scrape for the whole server.
+
+While collecting, the files of exited workers are folded into
+``metrics-retired.json`` and deleted. Their counters and histograms are kept
+that way; gauges only count live workers.
+"""
+import atexit
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_app_context, request, session
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from services.cache import all_caches
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+RETIRED_FILE = 'metrics-retired.json'
+
+_lock = threading.Lock()
+_requests = defaultdict(int)        # (endpoint, method, status) -> count
+_latency = {}                       # endpoint -> [bucket counts..., +Inf count, sum]
+_in_flight = 0
+_pool = {'checkouts': 0, 'checked_out': 0, 'connects': 0}
+_last_flush = 0.0
+_flush_timer = None
+_flush_lock = threading.Lock()
+_process = None                     # (pid, start time) of this process
+_app = None
+
+
+@event.listens_for(Pool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    with _lock:
+        _pool['connects'] += 1
+
+
+@event.listens_for(Pool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    with _lock:
+        _pool['checkouts'] += 1
+        _pool['checked_out'] += 1
+
+
+@event.listens_for(Pool, 'checkin')
+def _on_checkin(dbapi_connection, connection_record):
+    with _lock:
+        _pool['checked_out'] = max(_pool['checked_out'] - 1, 0)
+
+
+def _observe(endpoint, method, status, seconds):
+    with _lock:
+        _requests[(endpoint, method, status)] += 1
+        histogram = _latency.get(endpoint)
+        if histogram is None:
+            histogram = _latency[endpoint] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[index] += 1
+        histogram[len(LATENCY_BUCKETS)] += 1
+        histogram[-1] += seconds
+
+
+def _pool_status():
+    if not has_app_context():
+        return None
+    from models.auth_models import db
+    from services.database import pool_status
+    return pool_status(db.engine, current_app.config.get('DB_CONNECTION_STRATEGY'))
+
+
+def _process_start(pid):
+    """Start time of ``pid`` in clock ticks since boot, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat') as handle:
+            # Field 22; the command name in field 2 may itself contain spaces or ')'
+            return int(handle.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _process_id():
+    global _process
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        _process = (pid, _process_start(pid) or time.time_ns())
+    return _process
+
+
+def _snapshot():
+    status = _pool_status()
+    pid, started = _process_id()
+    with _lock:
+        return {
+            'pid': pid,
+            'started': started,
+            'requests': [[*key, count] for key, count in _requests.items()],
+            'latency': {endpoint: list(values) for endpoint, values in _latency.items()},
+            'in_flight': _in_flight,
+            'pool': dict(_pool),
+            'pool_status': status,
+            'caches': [cache.stats() for cache in all_caches()],
+        }
+
+
+def _metrics_dir():
+    return current_app.config['METRICS_DIR']
+
+
+def _write_json(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def flush(force=False):
+    """Write this worker's snapshot, at most once per FLUSH_INTERVAL.
+
+    A skipped flush is retried once the interval is up, so the last requests
+    before the worker goes idle are not left unwritten.
+    """
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        _schedule_flush(FLUSH_INTERVAL - (now - _last_flush))
+        return
+    _last_flush = now
+    directory = _metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    pid, started = _process_id()
+    _write_json(directory, f'metrics-{pid}-{started}.json', _snapshot())
+
+
+def _schedule_flush(delay):
+    global _flush_timer
+    with _flush_lock:
+        # Timers do not survive a fork, so a copied one reads as not alive
+        if _flush_timer is not None and _flush_timer.is_alive():
+            return
+        _flush_timer = threading.Timer(delay, _flush_in_background)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def _flush_in_background():
+    if _app is None:
+        return
+    with _app.app_context():
+        try:
+            flush(force=True)
+        except OSError:
+            current_app.logger.warning('Could not write metrics snapshot', exc_info=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_alive(snapshot):
+    if not _pid_alive(snapshot['pid']):
+        return False
+    # A live process with a different start time got the pid after the worker exited
+    started = _process_start(snapshot['pid'])
+    return started is None or started == snapshot.get('started')
+
+
+def _read_json(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _retired_lock(directory):
+    # Serialises workers updating metrics-retired.json
+    with open(os.path.join(directory, '.retired.lock'), 'w') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+def _retire(directory, path, snapshot):
+    """Fold an exited worker's counters into metrics-retired.json and delete its file"""
+    claimed = path + '.retiring'
+    try:
+        # Only one collecting worker wins the rename, so a file is never counted twice
+        os.rename(path, claimed)
+    except OSError:
+        return
+    with _retired_lock(directory):
+        retired = _read_json(os.path.join(directory, RETIRED_FILE)) or {
+            'pid': None, 'requests': [], 'latency': {}, 'in_flight': 0,
+            'pool': {'checkouts': 0, 'checked_out': 0, 'connects': 0}, 'caches': []}
+        requests_total = {tuple(key): count for *key, count in retired['requests']}
+        for *key, count in snapshot['requests']:
+            requests_total[tuple(key)] = requests_total.get(tuple(key), 0) + count
+        retired['requests'] = [[*key, count] for key, count in requests_total.items()]
+        for endpoint, values in snapshot['latency'].items():
+            merged = retired['latency'].setdefault(endpoint, [0] * len(values))
+            retired['latency'][endpoint] = [a + b for a, b in zip(merged, values)]
+        retired['pool']['checkouts'] += snapshot['pool']['checkouts']
+        retired['pool']['connects'] += snapshot['pool'].get('connects', 0)
+        caches = {stats['name']: stats for stats in retired['caches']}
+        for stats in snapshot['caches']:
+            merged = caches.setdefault(stats['name'], {'name': stats['name'], 'hits': 0, 'misses': 0, 'size': 0})
+            merged['hits'] += stats['hits']
+            merged['misses'] += stats['misses']
+        retired['caches'] = list(caches.values())
+        _write_json(directory, RETIRED_FILE, retired)
+    os.remove(claimed)
+
+
+def _load_snapshots():
+    """Every worker's snapshot as (snapshot, alive); exited workers are retired first"""
+    directory = _metrics_dir()
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        if os.path.basename(path) == RETIRED_FILE:
+            continue
+        snapshot = _read_json(path)
+        if snapshot is None:
+            continue
+        if _worker_alive(snapshot):
+            snapshots.append((snapshot, True))
+        else:
+            try:
+                _retire(directory, path, snapshot)
+            except OSError:
+                current_app.logger.warning('Could not retire metrics file %s', path, exc_info=True)
+    retired = _read_json(os.path.join(directory, RETIRED_FILE))
+    if retired is not None:
+        snapshots.append((retired, False))
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return '{' + pairs + '}' if pairs else ''
+
+
+def render():
+    """Merge every worker's snapshot into the Prometheus text format"""
+    flush(force=True)
+    requests_total = defaultdict(int)
+    latency = {}
+    in_flight = 0
+    checkouts = 0
+    connects = 0
+    checked_out = 0
+    pool_gauges = defaultdict(int)
+    pool_kinds = set()
+    caches = defaultdict(lambda: {'hits': 0, 'misses': 0, 'size': 0})
+    workers = 0
+
+    for snapshot, alive in _load_snapshots():
+        for endpoint, method, status, count in snapshot['requests']:
+            requests_total[(endpoint, method, status)] += count
+        for endpoint, values in snapshot['latency'].items():
+            merged = latency.setdefault(endpoint, [0] * len(values))
+            for index, value in enumerate(values):
+                merged[index] += value
+        checkouts += snapshot['pool']['checkouts']
+        connects += snapshot['pool'].get('connects', 0)
+        for stats in snapshot['caches']:
+            caches[stats['name']]['hits'] += stats['hits']
+            caches[stats['name']]['misses'] += stats['misses']
+        if alive:
+            workers += 1
+            in_flight += snapshot['in_flight']
+            checked_out += snapshot['pool']['checked_out']
+            status = snapshot.get('pool_status')
+            if status:
+                pool_kinds.add((status['strategy'], status['pool']))
+                for key in ('size', 'overflow', 'checked_in'):
+                    pool_gauges[key] += status.get(key, 0)
+            for stats in snapshot['caches']:
+                caches[stats['name']]['size'] += stats['size']
+
+    lines = [
+        '# HELP app_workers Worker processes that have reported metrics and are alive',
+        '# TYPE app_workers gauge',
+        f'app_workers {workers}',
+        '# HELP http_requests_total Requests handled, by endpoint, method and status',
+        '# TYPE http_requests_total counter',
+    ]
+    for (endpoint, method, status), count in sorted(requests_total.items()):
+        lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency by endpoint',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for endpoint, values in sorted(latency.items()):
+        for bound, count in zip(LATENCY_BUCKETS, values):
+            lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+        total = values[len(LATENCY_BUCKETS)]
+        lines.append(f'http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {total}')
+        lines.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint)} {total}')
+        lines.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {values[-1]:.6f}')
+
+    lines += [
+        '# HELP http_requests_in_flight Requests currently being handled',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {in_flight}',
+        '# HELP db_pool_checkouts_total Connections checked out of the pool',
+        '# TYPE db_pool_checkouts_total counter',
+        f'db_pool_checkouts_total {checkouts}',
+        '# HELP db_pool_checked_out Connections currently checked out',
+        '# TYPE db_pool_checked_out gauge',
+        f'db_pool_checked_out {checked_out}',
+        '# HELP db_pool_connects_total New DBAPI connections opened',
+        '# TYPE db_pool_connects_total counter',
+        f'db_pool_connects_total {connects}',
+        '# HELP db_pool_size Configured pool size (0 for NullPool)',
+        '# TYPE db_pool_size gauge',
+        f"db_pool_size {pool_gauges['size']}",
+        '# HELP db_pool_overflow Connections open beyond the pool size',
+        '# TYPE db_pool_overflow gauge',
+        f"db_pool_overflow {pool_gauges['overflow']}",
+        '# HELP db_pool_checked_in Idle connections held by the pool',
+        '# TYPE db_pool_checked_in gauge',
+        f"db_pool_checked_in {pool_gauges['checked_in']}",
+        '# HELP db_pool_info Connection strategy and pool class in use',
+        '# TYPE db_pool_info gauge',
+    ]
+    for strategy, pool in sorted(pool_kinds, key=str):
+        lines.append(f'db_pool_info{_labels(strategy=strategy, pool=pool)} 1')
+    lines += [
+        '# HELP cache_hits_total Cache lookups answered from memory',
+        '# TYPE cache_hits_total counter',
+    ]
+    for name, stats in sorted(caches.items()):
+        lines.append(f'cache_hits_total{_labels(cache=name)} {stats["hits"]}')
+    lines += ['# HELP cache_misses_total Cache lookups that went to the database', '# TYPE cache_misses_total counter']
+    for name, stats in sorted(caches.items()):
+        lines.append(f'cache_misses_total{_labels(cache=name)} {stats["misses"]}')
+    lines += ['# HELP cache_hit_ratio Share of cache lookups that hit', '# TYPE cache_hit_ratio gauge']
+    for name, stats in sorted(caches.items()):
+        total = stats['hits'] + stats['misses']
+        lines.append(f'cache_hit_ratio{_labels(cache=name)} {stats["hits"] / total if total else 0:.4f}')
+    lines += ['# HELP cache_entries Entries currently cached', '# TYPE cache_entries gauge']
+    for name, stats in sorted(caches.items()):
+        lines.append(f'cache_entries{_labels(cache=name)} {stats["size"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _authorised():
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token):
+        return True
+    if 'user_id' not in session:
+        return False
+    from models.auth_models import SystemUser, db
+    user = db.session.get(SystemUser, session['user_id'])
+    return bool(user and user.role.name == 'Admin')
+
+
+def metrics():
+    if not _authorised():
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def _flush_at_exit(app):
+    with app.app_context():
+        try:
+            flush(force=True)
+        except Exception:
+            # Logging may already be shut down this late
+            pass
+
+
+def init_metrics(app):
+    """Record every request on ``app`` and serve ``/metrics``"""
+    global _app
+    app.config.setdefault('METRICS_DIR', os.getenv('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'brightfuture_metrics'))
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+    _app = app
+    atexit.register(_flush_at_exit, app)
+
+    @app.before_request
+    def _start_metrics():
+        global _in_flight
+        g._metrics_started = time.perf_counter()
+        with _lock:
+            _in_flight += 1
+
+    @app.teardown_request
+    def _finish_metrics(exc):
+        global _in_flight
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        with _lock:
+            _in_flight -= 1
+        status = g.pop('_metrics_status', 500 if exc else 200)
+        _observe(request.endpoint or 'unmatched', request.method, status, time.perf_counter() - started)
+        try:
+            flush()
+        except OSError:
+            current_app.logger.warning('Could not write metrics snapshot', exc_info=True)
+
+    @app.after_request
+    def _remember_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,262 @@
+"""Live notification updates over server-sent events.
+
+Each worker keeps one ``NotificationBroker``. Admin views publish to it when
+they create, edit or delete a notification, and ``mark_notifications_read``
+publishes when a user reads theirs. Every ``/notifications/stream``
+connection waits on the broker's condition variable, so an idle client costs
+one sleeping thread (or greenlet under gevent) and no database work.
+
+A connection reads the user's visible and unread notification ids once, then
+keeps them current from broker events. It sends:
+
+* ``unread``: ``{"count": n}`` on connect and whenever the count changes
+* ``notification``: ``{"action": "created"|"updated"|"deleted", ...}`` for
+  notifications visible to the user's role
+* ``resync``: sent when a ``Last-Event-ID`` can no longer be replayed
+
+A comment line goes out every ``SSE_HEARTBEAT_SECONDS`` to keep proxies
+from closing the connection. Streams end after ``SSE_MAX_SECONDS``, and
+EventSource reconnects with ``Last-Event-ID``. Events still in the backlog
+are replayed; otherwise the client gets ``resync``.
+
+Notifications created by other workers are found by one poll per worker
+every ``SSE_POLL_SECONDS``, and only while clients are connected. Edits,
+deletes and reads made on another worker show up when the client reconnects.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from models.admin_models import Notification, NotificationRead
+from models.auth_models import SystemUser
+
+logger = logging.getLogger(__name__)
+
+
+def visible_to(visibility, role):
+    """Whether users with ``role`` see notifications with ``visibility``.
+
+    Parents see none, as on the parent dashboard, and admins are left out of
+    'all_except_parents_admins'.
+    """
+    if role == 'Parent':
+        return False
+    if visibility == 'all_except_parents_admins':
+        return role != 'Admin'
+    return visibility in ('all', role.lower() + '_only')
+
+
+def notification_payload(notification, author=None):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'visibility': notification.visibility,
+        'author': author if author is not None else (notification.creator.username if notification.creator else None),
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+class NotificationBroker:
+    def __init__(self, engine, backlog, poll_seconds):
+        self.engine = engine
+        self.poll_seconds = poll_seconds
+        self.epoch = uuid.uuid4().hex[:8]
+        self.cond = threading.Condition()
+        self.events = deque(maxlen=backlog)  # (seq, kind, payload)
+        self.seq = 0
+        self.subscribers = 0
+        self.published_ids = set()
+        self.watermark = None
+        self.poller = None
+
+    def publish(self, kind, payload):
+        with self.cond:
+            self.seq += 1
+            self.events.append((self.seq, kind, payload))
+            if kind == 'notification' and payload.get('action') == 'created':
+                self.published_ids.add(payload['id'])
+            self.cond.notify_all()
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def resume_point(self, last_event_id):
+        """Sequence number to replay from, or None if the backlog no longer reaches it"""
+        epoch, _, seq = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self.cond:
+            oldest = self.events[0][0] if self.events else self.seq + 1
+            return seq if oldest <= seq + 1 and seq <= self.seq else None
+
+    def wait(self, after, timeout):
+        with self.cond:
+            if self.seq <= after:
+                self.cond.wait(timeout)
+            return [event for event in self.events if event[0] > after]
+
+    def current(self):
+        with self.cond:
+            return self.seq
+
+    def subscribe(self):
+        with self.cond:
+            self.subscribers += 1
+            if self.poller is None or not self.poller.is_alive():
+                self.poller = threading.Thread(target=self._poll, name='notification-poller', daemon=True)
+                self.poller.start()
+
+    def unsubscribe(self):
+        with self.cond:
+            self.subscribers -= 1
+
+    def _poll(self):
+        # One query per worker for notifications created by other workers
+        while True:
+            with self.cond:
+                if self.subscribers <= 0:
+                    self.poller = None
+                    return
+            try:
+                self._check_new()
+            except Exception:
+                logger.warning('Notification poll failed', exc_info=True)
+            time.sleep(self.poll_seconds)
+
+    def _check_new(self):
+        with self.engine.connect() as conn:
+            if self.watermark is None:
+                # Only notifications created from now on are news
+                self.watermark = conn.scalar(select(func.max(Notification.id))) or 0
+                return
+            rows = conn.execute(
+                select(Notification.id, Notification.title, Notification.message, Notification.visibility,
+                       Notification.created_at, SystemUser.username)
+                .join(SystemUser, SystemUser.id == Notification.created_by)
+                .where(Notification.id > self.watermark)
+                .order_by(Notification.id)
+            ).all()
+        for row in rows:
+            self.watermark = row.id
+            if row.id in self.published_ids:
+                continue
+            self.publish('notification', {
+                'action': 'created', 'id': row.id, 'title': row.title, 'message': row.message,
+                'visibility': row.visibility, 'author': row.username,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+            })
+
+
+class Subscription:
+    """One client's view: which notifications it can see and has not read"""
+
+    def __init__(self, user_id, role, visible, unread):
+        self.user_id = user_id
+        self.role = role
+        self.visible = set(visible)
+        self.unread = set(unread)
+
+    @classmethod
+    def load(cls, db_session, user):
+        role = user.role.name
+        rows = db_session.execute(
+            select(Notification.id, Notification.visibility, NotificationRead.id.label('read_id'))
+            .outerjoin(NotificationRead, (NotificationRead.notification_id == Notification.id)
+                       & (NotificationRead.user_id == user.id))
+        ).all()
+        visible = [row.id for row in rows if visible_to(row.visibility, role)]
+        unread = [row.id for row in rows if visible_to(row.visibility, role) and row.read_id is None]
+        return cls(user.id, role, visible, unread)
+
+    def apply(self, kind, payload):
+        """Update state for a broker event; return the payload to send, or None"""
+        if kind == 'read':
+            if payload['user_id'] == self.user_id:
+                self.unread.difference_update(payload['notification_ids'])
+            return None
+        notification_id = payload['id']
+        was_visible = notification_id in self.visible
+        if payload['action'] != 'deleted' and visible_to(payload['visibility'], self.role):
+            if not was_visible:
+                self.visible.add(notification_id)
+                self.unread.add(notification_id)
+                return dict(payload, action='created')
+            # Replays after a reconnect repeat notifications the client may have; it skips known ids
+            return payload
+        if not was_visible:
+            return None
+        self.visible.discard(notification_id)
+        self.unread.discard(notification_id)
+        return {'action': 'deleted', 'id': notification_id}
+
+
+def _format(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def event_stream(broker, subscription, after, resync, heartbeat, max_seconds):
+    """Generator of SSE text for one client"""
+    broker.subscribe()
+    try:
+        yield 'retry: 5000\n\n'
+        if resync:
+            yield _format('resync', {}, broker.event_id(after))
+        unread = len(subscription.unread)
+        yield _format('unread', {'count': unread}, broker.event_id(after))
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            events = broker.wait(after, min(heartbeat, max(deadline - time.monotonic(), 0)))
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+            for seq, kind, payload in events:
+                after = seq
+                data = subscription.apply(kind, payload)
+                if data is not None:
+                    yield _format('notification', data, broker.event_id(seq))
+                if len(subscription.unread) != unread:
+                    unread = len(subscription.unread)
+                    yield _format('unread', {'count': unread}, broker.event_id(seq))
+    finally:
+        broker.unsubscribe()
+
+
+def _broker():
+    return current_app.extensions.get('notification_events')
+
+
+def publish_notification(action, notification):
+    """Tell connected clients that ``notification`` was 'created' or 'updated'"""
+    broker = _broker()
+    if broker is not None:
+        broker.publish('notification', dict(notification_payload(notification), action=action))
+
+
+def publish_notification_deleted(notification_id):
+    broker = _broker()
+    if broker is not None:
+        broker.publish('notification', {'action': 'deleted', 'id': notification_id})
+
+
+def publish_read(user_id, notification_ids):
+    broker = _broker()
+    if broker is not None:
+        broker.publish('read', {'user_id': user_id, 'notification_ids': list(notification_ids)})
+
+
+def init_notification_events(app, db):
+    """Create this worker's notification broker"""
+    with app.app_context():
+        engine = db.engine
+    app.extensions['notification_events'] = NotificationBroker(
+        engine, app.config['SSE_BACKLOG'], app.config['SSE_POLL_SECONDS'])
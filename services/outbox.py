@@ -0,0 +1,302 @@
+"""Email outbox for notification emails.
+
+When the ``enable_email_notifications`` setting is on, ``create_notification``
+queues one ``email_outbox`` row per recipient. The rows are written in the
+same transaction as the notification, so the request does no SMTP work.
+
+Each worker runs an ``OutboxSender`` thread. It wakes when mail is queued,
+and every ``OUTBOX_POLL_SECONDS`` for retries and mail queued by other
+workers. On each pass it:
+
+* claims up to ``OUTBOX_BATCH_SIZE`` due rows under a lease
+  (``OUTBOX_LEASE_SECONDS``), so workers never send the same row twice
+* sends them over one SMTP connection, which stays open while more rows are
+  due. Flask-Mail reconnects after ``MAIL_MAX_EMAILS`` messages.
+* sends at most ``OUTBOX_RATE_PER_MINUTE`` messages per worker
+* marks the sent rows in one UPDATE
+
+A message the server rejects outright (5xx) fails at once. Other errors retry
+after ``OUTBOX_RETRY_SECONDS``, doubling up to an hour. A row fails after
+``OUTBOX_MAX_ATTEMPTS`` tries. If the server cannot be reached, the claimed
+rows go back to the queue without using up an attempt, and the sender
+backs off. A worker killed mid-pass may send its unmarked rows again once
+their lease expires.
+
+The server, port and username come from the SMTP system settings, falling
+back to the ``MAIL_*`` config. The password is only read from
+``MAIL_PASSWORD``. To try it against a local stand-in::
+
+    python -m aiosmtpd -n -l localhost:1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false flask send-outbox
+
+The serverless profile has no sender thread; the ``send-outbox`` scheduled
+job (services/jobs.py) or ``flask send-outbox`` drains the queue there.
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from flask_mail import Connection, Mail, Message
+from sqlalchemy import insert, or_, select, update
+
+from models.admin_models import EmailOutbox
+from models.auth_models import Role, SystemUser, db
+from services.notification_events import visible_to
+from services.settings import get_int_setting, get_setting
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_SECONDS = 3600
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def mail_state(app):
+    """Flask-Mail settings for the current SMTP system settings"""
+    config = dict(app.config)
+    config['MAIL_SERVER'] = get_setting('smtp_server', config['MAIL_SERVER'])
+    config['MAIL_PORT'] = get_int_setting('smtp_port', config['MAIL_PORT'])
+    config['MAIL_USERNAME'] = get_setting('smtp_username', config['MAIL_USERNAME'])
+    if config['MAIL_USE_TLS'] is None:
+        config['MAIL_USE_TLS'] = config['MAIL_PORT'] == 587
+    if config['MAIL_USE_SSL'] is None:
+        config['MAIL_USE_SSL'] = config['MAIL_PORT'] == 465
+    config['MAIL_DEFAULT_SENDER'] = (config['MAIL_DEFAULT_SENDER'] or config['MAIL_USERNAME']
+                                     or get_setting('contact_email') or f"no-reply@{config['MAIL_SERVER']}")
+    return Mail().init_mail(config, app.debug, app.testing)
+
+
+class OutboxSender:
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+        config = app.config
+        self.batch_size = config['OUTBOX_BATCH_SIZE']
+        self.interval = 60.0 / config['OUTBOX_RATE_PER_MINUTE']
+        self.poll_seconds = config['OUTBOX_POLL_SECONDS']
+        # A pass must finish inside the lease even at a low send rate
+        self.lease = timedelta(seconds=max(config['OUTBOX_LEASE_SECONDS'], 2 * self.batch_size * self.interval))
+        self.max_attempts = config['OUTBOX_MAX_ATTEMPTS']
+        self.retry_seconds = config['OUTBOX_RETRY_SECONDS']
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.next_send = 0.0
+        self.paused_until = 0.0
+        self.failures = 0
+
+    def notify(self):
+        self.ensure_started()
+        self.wake.set()
+
+    def ensure_started(self):
+        # Started lazily, and again in forked workers where it does not exist
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='outbox-sender', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.poll_seconds)
+            self.wake.clear()
+            if time.monotonic() < self.paused_until:
+                continue
+            try:
+                with self.app.app_context():
+                    self.send_pending()
+            except Exception:
+                logger.warning('Outbox pass failed', exc_info=True)
+
+    def claim(self):
+        table = EmailOutbox.__table__
+        now = _utcnow()
+        token = uuid.uuid4().hex
+        due = (table.c.status == 'pending', table.c.next_attempt_at <= now,
+               or_(table.c.locked_until.is_(None), table.c.locked_until < now))
+        candidates = select(table.c.id).where(*due).order_by(table.c.id).limit(self.batch_size)
+        with self.engine.begin() as conn:
+            # Repeating the conditions makes a row claimed by another worker drop out
+            conn.execute(update(table).where(table.c.id.in_(candidates.scalar_subquery()), *due)
+                         .values(lock_token=token, locked_until=now + self.lease))
+            return conn.execute(select(table).where(table.c.lock_token == token).order_by(table.c.id)).all()
+
+    def send_pending(self):
+        """Send everything that is due; returns the number of messages sent"""
+        with self.send_lock:
+            sent_total = 0
+            state = connection = None
+            try:
+                while True:
+                    rows = self.claim()
+                    if not rows:
+                        break
+                    if connection is None:
+                        state = mail_state(self.app)
+                        try:
+                            connection = Connection(state).__enter__()
+                        except (smtplib.SMTPException, OSError) as e:
+                            self._server_unavailable(rows, e)
+                            break
+                    sent, connection_lost = self._send_batch(connection, state, rows)
+                    sent_total += sent
+                    if connection_lost:
+                        if connection.host:
+                            connection.host.close()
+                        connection = None
+                        break
+                if connection is not None:
+                    self.failures = 0
+            finally:
+                if connection is not None and connection.host:
+                    try:
+                        connection.host.quit()
+                    except (smtplib.SMTPException, OSError):
+                        connection.host.close()
+            return sent_total
+
+    def _send_batch(self, connection, state, rows):
+        sent_ids = []
+        connection_lost = False
+        try:
+            for index, row in enumerate(rows):
+                self._pace()
+                message = Message(row.subject, recipients=[row.recipient], body=row.body,
+                                  sender=state.default_sender)
+                try:
+                    connection.send(message)
+                    sent_ids.append(row.id)
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                    connection_lost = True
+                    self._server_unavailable(rows[index:], e)
+                    break
+                except smtplib.SMTPException as e:
+                    self._failed(row, e)
+                except OSError as e:
+                    # Socket errors; SMTPException is itself an OSError, so this comes last
+                    connection_lost = True
+                    self._server_unavailable(rows[index:], e)
+                    break
+        finally:
+            self._mark_sent(sent_ids)
+        return len(sent_ids), connection_lost
+
+    def _pace(self):
+        now = time.monotonic()
+        if self.next_send > now:
+            time.sleep(self.next_send - now)
+        self.next_send = max(now, self.next_send) + self.interval
+
+    def _mark_sent(self, ids):
+        if not ids:
+            return
+        table = EmailOutbox.__table__
+        with self.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id.in_(ids)).values(
+                status='sent', sent_at=_utcnow(), attempts=table.c.attempts + 1,
+                lock_token=None, locked_until=None, last_error=None))
+
+    def _failed(self, row, error):
+        attempts = row.attempts + 1
+        permanent = _permanent(error) or attempts >= self.max_attempts
+        delay = min(self.retry_seconds * 2 ** (attempts - 1), MAX_RETRY_SECONDS)
+        logger.warning('Email %s to %s failed (attempt %d): %s', row.id, row.recipient, attempts, error)
+        table = EmailOutbox.__table__
+        with self.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id == row.id).values(
+                status='failed' if permanent else 'pending', attempts=attempts,
+                next_attempt_at=_utcnow() + timedelta(seconds=delay),
+                lock_token=None, locked_until=None, last_error=str(error)[:255]))
+
+    def _server_unavailable(self, rows, error):
+        # Not the messages' fault: requeue without an attempt and back off the whole sender
+        self.failures += 1
+        delay = min(self.retry_seconds * 2 ** (self.failures - 1), MAX_RETRY_SECONDS)
+        self.paused_until = time.monotonic() + delay
+        logger.warning('SMTP server unavailable, retrying in %ds: %s', delay, error)
+        table = EmailOutbox.__table__
+        with self.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.id.in_([row.id for row in rows])).values(
+                next_attempt_at=_utcnow() + timedelta(seconds=delay),
+                lock_token=None, locked_until=None, last_error=str(error)[:255]))
+
+
+def email_enabled():
+    return (get_setting('enable_email_notifications') == 'true'
+            and bool(get_setting('smtp_server', current_app.config['MAIL_SERVER'])))
+
+
+def queue_notification_emails(notification):
+    """Queue an email for each user who can see ``notification``.
+
+    Runs in the caller's transaction; call ``wake_outbox()`` after commit.
+    Returns the number of emails queued.
+    """
+    if not email_enabled():
+        return 0
+    roles = [name for name in db.session.scalars(select(Role.name)) if visible_to(notification.visibility, name)]
+    recipients = db.session.scalars(
+        select(SystemUser.email).join(Role, SystemUser.role_id == Role.id)
+        .where(Role.name.in_(roles), SystemUser.email.isnot(None), SystemUser.id != notification.created_by)
+    ).all()
+    if not recipients:
+        return 0
+    school_name = get_setting('school_name', 'School')
+    now = _utcnow()
+    db.session.execute(insert(EmailOutbox), [{
+        'recipient': email,
+        'subject': f'[{school_name}] {notification.title}',
+        'body': notification.message,
+        'notification_id': notification.id,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+    } for email in recipients])
+    return len(recipients)
+
+
+def wake_outbox():
+    if current_app.config['OUTBOX_SENDER_ENABLED']:
+        current_app.extensions['outbox'].notify()
+
+
+def init_outbox(app, db):
+    """Create this worker's outbox sender and the ``flask send-outbox`` command"""
+    Mail(app)
+    with app.app_context():
+        engine = db.engine
+    sender = OutboxSender(app, engine)
+
+    @app.cli.command('send-outbox')
+    def send_outbox_command():
+        """Send all due emails in the outbox"""
+        print(f'Sent {sender.send_pending()} emails')
+
+    app.extensions['outbox'] = sender
+    if not app.config['OUTBOX_SENDER_ENABLED']:
+        return
+
+    @app.teardown_request
+    def _start_outbox_sender(exc):
+        # Picks up mail left queued by a previous process
+        sender.ensure_started()
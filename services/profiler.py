@@ -0,0 +1,186 @@
+"""On-demand profiling of single requests.
+
+An admin generates a signed, time-limited token on the developer page,
+either as a ``profile_token`` cookie for their own browser or to send in an
+``X-Profile-Token`` header. A request carrying it runs under cProfile, and
+its SQL statements and template renders are timed. The token only works in
+a session of the admin it was issued to, so a leaked token profiles nothing.
+The report is saved as JSON in ``PROFILE_DIR`` and listed on ``/developer``.
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_app_context, request, session
+from flask import before_render_template, template_rendered
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models.auth_models import SystemUser, db
+
+TOKEN_MAX_AGE = 3600
+PROFILE_COOKIE = 'profile_token'
+MAX_REPORTS = 50
+HOT_FRAMES = 40
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='request-profiler')
+
+
+def make_token(admin_id):
+    return _serializer().dumps({'admin_id': admin_id})
+
+
+def _token_valid(token):
+    try:
+        payload = _serializer().loads(token, max_age=TOKEN_MAX_AGE)
+    except BadSignature:
+        return False
+    admin_id = payload.get('admin_id')
+    if admin_id is None or session.get('user_id') != admin_id:
+        return False
+    # The issuing admin may have lost the role since
+    user = db.session.get(SystemUser, admin_id)
+    return user is not None and user.role.name == 'Admin'
+
+
+def _active():
+    return g.get('_profile') if has_app_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active() is not None:
+        conn.info.setdefault('_profile_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active()
+    starts = conn.info.get('_profile_start')
+    if profile is None or not starts:
+        return
+    elapsed = (time.perf_counter() - starts.pop()) * 1000
+    profile['sql'].append({'ms': round(elapsed, 3), 'statement': ' '.join(statement.split())})
+
+
+def _before_render(sender, template, context, **extra):
+    profile = _active()
+    if profile is not None:
+        profile['template_starts'].append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    profile = _active()
+    if profile is not None and profile['template_starts']:
+        elapsed = (time.perf_counter() - profile['template_starts'].pop()) * 1000
+        profile['templates'].append({'name': template.name, 'ms': round(elapsed, 3)})
+
+
+def _profile_dir():
+    return current_app.config['PROFILE_DIR']
+
+
+def _save(report):
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{report['id']}.json"), 'w') as handle:
+        json.dump(report, handle)
+    paths = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')),
+        key=os.path.getmtime
+    )
+    for path in paths[:-MAX_REPORTS]:
+        os.remove(path)
+
+
+def list_profiles():
+    """Summaries of stored reports, newest first"""
+    directory = _profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    summaries = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as handle:
+                report = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        summaries.append({key: report[key] for key in
+                          ('id', 'created_at', 'method', 'path', 'endpoint', 'status', 'total_ms', 'sql_ms', 'sql_count', 'template_ms')})
+    summaries.sort(key=lambda item: item['created_at'], reverse=True)
+    return summaries
+
+
+def load_profile(profile_id):
+    # Ids are uuid hex strings; anything else could escape the directory
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(_profile_dir(), f'{profile_id}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def init_profiler(app):
+    """Profile requests that carry a valid profiling token"""
+    app.config.setdefault('PROFILE_DIR', os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'brightfuture_profiles'))
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def _start_profile():
+        token = request.headers.get('X-Profile-Token') or request.cookies.get(PROFILE_COOKIE)
+        if not token or not _token_valid(token):
+            return
+        # cProfile/pstats are only needed for the rare profiled request
+        import cProfile
+        profiler = cProfile.Profile()
+        g._profile = {'profiler': profiler, 'sql': [], 'templates': [], 'template_starts': [],
+                      'started': time.perf_counter()}
+        profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        profile['profiler'].disable()
+        total_ms = (time.perf_counter() - profile['started']) * 1000
+
+        import io
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(profile['profiler'], stream=stream).sort_stats('cumulative').print_stats(HOT_FRAMES)
+        sql = sorted(profile['sql'], key=lambda item: item['ms'], reverse=True)
+        report = {
+            'id': uuid.uuid4().hex,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'user_id': session.get('user_id'),
+            'total_ms': round(total_ms, 2),
+            'sql_count': len(sql),
+            'sql_ms': round(sum(item['ms'] for item in sql), 2),
+            'template_ms': round(sum(item['ms'] for item in profile['templates']), 2),
+            'sql': sql,
+            'templates': profile['templates'],
+            'hot_frames': stream.getvalue(),
+        }
+        try:
+            _save(report)
+        except OSError:
+            current_app.logger.warning('Could not save request profile', exc_info=True)
+            return response
+        response.headers['X-Profile-Id'] = report['id']
+        return response
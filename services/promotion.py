@@ -0,0 +1,151 @@
+"""End-of-year promotion of pupils to the next class.
+
+Pupils are moved with one set-based UPDATE per class instead of one
+``edit_pupil`` form post per pupil, and the class/stream they are leaving is
+recorded in ``pupil_class_history`` within the same transaction.
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, literal, select, update
+
+from models.auth_models import db
+from models.admin_models import SchoolClass, SystemSetting
+from models.secretary_models import Pupil, PupilClassHistory
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+}
+
+
+def class_level(name):
+    """Return the numeric level of a class name such as 'P.1', 'P7' or 'P.Three'"""
+    if not name:
+        return None
+    digits = re.search(r'(\d+)', name)
+    if digits:
+        return int(digits.group(1))
+    for word in re.findall(r'[A-Za-z]+', name):
+        if word.lower() in NUMBER_WORDS:
+            return NUMBER_WORDS[word.lower()]
+    return None
+
+
+def build_successor_map(classes=None):
+    """Map each class id to the id of the next class up, or None for the top class.
+
+    Classes whose name carries no level are left out, so their pupils stay put.
+    """
+    if classes is None:
+        classes = SchoolClass.query.all()
+    levelled = sorted(
+        (level, cls.id) for cls in classes
+        for level in [class_level(cls.name)] if level is not None
+    )
+    successors = {}
+    for index, (level, class_id) in enumerate(levelled):
+        successors[class_id] = levelled[index + 1][1] if index + 1 < len(levelled) else None
+    return successors
+
+
+def _promotion_order(successors):
+    """Order classes so each one is emptied before pupils are moved into it"""
+    order = []
+    state = {}  # class_id -> 'visiting' | 'done'
+
+    def visit(class_id):
+        if state.get(class_id) == 'done':
+            return
+        if state.get(class_id) == 'visiting':
+            raise ValueError('Class promotion map contains a cycle')
+        state[class_id] = 'visiting'
+        successor = successors.get(class_id)
+        if successor is not None and successor in successors:
+            visit(successor)
+        state[class_id] = 'done'
+        order.append(class_id)
+
+    for class_id in successors:
+        visit(class_id)
+    return order
+
+
+def _current_academic_year_id():
+    setting = SystemSetting.query.filter_by(key='current_academic_year_id').first()
+    return int(setting.value) if setting and setting.value else None
+
+
+def promote_pupils(successors=None, academic_year_id=None, recorded_by=None, dry_run=False):
+    """Promote every active pupil one class up and graduate the top class.
+
+    ``successors`` maps class id -> next class id (None graduates the class);
+    it defaults to ``build_successor_map()``. With ``dry_run`` only the counts
+    are returned and nothing is written.
+    """
+    if successors is None:
+        successors = build_successor_map()
+    order = _promotion_order(successors)
+    if academic_year_id is None:
+        academic_year_id = _current_academic_year_id()
+
+    class_names = dict(db.session.query(SchoolClass.id, SchoolClass.name).all())
+    unknown = sorted({successor for successor in successors.values() if successor is not None} - set(class_names))
+    if unknown:
+        raise ValueError(f"Unknown class id(s) in promotion map: {', '.join(map(str, unknown))}")
+    counts = dict(
+        db.session.query(Pupil.current_class_id, func.count(Pupil.id))
+        .filter(Pupil.status == 'Active', Pupil.current_class_id.in_(list(successors)))
+        .group_by(Pupil.current_class_id)
+        .all()
+    )
+
+    summary = {
+        'dry_run': dry_run,
+        'promoted': sum(n for class_id, n in counts.items() if successors[class_id] is not None),
+        'graduated': sum(n for class_id, n in counts.items() if successors[class_id] is None),
+        'classes': [{
+            'class_id': class_id,
+            'class_name': class_names.get(class_id),
+            'next_class_id': successors[class_id],
+            'next_class_name': class_names.get(successors[class_id]) if successors[class_id] else 'Graduated',
+            'pupils': counts.get(class_id, 0),
+        } for class_id in reversed(order)],
+    }
+    if dry_run or not counts:
+        return summary
+
+    graduating_ids = [class_id for class_id, successor in successors.items() if successor is None]
+    try:
+        # Snapshot everyone's current placement before any pupil moves
+        db.session.execute(
+            insert(PupilClassHistory).from_select(
+                ['pupil_id', 'class_id', 'stream_id', 'academic_year_id', 'outcome', 'recorded_by', 'recorded_at'],
+                select(
+                    Pupil.id,
+                    Pupil.current_class_id,
+                    Pupil.current_stream_id,
+                    literal(academic_year_id, db.Integer),
+                    case((Pupil.current_class_id.in_(graduating_ids), 'Graduated'), else_='Promoted'),
+                    literal(recorded_by, db.Integer),
+                    literal(datetime.utcnow(), db.DateTime),
+                ).where(Pupil.status == 'Active', Pupil.current_class_id.in_(list(counts)))
+            )
+        )
+
+        # Top class first, so pupils moved into a class are not moved again
+        for class_id in order:
+            if not counts.get(class_id):
+                continue
+            stmt = update(Pupil).where(Pupil.status == 'Active', Pupil.current_class_id == class_id)
+            if successors[class_id] is None:
+                stmt = stmt.values(status='Graduated')
+            else:
+                stmt = stmt.values(current_class_id=successors[class_id])
+            db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return summary
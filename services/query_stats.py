@@ -0,0 +1,144 @@
+"""Per-request SQL instrumentation.
+
+Cursor-execute hooks count every statement run while handling a request and
+time it. The totals are sent back as ``Server-Timing``/``X-Query-Count``
+headers and folded into a rolling per-endpoint summary. Views decorated
+with ``query_budget(n)`` log a warning when they run more than ``n``
+statements, and raise ``QueryBudgetExceeded`` under ``TESTING`` (or when
+``QUERY_BUDGET_STRICT`` is set) so N+1 regressions fail loudly.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_PER_REQUEST = 5
+SAMPLES_PER_ENDPOINT = 200
+
+_summary = {}
+_summary_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _request_stats():
+    # ``g`` only exists inside an app context; scripts run queries without one
+    if not has_app_context():
+        return None
+    return g.get('_query_stats')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_stats() is not None:
+        conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats()
+    starts = conn.info.get('_query_start')
+    if stats is None or not starts:
+        return
+    elapsed = (time.perf_counter() - starts.pop()) * 1000
+    stats['count'] += 1
+    stats['db_ms'] += elapsed
+    slowest = stats['slowest']
+    if len(slowest) < SLOWEST_PER_REQUEST or elapsed > slowest[-1][0]:
+        slowest.append((elapsed, ' '.join(statement.split())[:300]))
+        slowest.sort(key=lambda item: item[0], reverse=True)
+        del slowest[SLOWEST_PER_REQUEST:]
+
+
+def current_query_count():
+    stats = _request_stats()
+    return stats['count'] if stats else 0
+
+
+def query_budget(limit):
+    """Flag a view that runs more than ``limit`` SQL statements"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            before = current_query_count()
+            response = view(*args, **kwargs)
+            used = current_query_count() - before
+            if used > limit:
+                message = f'{request.endpoint} ran {used} queries (budget {limit})'
+                if current_app.config.get('TESTING') or current_app.config.get('QUERY_BUDGET_STRICT'):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+def _record(endpoint, count, db_ms, total_ms, slowest):
+    with _summary_lock:
+        entry = _summary.get(endpoint)
+        if entry is None:
+            entry = _summary[endpoint] = {'samples': deque(maxlen=SAMPLES_PER_ENDPOINT), 'slowest': None}
+        entry['samples'].append((count, db_ms, total_ms))
+        if slowest and (entry['slowest'] is None or slowest[0][0] > entry['slowest'][0]):
+            entry['slowest'] = slowest[0]
+
+
+def endpoint_summary():
+    """Rolling per-endpoint figures over the last ``SAMPLES_PER_ENDPOINT`` requests"""
+    with _summary_lock:
+        snapshot = {name: (list(entry['samples']), entry['slowest']) for name, entry in _summary.items()}
+    summary = []
+    for endpoint, (samples, slowest) in snapshot.items():
+        counts = [sample[0] for sample in samples]
+        summary.append({
+            'endpoint': endpoint,
+            'requests': len(samples),
+            'avg_queries': round(sum(counts) / len(samples), 1),
+            'max_queries': max(counts),
+            'avg_db_ms': round(sum(sample[1] for sample in samples) / len(samples), 2),
+            'avg_total_ms': round(sum(sample[2] for sample in samples) / len(samples), 2),
+            'slowest_ms': round(slowest[0], 2) if slowest else None,
+            'slowest_statement': slowest[1] if slowest else None,
+        })
+    summary.sort(key=lambda item: item['avg_queries'], reverse=True)
+    return summary
+
+
+def reset_summary():
+    with _summary_lock:
+        _summary.clear()
+
+
+def init_query_stats(app):
+    """Install the request hooks on ``app`` unless SQL_INSTRUMENTATION is off"""
+    app.config.setdefault('SQL_INSTRUMENTATION', True)
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+
+    @app.before_request
+    def _start_query_stats():
+        g._query_stats = {'count': 0, 'db_ms': 0.0, 'slowest': [], 'started': time.perf_counter()}
+
+    @app.after_request
+    def _finish_query_stats(response):
+        stats = g.pop('_query_stats', None)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        response.headers['X-Query-Count'] = str(stats['count'])
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats["db_ms"]:.1f};desc="{stats["count"]} queries", app;dur={total_ms:.1f}'
+        )
+        if request.endpoint and request.endpoint != 'static':
+            _record(request.endpoint, stats['count'], stats['db_ms'], total_ms, stats['slowest'])
+        return response
@@ -0,0 +1,127 @@
+"""Academic-year rollover.
+
+Clones the previous year's terms and exam schedules into a new academic year
+with one INSERT ... SELECT per kind of row, skipping rows that already exist,
+then switches the current year/term settings in the same transaction.
+"""
+from sqlalchemy import and_, exists, func, insert, literal, select
+from sqlalchemy.orm import aliased
+
+from models.auth_models import db
+from models.admin_models import AcademicYear, ExamSchedule, SystemSetting, TeacherAssignment, Term
+from services.exam_schedules import invalidate_teacher_schedules
+from services.settings import warm_settings
+
+
+def _shift_date(column, days):
+    """SQL expression for ``column`` moved by ``days`` days"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, f'{days:+d} days')
+    return column + literal(days)
+
+
+def _upsert_setting(key, value, description, updated_by):
+    setting = SystemSetting.query.filter_by(key=key).first()
+    if setting:
+        setting.value = value
+        setting.updated_by = updated_by
+    else:
+        db.session.add(SystemSetting(
+            key=key,
+            value=value,
+            category='academic',
+            description=description,
+            data_type='integer',
+            updated_by=updated_by
+        ))
+
+
+def rollover_academic_year(source_year_id, target_year_id, set_current=True, updated_by=None):
+    """Clone terms and exam schedules from one academic year into another.
+
+    Dates are shifted by the gap between the two years' start dates. Returns
+    the number of rows created for each kind.
+    """
+    source = db.session.get(AcademicYear, source_year_id)
+    target = db.session.get(AcademicYear, target_year_id)
+    if not source or not target:
+        raise ValueError('Academic year not found')
+    if source.id == target.id:
+        raise ValueError('Source and target academic years must differ')
+    shift = (target.start_date - source.start_date).days
+
+    try:
+        existing_term = aliased(Term)
+        terms_created = db.session.execute(
+            insert(Term).from_select(
+                ['name', 'academic_year_id', 'start_date', 'end_date', 'days'],
+                select(
+                    Term.name,
+                    literal(target.id),
+                    _shift_date(Term.start_date, shift),
+                    _shift_date(Term.end_date, shift),
+                    Term.days,
+                ).where(
+                    Term.academic_year_id == source.id,
+                    ~exists().where(and_(
+                        existing_term.academic_year_id == target.id,
+                        existing_term.name == Term.name
+                    ))
+                )
+            )
+        ).rowcount
+
+        # Old terms are matched to their clones by name
+        old_term = aliased(Term)
+        new_term = aliased(Term)
+        existing_schedule = aliased(ExamSchedule)
+        schedules_created = db.session.execute(
+            insert(ExamSchedule).from_select(
+                ['name', 'term_id', 'exam_date', 'subject_id', 'class_id'],
+                select(
+                    ExamSchedule.name,
+                    new_term.id,
+                    _shift_date(ExamSchedule.exam_date, shift),
+                    ExamSchedule.subject_id,
+                    ExamSchedule.class_id,
+                ).join(old_term, old_term.id == ExamSchedule.term_id)
+                .join(new_term, and_(new_term.name == old_term.name, new_term.academic_year_id == target.id))
+                .where(
+                    old_term.academic_year_id == source.id,
+                    ~exists().where(and_(
+                        existing_schedule.term_id == new_term.id,
+                        existing_schedule.class_id == ExamSchedule.class_id,
+                        existing_schedule.subject_id == ExamSchedule.subject_id,
+                        existing_schedule.name == ExamSchedule.name
+                    ))
+                )
+            )
+        ).rowcount
+
+        current_term_id = None
+        if set_current:
+            current_term_id = db.session.scalar(
+                select(Term.id).where(Term.academic_year_id == target.id).order_by(Term.start_date).limit(1)
+            )
+            _upsert_setting('current_academic_year_id', str(target.id), 'Current academic year ID', updated_by)
+            if current_term_id:
+                _upsert_setting('current_term_id', str(current_term_id), 'Current term ID', updated_by)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if set_current:
+        warm_settings()
+    if schedules_created:
+        invalidate_teacher_schedules()
+
+    return {
+        'terms_created': terms_created,
+        'exam_schedules_created': schedules_created,
+        # Assignments are not tied to a year, so they carry over unchanged
+        'teacher_assignments_kept': TeacherAssignment.query.count(),
+        'current_term_id': current_term_id,
+        'days_shifted': shift,
+    }
@@ -0,0 +1,297 @@
+"""In-process scheduler for periodic maintenance jobs.
+
+Jobs register with the ``job`` decorator (built-in jobs live in
+services/jobs.py) and run on cron schedules in the school's ``timezone``
+setting. Each job has a ``scheduled_job`` row holding its schedule, its next
+run time and a lease. Every worker runs a scheduler thread that checks for
+due jobs every ``SCHEDULER_TICK_SECONDS``. To run a job, a worker must take
+the lease with a conditional UPDATE, so only one worker runs each job even
+when several find it due. Every run is recorded in ``job_run``.
+
+A lease lasts as long as the job's ``lease`` seconds. If a worker dies
+mid-run, its lease expires, the run is marked abandoned, and the job runs
+again at its next scheduled time.
+
+Admins can enable, disable, reschedule and run jobs from the Scheduled Jobs
+page. The serverless profile has no scheduler thread. There, run due jobs
+with ``flask run-jobs``, or have a cron service call ``/cron/run-jobs``
+with ``Authorization: Bearer $CRON_SECRET``.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import current_app, jsonify, request
+from sqlalchemy import insert, or_, select, update
+
+from models.admin_models import JobRun, ScheduledJob
+from models.auth_models import db
+from services.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+
+
+class Job:
+    def __init__(self, name, func, schedule, description, lease):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.description = description
+        self.lease = lease
+
+
+def job(name, schedule, description, lease=600):
+    """Register ``func()`` as a job. Its return value is saved as the run's message."""
+    CronSchedule(schedule)  # fail at import on a bad default schedule
+
+    def decorator(func):
+        JOBS[name] = Job(name, func, schedule, description, lease)
+        return func
+    return decorator
+
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week.
+
+    Fields take ``*``, numbers, ranges ``a-b``, steps ``*/n`` or ``a-b/n``, and
+    comma lists. Day of week runs from 0 (Sunday) to 6, and 7 also means Sunday.
+    If both day fields are restricted, either one matching is enough, as in cron.
+    ``@hourly``, ``@daily``, ``@weekly`` and ``@monthly`` are accepted as well.
+    """
+    ALIASES = {'@hourly': '0 * * * *', '@daily': '0 0 * * *', '@weekly': '0 0 * * 0', '@monthly': '0 0 1 * *'}
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = self.ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"'{expression}' needs 5 fields: minute hour day month weekday")
+        parsed = [self._parse(field, low, high) for field, (low, high) in zip(fields, self.BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            span, _, step = part.partition('/')
+            if span == '*':
+                start, end = low, high
+            elif '-' in span:
+                start, end = (int(value) for value in span.split('-', 1))
+            else:
+                start = int(span)
+                end = high if step else start
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"'{part}' is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """First matching minute after the naive local time ``moment``"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"'{self.expression}' never matches")
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def school_timezone():
+    try:
+        return ZoneInfo(get_setting('timezone', 'UTC'))
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def next_run(schedule, after=None):
+    """Next UTC run time of cron ``schedule``, read in the school's time zone"""
+    zone = school_timezone()
+    after = after or _utcnow()
+    local = after.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+    upcoming = CronSchedule(schedule).next_after(local).replace(tzinfo=zone)
+    return upcoming.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class Scheduler:
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+        self.tick = app.config['SCHEDULER_TICK_SECONDS']
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.synced = False
+
+    def ensure_started(self):
+        # Started lazily, and again in forked workers where it does not exist
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.worker = f'{socket.gethostname()}:{self.pid}'
+            self.thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self.thread.start()
+
+    def is_running(self, name):
+        table = ScheduledJob.__table__
+        with self.engine.connect() as conn:
+            locked_until = conn.scalar(select(table.c.locked_until).where(table.c.name == name))
+        return locked_until is not None and locked_until > _utcnow()
+
+    def run_soon(self, name, triggered_by):
+        """Manual run: in the background when the scheduler thread is on, otherwise now"""
+        if not self.app.config['SCHEDULER_ENABLED']:
+            return self.run(name, triggered_by)
+        threading.Thread(target=self._run_in_context, args=(name, triggered_by), daemon=True).start()
+        return 'started'
+
+    def _run_in_context(self, name, triggered_by):
+        with self.app.app_context():
+            self.run(name, triggered_by)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            try:
+                with self.app.app_context():
+                    self.run_due()
+            except Exception:
+                logger.warning('Scheduler tick failed', exc_info=True)
+
+    def sync(self):
+        """Add rows for newly registered jobs"""
+        table = ScheduledJob.__table__
+        with self.engine.begin() as conn:
+            known = set(conn.scalars(select(table.c.name)))
+            missing = [{'name': job.name, 'schedule': job.schedule, 'enabled': True,
+                        'next_run_at': next_run(job.schedule)}
+                       for job in JOBS.values() if job.name not in known]
+            if missing:
+                conn.execute(insert(table), missing)
+        self.synced = True
+
+    def run_due(self):
+        """Run every due job whose lease this worker can take; returns their names"""
+        if not self.synced:
+            self.sync()
+        table = ScheduledJob.__table__
+        now = _utcnow()
+        with self.engine.connect() as conn:
+            due = conn.scalars(select(table.c.name).where(
+                table.c.enabled.is_(True), table.c.next_run_at <= now,
+                or_(table.c.locked_until.is_(None), table.c.locked_until < now)
+            ).order_by(table.c.next_run_at)).all()
+        return [name for name in due if name in JOBS and self.run(name) is not None]
+
+    def run(self, name, triggered_by=None):
+        """Run job ``name`` now if its lease is free.
+
+        Scheduled runs need the job to be enabled and due. A run with
+        ``triggered_by`` set (a manual run) only needs the lease. Returns the
+        run's status, or None if another worker holds the lease.
+        """
+        job = JOBS[name]
+        table = ScheduledJob.__table__
+        now = _utcnow()
+        conditions = [table.c.name == name, or_(table.c.locked_until.is_(None), table.c.locked_until < now)]
+        if triggered_by is None:
+            conditions += [table.c.enabled.is_(True), table.c.next_run_at <= now]
+        runs = JobRun.__table__
+        with self.engine.begin() as conn:
+            taken = conn.execute(update(table).where(*conditions).values(
+                locked_by=self.worker, locked_until=now + timedelta(seconds=job.lease))).rowcount
+            if not taken:
+                return None
+            # Runs left 'running' by a worker that died while holding the lease
+            conn.execute(update(runs).where(runs.c.job_name == name, runs.c.status == 'running')
+                         .values(status='abandoned', finished_at=now))
+            run_id = conn.execute(insert(runs).values(
+                job_name=name, status='running', worker=self.worker, triggered_by=triggered_by, started_at=now
+            )).inserted_primary_key[0]
+
+        status, message = 'succeeded', None
+        try:
+            message = job.func()
+        except Exception as e:
+            logger.exception('Job %s failed', name)
+            status, message = 'failed', f'{type(e).__name__}: {e}'
+        finally:
+            # Leaves the session usable for the next job in this tick
+            db.session.rollback()
+
+        finished = _utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(update(runs).where(runs.c.id == run_id).values(
+                status=status, message=None if message is None else str(message)[:2000], finished_at=finished))
+            schedule = conn.scalar(select(table.c.schedule).where(table.c.name == name))
+            conn.execute(update(table).where(table.c.name == name).values(
+                locked_by=None, locked_until=None, last_run_at=now, last_status=status,
+                next_run_at=next_run(schedule, finished)))
+        return status
+
+
+def get_scheduler():
+    return current_app.extensions['scheduler']
+
+
+def init_scheduler(app, db):
+    """Create the job scheduler, its CLI command and the optional cron endpoint"""
+    import services.jobs  # noqa: F401  registers the built-in jobs
+
+    with app.app_context():
+        engine = db.engine
+    scheduler = Scheduler(app, engine)
+    app.extensions['scheduler'] = scheduler
+
+    @app.cli.command('run-jobs')
+    def run_jobs_command():
+        """Run every scheduled job that is due"""
+        ran = scheduler.run_due()
+        print(f"Ran {len(ran)} jobs{': ' + ', '.join(ran) if ran else ''}")
+
+    cron_secret = app.config.get('CRON_SECRET')
+    if cron_secret:
+        def run_jobs_endpoint():
+            if request.headers.get('Authorization') != f'Bearer {cron_secret}':
+                return jsonify({'error': 'Unauthorized'}), 401
+            return jsonify({'ran': scheduler.run_due()})
+        app.add_url_rule('/cron/run-jobs', 'cron_run_jobs', run_jobs_endpoint)
+
+    if not app.config['SCHEDULER_ENABLED']:
+        return
+
+    @app.teardown_request
+    def _start_scheduler(exc):
+        scheduler.ensure_started()
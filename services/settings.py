@@ -0,0 +1,41 @@
+"""Cached access to SystemSetting values.
+
+Dashboards read the current term/year and school details on every request;
+these helpers serve them from one in-process cache that is refreshed with a
+single query and invalidated whenever an admin changes a setting.
+"""
+from models.admin_models import SystemSetting
+from services.cache import get_cache
+
+settings_cache = get_cache('settings', ttl=30)
+
+
+def _load_settings():
+    return {setting.key: setting.value for setting in SystemSetting.query.all()}
+
+
+def get_settings():
+    """Return every setting as a {key: value} dict"""
+    return settings_cache.get_or_set('all', _load_settings)
+
+
+def get_setting(key, default=None):
+    value = get_settings().get(key)
+    return default if value is None or value == '' else value
+
+
+def get_int_setting(key, default=None):
+    value = get_setting(key)
+    try:
+        return int(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def invalidate_settings():
+    settings_cache.clear()
+
+
+def warm_settings():
+    """Reload settings into the cache immediately instead of on the next read"""
+    settings_cache.set('all', _load_settings())
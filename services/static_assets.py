@@ -0,0 +1,120 @@
+"""Fingerprinted, precompressed static files.
+
+``url_for('static', filename='logo.png')`` builds ``/static/logo.<hash>.png``,
+where the hash comes from the file's content. Because the URL changes
+whenever the file does, fingerprinted URLs are served with a one-year
+``immutable`` Cache-Control, and browsers never revalidate them.
+
+``build_static.py`` writes ``static/manifest.json`` with every hash, plus
+``.gz`` (and ``.br`` if brotli is installed) siblings for compressible
+files. Without a manifest, hashes are computed on first use and refreshed
+when a file's mtime changes, which suits development. When the client
+accepts it, a precompressed sibling is sent instead of the original.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def file_hash(path):
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+class StaticAssets:
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.hashes = {}        # filename -> hash
+        self.mtimes = {}        # filename -> mtime the hash was computed at
+        self.from_manifest = False
+        manifest = os.path.join(folder, MANIFEST_NAME)
+        if os.path.exists(manifest):
+            with open(manifest) as handle:
+                self.hashes = json.load(handle)['files']
+            self.from_manifest = True
+
+    def hash_for(self, filename):
+        if self.from_manifest:
+            return self.hashes.get(filename)
+        path = safe_join(self.folder, filename)
+        try:
+            mtime = os.path.getmtime(path) if path else None
+        except OSError:
+            mtime = None
+        if mtime is None or not os.path.isfile(path):
+            return None
+        with self.lock:
+            if self.mtimes.get(filename) != mtime:
+                self.hashes[filename] = file_hash(path)
+                self.mtimes[filename] = mtime
+            return self.hashes[filename]
+
+    def fingerprint(self, filename):
+        digest = self.hash_for(filename)
+        if digest is None:
+            return filename
+        stem, ext = os.path.splitext(filename)
+        return f'{stem}.{digest}{ext}'
+
+    def serve(self, filename):
+        immutable = False
+        match = FINGERPRINTED.match(filename)
+        if match:
+            original = match['stem'] + match['ext']
+            digest = self.hash_for(original)
+            if digest is not None:
+                # An old hash still gets the current file, just without the long cache
+                immutable = digest == match['hash']
+                filename = original
+
+        mimetype = mimetypes.guess_type(filename)[0]
+        served, encoding = filename, None
+        for candidate, suffix in PRECOMPRESSED:
+            if request.accept_encodings[candidate] and os.path.isfile(safe_join(self.folder, filename + suffix) or ''):
+                served, encoding = filename + suffix, candidate
+                break
+
+        kwargs = {'max_age': IMMUTABLE_MAX_AGE} if immutable else {}
+        response = send_from_directory(self.folder, served, mimetype=mimetype, **kwargs)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if self.has_variants(filename):
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+    def has_variants(self, filename):
+        return any(os.path.isfile(safe_join(self.folder, filename + suffix) or '') for _, suffix in PRECOMPRESSED)
+
+
+def init_static_assets(app):
+    """Fingerprint static URLs and serve them with long-lived cache headers"""
+    if not app.static_folder or 'static' not in app.view_functions:
+        return
+    assets = StaticAssets(app.static_folder)
+    app.extensions['static_assets'] = assets
+
+    @app.url_defaults
+    def _fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = assets.fingerprint(values['filename'])
+
+    app.view_functions['static'] = assets.serve
@@ -0,0 +1,70 @@
+"""Jinja settings for production.
+
+With ``TEMPLATES_AUTO_RELOAD`` off, which is the production default, Jinja
+no longer stats every template file on each render. With
+``TEMPLATE_CACHE_DIR`` set, compiled templates are kept as bytecode in that
+directory. All workers on a host then share them, and a restarted process
+unmarshals the code instead of parsing and compiling the template again.
+
+``flask compile-templates`` fills the directory at deploy time; on Vercel,
+vercel_build.sh runs it. The serverless bundle ships it read-only, so a
+cold start's first render only loads bytecode. Jinja's bytecode depends on the Python minor version:
+compile with the same version as the runtime, otherwise templates are just
+compiled in memory as if there were no cache.
+"""
+import logging
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that can be built on one machine and read on another"""
+
+    def get_cache_key(self, name, filename=None):
+        # Jinja mixes the absolute path into the key, which differs between
+        # the build machine and the deployment. The source checksum stored
+        # in each entry already rejects stale bytecode.
+        return super().get_cache_key(name)
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            # Read-only bundle; keep serving from the in-memory template cache
+            logger.debug('Could not write template bytecode for %s', bucket.key, exc_info=True)
+
+
+def compile_templates(app):
+    """Compile every template of ``app`` into its bytecode cache; return how many"""
+    env = app.jinja_env
+    if env.bytecode_cache is None:
+        raise RuntimeError('TEMPLATE_CACHE_DIR is not set')
+    names = env.list_templates(extensions=app.config['TEMPLATE_EXTENSIONS'])
+    for name in names:
+        # A syntax error here fails the deploy instead of the first request
+        env.get_template(name)
+    return len(names)
+
+
+def init_templates(app):
+    """Attach the bytecode cache to ``app``'s Jinja environment"""
+    app.config.setdefault('TEMPLATE_CACHE_DIR', None)
+    app.config.setdefault('TEMPLATE_EXTENSIONS', ('html', 'txt', 'xml'))
+
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    if cache_dir:
+        if os.access(os.path.dirname(os.path.abspath(cache_dir)), os.W_OK):
+            os.makedirs(cache_dir, exist_ok=True)
+        if os.path.isdir(cache_dir):
+            app.jinja_env.bytecode_cache = TemplateBytecodeCache(cache_dir)
+        else:
+            logger.warning('TEMPLATE_CACHE_DIR %s does not exist; templates compile on first use', cache_dir)
+
+    @app.cli.command('compile-templates')
+    def compile_templates_command():
+        """Precompile all templates into TEMPLATE_CACHE_DIR"""
+        count = compile_templates(app)
+        print(f'Compiled {count} templates into {cache_dir}')
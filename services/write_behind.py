@@ -0,0 +1,147 @@
+"""Write-behind buffer for low-value writes.
+
+Updating ``system_users.last_login`` on every login costs a write
+transaction. At the start of the school day those transactions compete with
+marks saves for the database. Instead, the login views record the timestamp
+here and return straight away. A background thread writes everything
+recorded so far in one UPDATE per kind:
+
+* every ``WRITE_BEHIND_INTERVAL`` seconds
+* sooner once ``WRITE_BEHIND_MAX_ENTRIES`` are waiting
+* at interpreter exit
+
+Repeated records for the same row collapse to the newest value. A failed
+batch is retried on later flushes, up to ``WRITE_BEHIND_MAX_RETRIES`` times,
+and then dropped with an error in the log. Writes still pending when a
+worker is killed outright are lost too, so only record values that can be
+lost, such as telemetry. Other kinds of write register
+their own flush function with ``WriteBehindBuffer.register``.
+
+The serverless profile turns the buffer off, since frozen instances never
+run the thread. The values are then written in the request as before.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import case, update
+
+from models.auth_models import SystemUser
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+class WriteBehindBuffer:
+    def __init__(self, engine, interval, max_entries, max_retries):
+        self.engine = engine
+        self.interval = interval
+        self.max_entries = max_entries
+        self.max_retries = max_retries
+        self.flushers = {}
+        self.pending = {}           # kind -> {key: value}
+        self.failures = {}          # kind -> {key: failed flushes}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def register(self, kind, flusher):
+        """``flusher(connection, {key: value})`` writes one batch of ``kind``"""
+        self.flushers[kind] = flusher
+
+    def record(self, kind, key, value):
+        with self.lock:
+            self.pending.setdefault(kind, {})[key] = value
+            size = sum(len(entries) for entries in self.pending.values())
+        self._ensure_thread()
+        if size >= self.max_entries:
+            self.wake.set()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batches, self.pending = self.pending, {}
+            for kind, entries in batches.items():
+                try:
+                    with self.engine.begin() as conn:
+                        self.flushers[kind](conn, entries)
+                except Exception:
+                    logger.warning('Write-behind flush of %d %s entries failed', len(entries), kind, exc_info=True)
+                    self._requeue(kind, entries)
+                else:
+                    failures = self.failures.get(kind)
+                    if failures:
+                        for key in entries:
+                            failures.pop(key, None)
+
+    def _requeue(self, kind, entries):
+        dropped = {}
+        with self.lock:
+            failures = self.failures.setdefault(kind, {})
+            newer = self.pending.setdefault(kind, {})
+            for key, value in entries.items():
+                failures[key] = failures.get(key, 0) + 1
+                if failures[key] > self.max_retries:
+                    del failures[key]
+                    dropped[key] = value
+                else:
+                    newer.setdefault(key, value)
+        if dropped:
+            logger.error('Write-behind dropped %d %s entries after %d retries: %r',
+                         len(dropped), kind, self.max_retries, dropped)
+
+    def _ensure_thread(self):
+        # Started lazily, and again in forked workers where it does not exist
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+
+def _flush_last_login(conn, entries):
+    table = SystemUser.__table__
+    items = list(entries.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = dict(items[start:start + BATCH_SIZE])
+        conn.execute(
+            update(table)
+            .where(table.c.id.in_(batch))
+            .values(last_login=case(batch, value=table.c.id))
+        )
+
+
+def record_last_login(user, when):
+    """Set ``user.last_login`` now, or queue it when the buffer is on"""
+    buffer = current_app.extensions.get('write_behind')
+    if buffer is None:
+        user.last_login = when
+    else:
+        buffer.record('last_login', user.id, when)
+
+
+def init_write_behind(app, db):
+    """Create the write-behind buffer for ``app`` if WRITE_BEHIND_ENABLED"""
+    if not app.config['WRITE_BEHIND_ENABLED']:
+        return
+    with app.app_context():
+        engine = db.engine
+    buffer = WriteBehindBuffer(engine, app.config['WRITE_BEHIND_INTERVAL'], app.config['WRITE_BEHIND_MAX_ENTRIES'],
+                               app.config['WRITE_BEHIND_MAX_RETRIES'])
+    buffer.register('last_login', _flush_last_login)
+    app.extensions['write_behind'] = buffer
+    atexit.register(buffer.flush)
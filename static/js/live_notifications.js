@@ -0,0 +1,79 @@
+// Live unread count and notification list for the dashboards.
+// Listens to /notifications/stream (server-sent events); the browser
+// reconnects on its own and resumes from the last event it received.
+(function () {
+  if (!window.EventSource) return;
+
+  function notificationButton() {
+    return document.querySelector('[onclick="toggleNotifications()"]');
+  }
+
+  function setUnread(count) {
+    let badge = document.getElementById("unreadBadge");
+    if (!badge) {
+      const button = notificationButton();
+      if (!button || count === 0) return;
+      badge = document.createElement("span");
+      badge.id = "unreadBadge";
+      badge.className = "badge bg-danger position-absolute";
+      badge.style.cssText = "top: -5px; right: -5px; font-size: 0.7em; padding: 2px 4px;";
+      button.appendChild(badge);
+    }
+    badge.textContent = count;
+    badge.style.display = count > 0 ? "" : "none";
+  }
+
+  function buildCard(notification) {
+    const card = document.createElement("div");
+    card.dataset.notificationId = notification.id;
+    card.className = "card mb-3 border-0 shadow-sm";
+    card.style.cssText =
+      "background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; border-radius: 15px; word-wrap: break-word;";
+    const body = document.createElement("div");
+    body.className = "card-body";
+    const title = document.createElement("h6");
+    title.className = "card-title mb-2 fw-bold";
+    title.style.fontSize = "1.1rem";
+    const message = document.createElement("p");
+    message.className = "card-text mb-2";
+    message.style.cssText = "font-size: 0.95rem; line-height: 1.4";
+    const meta = document.createElement("small");
+    meta.className = "text-white-50";
+    meta.style.fontSize = "0.8rem";
+    meta.textContent = (notification.author || "") + (notification.created_at ? " • " + notification.created_at.replace("T", " ").slice(0, 16) : "");
+    body.append(title, message, meta);
+    card.appendChild(body);
+    fillCard(card, notification);
+    return card;
+  }
+
+  function fillCard(card, notification) {
+    card.querySelector(".card-title").textContent = notification.title;
+    card.querySelector(".card-text").textContent = notification.message;
+  }
+
+  function showNotification(notification) {
+    const list = document.querySelector("#notificationModal .modal-body");
+    if (!list) return;
+    const existing = list.querySelector('[data-notification-id="' + notification.id + '"]');
+    if (notification.action === "deleted") {
+      if (existing) existing.remove();
+      return;
+    }
+    if (existing) {
+      fillCard(existing, notification);
+      return;
+    }
+    const empty = list.querySelector(".bi-bell-slash");
+    if (empty) empty.parentElement.remove();
+    list.prepend(buildCard(notification));
+  }
+
+  const source = new EventSource("/notifications/stream");
+  source.addEventListener("unread", function (event) {
+    setUnread(JSON.parse(event.data).count);
+  });
+  source.addEventListener("notification", function (event) {
+    showNotification(JSON.parse(event.data));
+  });
+})();
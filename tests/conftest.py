@@ -0,0 +1,105 @@
+import os
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+# Point the testing profile at a throwaway SQLite file before config.py is imported
+_db_dir = tempfile.mkdtemp(prefix='brightfuture-tests-')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+
+import pytest
+
+from app import create_app
+from models.admin_models import AcademicYear, ClassStream, SchoolClass, Stream, Subject, TeacherAssignment, Term
+from models.auth_models import Role, SystemUser, db, next_display_id
+from models.secretary_models import Pupil
+from services.cache import all_caches
+from services.login import hash_password
+
+ROLES = ['Admin', 'Teacher', 'Secretary', 'Parent', 'Headteacher', 'Bursar']
+PASSWORD = 'password'
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app('testing')
+
+
+@pytest.fixture
+def database(app):
+    """Fresh tables with the standard roles, inside an app context"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(Role(name=name) for name in ROLES)
+        db.session.commit()
+        for cache in all_caches():
+            cache.clear()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def password_hash(app):
+    with app.app_context():
+        return hash_password(PASSWORD)
+
+
+@pytest.fixture
+def make_user(database, password_hash):
+    def make(role, email=None, username=None):
+        role_id = Role.query.filter_by(name=role).one().id
+        count = SystemUser.query.count() + 1
+        user = SystemUser(display_id=next_display_id(), username=username or f'{role.lower()}{count}',
+                          email=email or f'{role.lower()}{count}@example.com',
+                          role_id=role_id, password_hash=password_hash)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def school(make_user):
+    """P1 and P2 with stream A, two subjects, five pupils and a teacher of P1A mathematics"""
+    year = AcademicYear(name='2026', start_date=date(2026, 1, 1), end_date=date(2026, 12, 31))
+    db.session.add(year)
+    db.session.flush()
+    term = Term(name='Term 1', academic_year_id=year.id, start_date=date(2026, 2, 1),
+                end_date=date(2026, 4, 30), days=60)
+    classes = [SchoolClass(name='P1'), SchoolClass(name='P2')]
+    stream = Stream(name='A')
+    subjects = [Subject(name='Mathematics'), Subject(name='English')]
+    db.session.add_all([term, stream, *classes, *subjects])
+    db.session.flush()
+    class_streams = [ClassStream(class_id=school_class.id, stream_id=stream.id) for school_class in classes]
+    pupils = [Pupil(admission_number=f'ADM{n}', first_name=f'Pupil{n}', last_name='Test', date_of_birth=date(2018, 1, 1),
+                    gender='Female', current_class_id=classes[n // 3].id, current_stream_id=stream.id)
+              for n in range(5)]
+    db.session.add_all([*class_streams, *pupils])
+    db.session.flush()
+    teacher = make_user('Teacher')
+    db.session.add(TeacherAssignment(teacher_id=teacher.id, class_stream_id=class_streams[0].id,
+                                     subject_id=subjects[0].id))
+    db.session.commit()
+    return SimpleNamespace(
+        teacher=teacher, term_id=term.id, year_id=year.id, subject_ids=[subject.id for subject in subjects],
+        class_stream_ids=[class_stream.id for class_stream in class_streams],
+        class_ids=[school_class.id for school_class in classes], p1_class_id=classes[0].id,
+        stream_id=stream.id,
+        p1_pupil_ids=[pupil.id for pupil in pupils[:3]])
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def log_in(user):
+        response = client.post('/auth/login', data={'email': user.email, 'password': PASSWORD})
+        assert response.status_code == 302, response.data
+        return client
+    return log_in
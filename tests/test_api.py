@@ -0,0 +1,43 @@
+from models.admin_models import TeacherAssignment
+from models.auth_models import db
+from tests.conftest import PASSWORD
+
+
+def _token(client, email):
+    response = client.post('/api/v1/auth/token', json={'email': email, 'password': PASSWORD})
+    assert response.status_code == 200, response.json
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+
+def test_teacher_views_use_token_roster(client, school):
+    headers = _token(client, school.teacher.email)
+    # Later assignment changes reach the API at the next token refresh, not before
+    TeacherAssignment.query.delete()
+    db.session.commit()
+
+    pupils = client.get('/api/v1/teacher/pupils', headers=headers).json
+    assert sorted(pupil['id'] for pupil in pupils['pupils']) == school.p1_pupil_ids
+
+    marks = client.get('/api/v1/teacher/marks', headers=headers,
+                       query_string={'term_id': school.term_id, 'exam_type': 'Mid Term'}).json
+    assert marks['success']
+    assert sorted(pupil['id'] for pupil in marks['pupils']) == school.p1_pupil_ids
+    assert [subject['can_edit'] for subject in marks['subjects']] == [False, True]  # English, Mathematics
+
+
+def test_marks_need_term_and_exam_type_only(client, school):
+    headers = _token(client, school.teacher.email)
+    assert client.get('/api/v1/teacher/marks', headers=headers,
+                      query_string={'exam_type': 'Mid Term'}).status_code == 400
+    response = client.post('/api/v1/teacher/marks', headers=headers, json={
+        'term_id': school.term_id, 'exam_type': 'Mid Term',
+        'marks_data': [{'subject_id': subject_id, 'pupil_marks': [{'pupil_id': pupil_id, 'marks_obtained': '75'}
+                                                                 for pupil_id in school.p1_pupil_ids]}
+                       for subject_id in school.subject_ids]})
+    assert response.json == {'success': True, 'message': 'Saved 3 marks successfully'}
+
+
+def test_parent_token_cannot_read_teacher_roster(client, make_user):
+    parent = make_user('Parent')
+    headers = _token(client, parent.email)
+    assert client.get('/api/v1/teacher/pupils', headers=headers).status_code == 403
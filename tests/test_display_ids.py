@@ -0,0 +1,47 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.auth_models import DISPLAY_ID_SEQUENCE, Role, SystemUser, db, next_display_id
+
+
+def _display_ids():
+    db.session.expire_all()
+    return dict(db.session.execute(select(SystemUser.username, SystemUser.display_id)).all())
+
+
+def test_delete_keeps_display_ids_and_new_ids_do_not_collide(make_user, login):
+    admin = make_user('Admin', username='admin')
+    for name in ('alice', 'bob', 'carol'):
+        make_user('Teacher', username=name)
+    bob_id = SystemUser.query.filter_by(username='bob').one().id
+    before = _display_ids()
+    assert sorted(before.values()) == [1, 2, 3, 4]
+
+    client = login(admin)
+    assert client.post(f'/admin/delete_user/{bob_id}').status_code == 302
+    after = _display_ids()
+    del before['bob']
+    assert after == before
+
+    teacher_role_id = Role.query.filter_by(name='Teacher').one().id
+    response = client.post('/admin/create_staff', data={
+        'username': 'dave', 'email': 'dave@example.com', 'password': 'long-enough-password',
+        'role_id': teacher_role_id})
+    assert response.status_code == 302
+    ids = _display_ids()
+    assert ids['dave'] == 5
+    assert len(set(ids.values())) == len(ids)
+
+
+def test_postgresql_draws_from_the_sequence(database, monkeypatch):
+    class Bind:
+        dialect = postgresql.dialect()
+
+    monkeypatch.setattr(db.session, 'get_bind', lambda *args, **kwargs: Bind())
+    # The name is inlined: nextval() needs a regclass, not a typed bind parameter
+    assert str(next_display_id().compile(dialect=postgresql.dialect())) == f"nextval('{DISPLAY_ID_SEQUENCE}')"
+
+
+def test_sqlite_takes_max_plus_one(database):
+    compiled = str(next_display_id().compile(dialect=sqlite.dialect()))
+    assert 'max(system_users.display_id)' in compiled
@@ -0,0 +1,83 @@
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import inspect, select
+
+from models.admin_models import ExamSchedule, TeacherAssignment
+from models.auth_models import db
+from services.exam_schedules import generate_exam_schedules, get_teacher_exam_schedules
+
+EXAM_DATE = date(2026, 3, 20)
+
+
+def _grid():
+    return Counter(db.session.execute(
+        select(ExamSchedule.name, ExamSchedule.term_id, ExamSchedule.class_id, ExamSchedule.subject_id)).all())
+
+
+def test_generating_twice_adds_nothing(school):
+    assert generate_exam_schedules(['Mid Term', ' Mid Term '], [school.term_id], EXAM_DATE) == 4
+    first = _grid()
+    assert sum(first.values()) == 4 and set(first.values()) == {1}
+    assert {(name, term_id) for name, term_id, _, _ in first} == {('Mid Term', school.term_id)}
+
+    assert generate_exam_schedules(['Mid Term'], [school.term_id], EXAM_DATE) == 0
+    assert _grid() == first
+
+
+def test_only_missing_combinations_are_added(school):
+    generate_exam_schedules(['Mid Term'], [school.term_id], EXAM_DATE,
+                            class_ids=[school.p1_class_id], subject_ids=school.subject_ids[:1])
+    assert generate_exam_schedules(['Mid Term', 'End of Term'], [school.term_id], EXAM_DATE) == 7
+    grid = _grid()
+    assert sum(grid.values()) == 8 and set(grid.values()) == {1}
+
+
+def test_term_class_subject_index_allows_several_exam_names(school):
+    # One class/subject sits several exams a term, so the index only speeds up the NOT EXISTS probe
+    index = next(index for index in inspect(db.engine).get_indexes('exam_schedule')
+                 if index['name'] == 'ix_exam_schedule_term_class_subject')
+    assert index['column_names'] == ['term_id', 'class_id', 'subject_id']
+    assert not index['unique']
+
+    generate_exam_schedules(['Mid Term', 'End of Term'], [school.term_id], EXAM_DATE)
+    triples = Counter((term_id, class_id, subject_id) for _, term_id, class_id, subject_id in _grid().elements())
+    assert len(triples) == 4 and set(triples.values()) == {2}
+
+
+def _teacher_schedules(teacher_id, term_id):
+    return sorted((row['school_class']['name'], row['subject']['name'])
+                  for row in get_teacher_exam_schedules(teacher_id, term_id))
+
+
+def test_teacher_schedules_are_cached_until_assignments_change(client, make_user, login, school):
+    teacher_id = school.teacher.id
+    generate_exam_schedules(['Mid Term'], [school.term_id], EXAM_DATE)
+    assert _teacher_schedules(teacher_id, school.term_id) == [('P1', 'Mathematics')]
+
+    # Written behind the cache's back, so the cached list is still served
+    db.session.add(TeacherAssignment(teacher_id=teacher_id, class_stream_id=school.class_stream_ids[0],
+                                     subject_id=school.subject_ids[1]))
+    db.session.commit()
+    assert _teacher_schedules(teacher_id, school.term_id) == [('P1', 'Mathematics')]
+
+    admin = login(make_user('Admin'))
+    p2_class_id = school.class_ids[1]
+    response = admin.post('/admin/assign_teachers', data={
+        'teacher_id': teacher_id, 'class_id': p2_class_id, 'stream_id': school.stream_id,
+        'subject_id': school.subject_ids[0]})
+    assert response.status_code == 302
+    assert _teacher_schedules(teacher_id, school.term_id) == [('P1', 'English'), ('P1', 'Mathematics'), ('P2', 'Mathematics')]
+
+    assignment_id = db.session.scalar(select(TeacherAssignment.id).where(
+        TeacherAssignment.teacher_id == teacher_id, TeacherAssignment.subject_id == school.subject_ids[1]))
+    assert admin.post(f'/admin/delete_assignment/{assignment_id}').status_code == 302
+    assert _teacher_schedules(teacher_id, school.term_id) == [('P1', 'Mathematics'), ('P2', 'Mathematics')]
+
+
+def test_new_exam_schedules_clear_cached_lists(school):
+    teacher_id = school.teacher.id
+    generate_exam_schedules(['Mid Term'], [school.term_id], EXAM_DATE)
+    assert _teacher_schedules(teacher_id, school.term_id) == [('P1', 'Mathematics')]
+    generate_exam_schedules(['End of Term'], [school.term_id], EXAM_DATE)
+    assert _teacher_schedules(teacher_id, school.term_id) == [('P1', 'Mathematics')] * 2
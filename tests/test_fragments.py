@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import update
+
+import services.fragments as fragments
+from models.admin_models import Stream, Subject
+from models.auth_models import db
+
+
+@pytest.fixture
+def render(app, database, monkeypatch):
+    """Render a page listing subject names; returns (html, times the context was built)"""
+    monkeypatch.setattr(fragments, 'render_template', lambda template, **context: ','.join(context['names']))
+    builds = []
+
+    def context():
+        builds.append(1)
+        return {'names': sorted(subject.name for subject in Subject.query.all())}
+
+    def render_page():
+        with app.test_request_context():
+            html = fragments.render_fragment('subjects.html', context, 'Admin', depends=(Subject,))
+        return html, len(builds)
+    return render_page
+
+
+def _subject_stamp():
+    return fragments._stamps(('subject',))
+
+
+def test_orm_commit_refreshes_fragment(render):
+    db.session.add(Subject(name='English'))
+    db.session.commit()
+    assert render() == ('English', 1)
+    assert render() == ('English', 1)
+
+    db.session.add(Subject(name='Mathematics'))
+    db.session.commit()
+    assert render() == ('English,Mathematics', 2)
+
+
+def test_bulk_update_refreshes_fragment(render):
+    db.session.add(Subject(name='English'))
+    db.session.commit()
+    assert render() == ('English', 1)
+
+    db.session.execute(update(Subject).values(name='Literature'))
+    db.session.commit()
+    assert render() == ('Literature', 2)
+
+
+def test_other_tables_leave_fragment_cached(render):
+    db.session.add(Subject(name='English'))
+    db.session.commit()
+    assert render() == ('English', 1)
+
+    db.session.add(Stream(name='A'))
+    db.session.execute(update(Stream).values(name='B'))
+    db.session.commit()
+    assert render() == ('English', 1)
+
+
+def test_rolled_back_writes_do_not_bump_stamp(render):
+    db.session.add(Subject(name='English'))
+    db.session.commit()
+    assert render() == ('English', 1)
+    stamp = _subject_stamp()
+
+    db.session.add(Subject(name='Mathematics'))
+    db.session.flush()
+    db.session.execute(update(Subject).where(Subject.name == 'English').values(name='Literature'))
+    db.session.rollback()
+    assert _subject_stamp() == stamp
+
+    # Nothing pending is left over to be bumped by an unrelated later commit
+    db.session.add(Stream(name='A'))
+    db.session.commit()
+    assert _subject_stamp() == stamp
+    assert render() == ('English', 1)
@@ -0,0 +1,41 @@
+import pytest
+
+from models.admin_models import JobRun, SystemSetting
+from models.auth_models import db
+from services.jobs import backup_database
+from services.settings import invalidate_settings
+
+
+@pytest.fixture
+def backup_frequency(app, database, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKUP_DIR', str(tmp_path))
+
+    def set_frequency(value):
+        db.session.add(SystemSetting(key='backup_frequency', value=value, category='backup'))
+        db.session.commit()
+        invalidate_settings()
+        return tmp_path
+    return set_frequency
+
+
+def test_backup_disabled(backup_frequency):
+    backup_dir = backup_frequency('disabled')
+    assert backup_database() == 'Skipped: backups disabled'
+    assert list(backup_dir.iterdir()) == []
+
+
+def test_backup_rejects_unknown_frequency(backup_frequency):
+    backup_frequency('hourly')
+    with pytest.raises(ValueError, match='hourly'):
+        backup_database()
+
+
+def test_backup_waits_for_frequency(backup_frequency):
+    backup_dir = backup_frequency('daily')
+    message = backup_database()
+    assert message.startswith('Backed up to')
+    db.session.add(JobRun(job_name='database-backup', status='succeeded', message=message,
+                          started_at=db.func.now()))
+    db.session.commit()
+    assert backup_database().startswith('Skipped: last daily backup')
+    assert len(list(backup_dir.iterdir())) == 1
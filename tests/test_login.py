@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import services.login as login_service
+from models.auth_models import SystemUser, db
+from services.login import BUSY, INVALID_CREDENTIALS, LoginThrottle, VerificationPool, _LoginState
+from tests.conftest import PASSWORD
+
+
+@pytest.fixture(autouse=True)
+def login_state(app, monkeypatch):
+    """Fresh buckets and pool per test; the app itself lives for the whole session"""
+    state = _LoginState(app.config)
+    monkeypatch.setitem(app.extensions, 'login', state)
+    return state
+
+
+class Clock:
+    """Stands in for the ``time`` module inside services/login.py only"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(login_service, 'time', clock)
+    return clock
+
+
+def _token(client, email, password):
+    return client.post('/api/v1/auth/token', json={'email': email, 'password': password})
+
+
+def test_bucket_refills_over_window(clock):
+    throttle = LoginThrottle()
+    assert [throttle.take('key', 3, 300) for _ in range(3)] == [0, 0, 0]
+    assert throttle.take('key', 3, 300) == pytest.approx(100)
+    clock.now += 100
+    assert throttle.take('key', 3, 300) == 0
+    assert throttle.take('key', 3, 300) == pytest.approx(100)
+
+
+def test_account_is_throttled_then_refills(client, make_user, login_state, clock):
+    email = make_user('Teacher').email
+    for _ in range(5):
+        assert _token(client, email, 'wrong').json == {'error': INVALID_CREDENTIALS}
+
+    response = _token(client, email, PASSWORD)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '180'
+    assert response.json == {'error': 'Too many login attempts. Please try again in 3 minutes.'}
+    # The IP token taken before the account check was refunded
+    assert login_state.throttle.buckets[('ip', '127.0.0.1')][0] == 45
+
+    # The account bucket refills one attempt every window / max_login_attempts seconds
+    clock.now += 180
+    assert _token(client, email, PASSWORD).status_code == 200
+
+
+def test_ip_bucket_covers_every_account(client, make_user, clock):
+    email = make_user('Parent').email
+    # 50 attempts per IP: ten accounts take five failures each
+    for n in range(10):
+        for _ in range(5):
+            assert _token(client, f'nobody{n}@example.com', 'wrong').status_code == 401
+    assert _token(client, email, PASSWORD).status_code == 429
+
+
+def test_successful_logins_return_their_tokens(client, make_user, login_state, clock):
+    user = make_user('Teacher')
+    for _ in range(4):
+        _token(client, user.email, 'wrong')
+    for _ in range(10):
+        assert _token(client, user.email, PASSWORD).status_code == 200
+    assert login_state.throttle.buckets[('account', user.email)][0] == 1
+    assert login_state.throttle.buckets[('ip', '127.0.0.1')][0] == 46
+    assert _token(client, user.email, 'wrong').status_code == 401
+    assert _token(client, user.email, 'wrong').status_code == 429
+
+
+def test_full_verification_queue_is_busy(app, client, make_user, login_state):
+    user = make_user('Teacher')
+    login_state.pool = VerificationPool(workers=1, queue=0, wait=0.05)
+    release = threading.Event()
+    blocker = threading.Thread(target=login_state.pool.run, args=(release.wait,))
+    blocker.start()
+    try:
+        response = _token(client, user.email, PASSWORD)
+        assert response.status_code == 503
+        assert response.json == {'error': BUSY}
+        # A busy answer does not count against the account
+        assert login_state.throttle.buckets[('account', user.email)][0] == 5
+    finally:
+        release.set()
+        blocker.join()
+    assert _token(client, user.email, PASSWORD).status_code == 200
+
+
+def test_busy_is_flashed_on_the_login_form(client, make_user, login_state):
+    user = make_user('Teacher')
+    login_state.pool = VerificationPool(workers=1, queue=0, wait=0.05)
+    release = threading.Event()
+    blocker = threading.Thread(target=login_state.pool.run, args=(release.wait,))
+    blocker.start()
+    try:
+        response = client.post('/auth/login', data={'email': user.email, 'password': PASSWORD})
+    finally:
+        release.set()
+        blocker.join()
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['_flashes'] == [('message', BUSY)]
+
+
+def _stored_hash(user_id):
+    db.session.expire_all()
+    return db.session.get(SystemUser, user_id).password_hash
+
+
+@pytest.mark.parametrize('method', ['pbkdf2:sha256:600000', 'scrypt:32768:8:1'])
+def test_rehash_on_login_fits_column(app, client, make_user, monkeypatch, method):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', method)
+    user = make_user('Teacher')
+    user.password_hash = generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000')
+    db.session.commit()
+
+    assert _token(client, user.email, PASSWORD).status_code == 200
+    stored = _stored_hash(user.id)
+    assert stored.startswith(method + '$')
+    assert len(stored) <= SystemUser.password_hash.type.length
+    assert _token(client, user.email, PASSWORD).status_code == 200
+    assert _stored_hash(user.id) == stored
+
+
+def test_current_hash_is_not_rehashed(client, make_user):
+    user = make_user('Teacher')
+    stored = user.password_hash
+    assert stored.startswith('pbkdf2:sha256:600000$')
+    assert _token(client, user.email, PASSWORD).status_code == 200
+    assert _stored_hash(user.id) == stored
+
+
+def test_hash_too_long_for_column_is_not_saved(app, client, make_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    monkeypatch.setattr(SystemUser.password_hash.type, 'length', 128)
+    user = make_user('Teacher')
+    stored = user.password_hash
+    assert _token(client, user.email, PASSWORD).status_code == 200
+    assert _stored_hash(user.id) == stored
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+import pytest
+
+from services import metrics
+
+
+@pytest.fixture
+def metrics_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'scrape')
+    return tmp_path
+
+
+def _scrape(client):
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape'})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_labels_are_escaped():
+    assert metrics._labels(endpoint='a\\b"c\nd', method='GET') == '{endpoint="a\\\\b\\"c\\nd",method="GET"}'
+
+
+def test_snapshot_file_is_keyed_by_pid_and_start(app, metrics_dir):
+    with app.app_context():
+        metrics.flush(force=True)
+    pid, started = metrics._process_id()
+    assert os.path.exists(metrics_dir / f'metrics-{pid}-{started}.json')
+
+
+def test_exited_workers_are_retired_and_still_counted(client, metrics_dir):
+    # A live pid with another start time is a recycled pid: the worker that wrote this has exited
+    stale = {'pid': os.getpid(), 'started': -1, 'requests': [['old.endpoint', 'GET', 200, 5]],
+             'latency': {}, 'in_flight': 3, 'pool': {'checkouts': 7, 'checked_out': 2, 'connects': 1},
+             'pool_status': None, 'caches': [{'name': 'settings', 'hits': 4, 'misses': 1, 'size': 2}]}
+    (metrics_dir / f'metrics-{os.getpid()}-old.json').write_text(json.dumps(stale))
+
+    for _ in range(2):
+        body = _scrape(client)
+        assert 'http_requests_total{endpoint="old.endpoint",method="GET",status="200"} 5' in body
+        assert 'http_requests_in_flight 1' in body  # only the scrape itself
+    assert not (metrics_dir / f'metrics-{os.getpid()}-old.json').exists()
+    assert (metrics_dir / metrics.RETIRED_FILE).exists()
+
+
+def test_throttled_flush_is_written_when_idle(app, client, metrics_dir, monkeypatch):
+    if metrics._flush_timer is not None:
+        metrics._flush_timer.join()
+    monkeypatch.setattr(metrics, 'FLUSH_INTERVAL', 0.2)
+    monkeypatch.setattr(metrics, '_last_flush', 0.0)
+    client.get('/auth/login')
+    client.get('/auth/login')  # inside the interval, so only scheduled
+    pid, started = metrics._process_id()
+    path = metrics_dir / f'metrics-{pid}-{started}.json'
+    time.sleep(0.5)
+    snapshot = json.loads(path.read_text())
+    assert sum(count for endpoint, method, status, count in snapshot['requests']
+               if (endpoint, method) == ('login', 'GET')) == 2
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from models.admin_models import Notification
+from models.auth_models import db
+from services.notification_events import notification_payload, visible_to
+
+VISIBILITIES = ['all', 'all_except_parents_admins', 'teacher_only', 'parent_only', 'admin_only']
+
+
+@pytest.mark.parametrize('role, expected', [
+    ('Teacher', {'all', 'all_except_parents_admins', 'teacher_only'}),
+    ('Admin', {'all', 'admin_only'}),
+    ('Parent', set()),
+])
+def test_visible_to(role, expected):
+    assert {visibility for visibility in VISIBILITIES if visible_to(visibility, role)} == expected
+
+
+def _events(body):
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def _stream(app, client, admin_id):
+    """Open the stream, then create and publish one notification per visibility; return the events sent"""
+    app.config.update(SSE_MAX_SECONDS=0.5, SSE_HEARTBEAT_SECONDS=0.1)
+    db.session.add(Notification(title='Existing', message='m', created_by=admin_id, visibility='all'))
+    db.session.commit()
+    response = client.get('/notifications/stream', buffered=False)
+    assert response.status_code == 200
+    broker = app.extensions['notification_events']
+    for visibility in VISIBILITIES:
+        notification = Notification(title=visibility, message='m', created_by=admin_id, visibility=visibility)
+        db.session.add(notification)
+        db.session.commit()
+        broker.publish('notification', dict(notification_payload(notification), action='created'))
+    return _events(response.get_data(as_text=True))
+
+
+def test_parent_stream_gets_no_notifications(app, make_user, login):
+    admin_id = make_user('Admin').id
+    parent = make_user('Parent')
+    events = _stream(app, login(parent), admin_id)
+    assert [data for kind, data in events if kind == 'notification'] == []
+    assert [data['count'] for kind, data in events if kind == 'unread'] == [0]
+
+
+def test_teacher_stream_gets_visible_notifications(app, make_user, login):
+    admin_id = make_user('Admin').id
+    teacher = make_user('Teacher')
+    events = _stream(app, login(teacher), admin_id)
+    assert [data['title'] for kind, data in events if kind == 'notification'] == \
+        ['all', 'all_except_parents_admins', 'teacher_only']
+    assert [data['count'] for kind, data in events if kind == 'unread'] == [1, 2, 3, 4]
@@ -0,0 +1,119 @@
+import socket
+
+import pytest
+
+from models.admin_models import EmailOutbox, Notification, SystemSetting
+from models.auth_models import db
+from services.outbox import OutboxSender, queue_notification_emails
+from services.settings import invalidate_settings
+
+
+def _settings(**values):
+    db.session.add_all(SystemSetting(key=key, value=value, category='communication') for key, value in values.items())
+    db.session.commit()
+    invalidate_settings()
+
+
+@pytest.mark.parametrize('visibility, expected', [
+    ('all', {'admin', 'teacher', 'secretary', 'headteacher', 'bursar'}),
+    ('all_except_parents_admins', {'teacher', 'secretary', 'headteacher', 'bursar'}),
+    ('teacher_only', {'teacher'}),
+    ('admin_only', {'admin'}),
+    ('parent_only', set()),
+])
+def test_recipients_per_visibility(make_user, visibility, expected):
+    _settings(enable_email_notifications='true', smtp_server='mail.example.com')
+    author = make_user('Admin', email='author@example.com')
+    for role in ('Admin', 'Teacher', 'Secretary', 'Parent', 'Headteacher', 'Bursar'):
+        make_user(role, email=f'{role.lower()}@example.com')
+    notification = Notification(title='Notice', message='m', created_by=author.id, visibility=visibility)
+    db.session.add(notification)
+    db.session.flush()
+    queued = queue_notification_emails(notification)
+    recipients = {row.recipient.split('@')[0] for row in EmailOutbox.query.all()}
+    assert recipients == expected
+    assert queued == len(expected)
+
+
+class Handler:
+    """Accepts every message, except for recipients given a reply in ``replies``"""
+
+    def __init__(self):
+        self.replies = {}
+        self.delivered = []
+        self.peers = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.replies:
+            return self.replies[address]
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        self.delivered.extend(envelope.rcpt_tos)
+        return '250 Message accepted'
+
+
+@pytest.fixture
+def smtp_server(app, database, monkeypatch):
+    controller_module = pytest.importorskip('aiosmtpd.controller')
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    monkeypatch.setitem(app.config, 'MAIL_SUPPRESS_SEND', False)
+    monkeypatch.setitem(app.config, 'MAIL_USE_TLS', False)
+    monkeypatch.setitem(app.config, 'MAIL_DEFAULT_SENDER', 'school@example.com')
+    monkeypatch.setitem(app.config, 'OUTBOX_BATCH_SIZE', 2)
+    monkeypatch.setitem(app.config, 'OUTBOX_RATE_PER_MINUTE', 60000)
+    _settings(smtp_server='127.0.0.1', smtp_port=str(port))
+    yield handler
+    controller.stop()
+
+
+def _queue(*recipients):
+    db.session.add_all(EmailOutbox(recipient=recipient, subject='Subject', body='Body') for recipient in recipients)
+    db.session.commit()
+
+
+def _statuses():
+    db.session.expire_all()
+    return {row.recipient: (row.status, row.attempts) for row in EmailOutbox.query.all()}
+
+
+def test_sends_batches_over_one_connection(app, smtp_server):
+    recipients = [f'user{n}@example.com' for n in range(5)]
+    _queue(*recipients)
+    assert OutboxSender(app, db.engine).send_pending() == 5
+    assert smtp_server.delivered == recipients
+    assert len(smtp_server.peers) == 1
+    assert set(_statuses().values()) == {('sent', 1)}
+
+
+def test_temporary_rejection_is_retried(app, smtp_server):
+    smtp_server.replies['busy@example.com'] = '451 Try again later'
+    _queue('busy@example.com', 'ok@example.com')
+    assert OutboxSender(app, db.engine).send_pending() == 1
+    assert _statuses() == {'busy@example.com': ('pending', 1), 'ok@example.com': ('sent', 1)}
+    row = EmailOutbox.query.filter_by(recipient='busy@example.com').one()
+    assert row.locked_until is None and row.last_error.startswith("{'busy@example.com': (451")
+
+
+def test_permanent_rejection_fails(app, smtp_server):
+    smtp_server.replies['gone@example.com'] = '550 No such user'
+    _queue('gone@example.com', 'ok@example.com')
+    assert OutboxSender(app, db.engine).send_pending() == 1
+    assert _statuses() == {'gone@example.com': ('failed', 1), 'ok@example.com': ('sent', 1)}
+
+
+def test_claims_do_not_overlap(app, smtp_server):
+    _queue(*(f'user{n}@example.com' for n in range(5)))
+    first, second, third = (OutboxSender(app, db.engine) for _ in range(3))
+    claimed = [{row.id for row in sender.claim()} for sender in (first, second, third)]
+    assert [len(ids) for ids in claimed] == [2, 2, 1]
+    assert set.union(*claimed) == {row.id for row in EmailOutbox.query.all()}
+    assert second.claim() == []
+    assert smtp_server.delivered == []
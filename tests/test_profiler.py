@@ -0,0 +1,46 @@
+import pytest
+
+from services.profiler import PROFILE_COOKIE, make_token
+
+
+@pytest.fixture
+def profile_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _token(app, user):
+    with app.test_request_context():
+        return make_token(user.id)
+
+
+def test_header_token_profiles_the_issuing_admin(app, make_user, login, profile_dir):
+    admin = make_user('Admin')
+    client = login(admin)
+    response = client.get('/developer', headers={'X-Profile-Token': _token(app, admin)})
+    assert 'X-Profile-Id' in response.headers
+    assert [path.stem for path in profile_dir.iterdir()] == [response.headers['X-Profile-Id']]
+
+
+def test_browser_cookie_profiles_until_stopped(make_user, login, profile_dir):
+    client = login(make_user('Admin'))
+    client.post('/developer/profile-token', data={'action': 'browser'})
+    assert client.get_cookie(PROFILE_COOKIE).http_only
+    assert 'X-Profile-Id' in client.get('/developer').headers
+    client.post('/developer/profile-token', data={'action': 'stop'})
+    assert 'X-Profile-Id' not in client.get('/developer').headers
+
+
+@pytest.mark.parametrize('session_role', [None, 'Admin', 'Teacher'])
+def test_token_needs_the_issuing_admins_session(app, client, make_user, login, profile_dir, session_role):
+    token = _token(app, make_user('Admin'))
+    if session_role:
+        login(make_user(session_role))
+    assert 'X-Profile-Id' not in client.get('/developer', headers={'X-Profile-Token': token}).headers
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_query_string_token_is_ignored(app, make_user, login, profile_dir):
+    admin = make_user('Admin')
+    client = login(admin)
+    assert 'X-Profile-Id' not in client.get('/developer', query_string={'_profile': _token(app, admin)}).headers
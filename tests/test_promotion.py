@@ -0,0 +1,27 @@
+from models.auth_models import db
+from models.secretary_models import Pupil, PupilClassHistory
+
+
+def _promote(client, form):
+    return client.post('/admin/promote_pupils', data=form, headers={'X-Requested-With': 'XMLHttpRequest'}).get_json()
+
+
+def test_unknown_successor_is_rejected(make_user, login, school):
+    client = login(make_user('Admin'))
+    data = _promote(client, {f'next_class_{school.p1_class_id}': '9999'})
+    assert data == {'success': False, 'message': 'Unknown class id(s) in promotion map: 9999'}
+    db.session.expire_all()
+    assert {pupil.current_class_id for pupil in Pupil.query.filter(Pupil.id.in_(school.p1_pupil_ids))} == \
+        {school.p1_class_id}
+    assert PupilClassHistory.query.count() == 0
+
+
+def test_promotes_and_records_history(make_user, login, school):
+    client = login(make_user('Admin'))
+    p2_class_id = Pupil.query.filter(Pupil.current_class_id != school.p1_class_id).first().current_class_id
+    data = _promote(client, {f'next_class_{school.p1_class_id}': str(p2_class_id),
+                             f'next_class_{p2_class_id}': 'graduate'})
+    assert data['success'] and (data['summary']['promoted'], data['summary']['graduated']) == (3, 2)
+    db.session.expire_all()
+    assert {pupil.current_class_id for pupil in Pupil.query.filter(Pupil.id.in_(school.p1_pupil_ids))} == {p2_class_id}
+    assert sorted(row.outcome for row in PupilClassHistory.query) == ['Graduated'] * 2 + ['Promoted'] * 3
@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+from flask import g
+from sqlalchemy import select
+
+from models.admin_models import Notification
+from models.auth_models import db
+from models.secretary_models import Pupil
+from services.query_stats import QueryBudgetExceeded, query_budget
+
+
+def test_budget_trips_under_testing(app, database):
+    @query_budget(1)
+    def view():
+        db.session.execute(select(1))
+        db.session.execute(select(2))
+        return 'ok'
+
+    with app.test_request_context('/budget'):
+        g._query_stats = {'count': 0, 'db_ms': 0.0, 'slowest': [], 'started': 0.0}
+        with pytest.raises(QueryBudgetExceeded, match='ran 2 queries'):
+            view()
+
+
+def _add_pupils(school, count):
+    pupils = [Pupil(admission_number=f'EXTRA{n}', first_name=f'Extra{n}', last_name='Test', gender='Male',
+                    date_of_birth=date(2018, 1, 1), current_class_id=school.p1_class_id,
+                    current_stream_id=school.stream_id) for n in range(count)]
+    db.session.add_all(pupils)
+    db.session.commit()
+    return [pupil.id for pupil in pupils]
+
+
+def _save_marks(client, school, pupil_ids):
+    response = client.post('/teacher/save-marks', json={
+        'academic_year_id': school.year_id, 'term_id': school.term_id, 'exam_type': 'Mid Term',
+        'marks_data': [{'subject_id': school.subject_ids[0],
+                        'pupil_marks': [{'pupil_id': pupil_id, 'marks_obtained': str(50 + n)}
+                                        for n, pupil_id in enumerate(pupil_ids)]}]})
+    assert response.json['success'], response.json
+    return int(response.headers['X-Query-Count'])
+
+
+def test_marks_queries_do_not_grow_with_pupils(client, login, school):
+    login(school.teacher)
+    few_pupils = school.p1_pupil_ids
+    many_pupils = few_pupils + _add_pupils(school, 20)
+    # First save inserts the results, the second updates them
+    few = [_save_marks(client, school, few_pupils) for _ in range(2)]
+    many = [_save_marks(client, school, many_pupils) for _ in range(2)]
+    assert many[0] <= few[0] and many[1] <= few[1]
+
+    load = client.get('/teacher/load-marks-data', query_string={
+        'academic_year_id': school.year_id, 'term_id': school.term_id, 'exam_type': 'Mid Term'})
+    marks = load.json['existing_marks']
+    assert len(marks) == 23
+    # Marks rise with the pupil's position in the list, so the last pupil ranks first
+    assert [marks[f'{pupil_id}_{school.subject_ids[0]}']['stream_rank'] for pupil_id in many_pupils] == \
+        list(range(23, 0, -1))
+    enter = client.get('/teacher/enter-marks', query_string={
+        'year_id': school.year_id, 'term_id': school.term_id, 'exam_type': 'Mid Term'})
+    assert enter.status_code == 200
+
+
+def test_mark_read_queries_do_not_grow_with_notifications(client, login, make_user):
+    admin_id = make_user('Admin').id
+    teacher = make_user('Teacher')
+    login(teacher)
+    counts = []
+    for batch in (2, 30):
+        db.session.add_all(Notification(title=f'n{n}', message='m', created_by=admin_id, visibility='all')
+                           for n in range(batch))
+        db.session.commit()
+        response = client.post('/mark_notifications_read')
+        assert response.json == {'success': True}
+        counts.append(int(response.headers['X-Query-Count']))
+    assert counts[1] <= counts[0]
@@ -0,0 +1,85 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from models.admin_models import AcademicYear, ExamSchedule, SystemSetting, Term
+from models.auth_models import db
+from services.exam_schedules import generate_exam_schedules
+from services.rollover import rollover_academic_year
+
+
+@pytest.fixture
+def target_year_id(school):
+    generate_exam_schedules(['Mid Term'], [school.term_id], date(2026, 3, 20))
+    year = AcademicYear(name='2027', start_date=date(2027, 1, 1), end_date=date(2027, 12, 31))
+    db.session.add(year)
+    db.session.commit()
+    return year.id
+
+
+def _terms(year_id):
+    return db.session.execute(select(Term.name, Term.start_date, Term.end_date, Term.days)
+                              .where(Term.academic_year_id == year_id).order_by(Term.start_date)).all()
+
+
+def _schedules(year_id):
+    return db.session.execute(
+        select(ExamSchedule.name, Term.name, ExamSchedule.exam_date, ExamSchedule.class_id, ExamSchedule.subject_id)
+        .join(Term, Term.id == ExamSchedule.term_id).where(Term.academic_year_id == year_id)
+        .order_by(ExamSchedule.class_id, ExamSchedule.subject_id)).all()
+
+
+def _setting(key):
+    return db.session.scalar(select(SystemSetting.value).where(SystemSetting.key == key))
+
+
+def test_rollover_clones_terms_and_schedules(school, target_year_id):
+    result = rollover_academic_year(school.year_id, target_year_id)
+    assert (result['terms_created'], result['exam_schedules_created'], result['days_shifted']) == (1, 4, 365)
+
+    assert _terms(target_year_id) == [('Term 1', date(2027, 2, 1), date(2027, 4, 30), 60)]
+    source = _schedules(school.year_id)
+    cloned = _schedules(target_year_id)
+    assert [(name, term, class_id, subject_id) for name, term, _, class_id, subject_id in cloned] == \
+        [(name, term, class_id, subject_id) for name, term, _, class_id, subject_id in source]
+    assert {exam_date for _, _, exam_date, _, _ in cloned} == {date(2027, 3, 20)}
+
+    new_term_id = db.session.scalar(select(Term.id).where(Term.academic_year_id == target_year_id))
+    assert result['current_term_id'] == new_term_id
+    assert _setting('current_academic_year_id') == str(target_year_id)
+    assert _setting('current_term_id') == str(new_term_id)
+
+
+def test_rollover_again_creates_nothing(school, target_year_id):
+    rollover_academic_year(school.year_id, target_year_id)
+    terms, schedules = _terms(target_year_id), _schedules(target_year_id)
+    result = rollover_academic_year(school.year_id, target_year_id)
+    assert (result['terms_created'], result['exam_schedules_created']) == (0, 0)
+    assert _terms(target_year_id) == terms
+    assert _schedules(target_year_id) == schedules
+
+
+def test_existing_target_terms_are_kept(school, target_year_id):
+    # Terms the admin already set up keep their dates; schedules still go into the term with the same name
+    db.session.add_all([
+        Term(name='Term 1', academic_year_id=target_year_id, start_date=date(2027, 2, 8),
+             end_date=date(2027, 5, 7), days=62),
+        Term(name='Term 2', academic_year_id=target_year_id, start_date=date(2027, 5, 31),
+             end_date=date(2027, 8, 20), days=58),
+    ])
+    db.session.commit()
+
+    result = rollover_academic_year(school.year_id, target_year_id, set_current=False)
+    assert (result['terms_created'], result['exam_schedules_created']) == (0, 4)
+    assert _terms(target_year_id) == [('Term 1', date(2027, 2, 8), date(2027, 5, 7), 62),
+                                      ('Term 2', date(2027, 5, 31), date(2027, 8, 20), 58)]
+    assert {term for _, term, _, _, _ in _schedules(target_year_id)} == {'Term 1'}
+    assert result['current_term_id'] is None and _setting('current_academic_year_id') is None
+
+
+def test_rollover_needs_two_existing_years(school, target_year_id):
+    with pytest.raises(ValueError, match='must differ'):
+        rollover_academic_year(school.year_id, school.year_id)
+    with pytest.raises(ValueError, match='not found'):
+        rollover_academic_year(school.year_id, target_year_id + 100)
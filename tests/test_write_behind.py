@@ -0,0 +1,62 @@
+import logging
+
+import pytest
+from sqlalchemy import event
+
+from models.auth_models import db
+from services.write_behind import WriteBehindBuffer
+
+
+def _buffer(flusher, max_retries=2):
+    buffer = WriteBehindBuffer(db.engine, interval=3600, max_entries=1000, max_retries=max_retries)
+    buffer.register('kind', flusher)
+    buffer.record('kind', 1, 'value')
+    return buffer
+
+
+def _failing(conn, entries):
+    raise RuntimeError('database is down')
+
+
+def test_failed_entries_are_dropped_after_max_retries(app, database, caplog):
+    buffer = _buffer(_failing)
+    with caplog.at_level(logging.ERROR, logger='services.write_behind'):
+        for _ in range(2):
+            buffer.flush()
+            assert buffer.pending == {'kind': {1: 'value'}}
+        buffer.flush()
+    assert buffer.pending == {'kind': {}}
+    assert buffer.failures == {'kind': {}}
+    assert 'dropped 1 kind entries after 2 retries' in caplog.text
+
+
+def test_successful_flush_resets_the_retry_count(app, database):
+    written = []
+    outcomes = iter([_failing, lambda conn, entries: written.append(dict(entries))])
+    buffer = _buffer(lambda conn, entries: next(outcomes)(conn, entries), max_retries=1)
+    buffer.flush()
+    buffer.flush()
+    assert written == [{1: 'value'}]
+    assert buffer.failures == {'kind': {}}
+
+
+@pytest.fixture
+def commits(app, database):
+    count = []
+
+    def on_commit(conn):
+        count.append(conn)
+    event.listen(db.engine, 'commit', on_commit)
+    yield count
+    event.remove(db.engine, 'commit', on_commit)
+
+
+@pytest.mark.parametrize('buffered, expected', [(True, 0), (False, 1)])
+def test_login_commits_only_when_the_user_changed(app, client, make_user, commits, monkeypatch, buffered, expected):
+    user = make_user('Teacher')
+    if buffered:
+        monkeypatch.setitem(app.extensions, 'write_behind', _buffer(lambda conn, entries: None))
+    commits.clear()
+    response = client.post('/auth/login', data={'email': user.email, 'password': 'password'})
+    assert response.status_code == 302
+    assert len(commits) == expected
@@ -0,0 +1,13 @@
+#!/bin/sh
+# Vercel build command (see vercel.json): generates the gitignored files the
+# api/index.py bundle ships with.
+set -e
+
+python build_static.py
+
+# Compiling never connects, so the build does not need the database; the
+# build image's Python must match the function runtime (services/templates.py)
+DATABASE_URL="${DATABASE_URL:-sqlite://}" flask --app api.index compile-templates
+
+# Vercel wants an output directory; everything is served by api/index.py
+mkdir -p public